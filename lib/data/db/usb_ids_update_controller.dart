@@ -605,8 +605,9 @@ class UsbIdsUpdateController extends AsyncNotifier<UsbIdsUpdateState> {
 
     final db = await openDatabase(path, readOnly: true);
     try {
+      // The "compact" build serves vendors/products as views over coded names.
       final tables = await db.rawQuery(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('meta','vendors','products','usb_classes');",
+        "SELECT name FROM sqlite_master WHERE type IN ('table','view') AND name IN ('meta','vendors','products','usb_classes');",
       );
       final names = tables.map((r) => (r['name'] as String?) ?? '').toSet();
       const required = {'meta', 'vendors', 'products', 'usb_classes'};
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from bench_usbids_parse import DEFAULT_SQL_DUMP, render_usb_ids_from_sql
+from build_usbids_db import page_layout_diff
+from update_usbids_artifacts import LOADERS, _sha256_file, build_sqlite_from_usb_ids
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compare the bulk executemany loader with per-row upserts")
+    ap.add_argument("--input", default=None, help="usb.ids file (default: rendered from --sql)")
+    ap.add_argument("--sql", default=str(DEFAULT_SQL_DUMP), help="usbids.sql used when --input is not given")
+    ap.add_argument("--repeat", type=int, default=5, help="Builds per loader and mode (default: 5)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="usbids_bench_") as td:
+        td_path = Path(td)
+        if args.input:
+            ids_txt = Path(args.input)
+        else:
+            ids_txt = td_path / "usb.ids"
+            ids_txt.write_text("".join(render_usb_ids_from_sql(Path(args.sql))), encoding="utf-8")
+
+        medians = {}
+        digests = {}
+        for vacuum in (False, True):
+            for loader in LOADERS:
+                db_path = td_path / f"{loader}.sqlite"
+                timings = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    build_sqlite_from_usb_ids(ids_txt, db_path, vacuum=vacuum, loader=loader)
+                    timings.append(time.perf_counter() - t0)
+                medians[(loader, vacuum)] = statistics.median(timings)
+                if vacuum:
+                    digests[loader] = _sha256_file(db_path)
+                print(
+                    f"  - {loader:<7} vacuum={'yes' if vacuum else 'no ':<3} "
+                    f"median={medians[(loader, vacuum)] * 1000:8.2f} ms  best={min(timings) * 1000:8.2f} ms"
+                )
+
+        if len(set(digests.values())) != 1:
+            raise SystemExit(f"[FAIL] VACUUMed outputs differ: {digests}")
+        print(f"[OK] VACUUMed outputs identical (sha256={digests['bulk']})")
+        for vacuum in (False, True):
+            speedup = medians[("upsert", vacuum)] / medians[("bulk", vacuum)]
+            print(f"[OK] bulk speedup (vacuum={'yes' if vacuum else 'no'}): {speedup:.2f}x")
+
+        # The runs above use the default in-memory engine; time the on-disk
+        # load + VACUUM it replaces and check both give the same pages.
+        disk_db = td_path / "disk.sqlite"
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            build_sqlite_from_usb_ids(ids_txt, disk_db, vacuum=True, engine="disk")
+            timings.append(time.perf_counter() - t0)
+        mismatched = page_layout_diff(td_path / "bulk.sqlite", disk_db)
+        if mismatched:
+            raise SystemExit(f"[FAIL] memory and disk engines differ on pages {mismatched[:10]}")
+        speedup = statistics.median(timings) / medians[("bulk", True)]
+        print(f"[OK] memory engine matches the disk VACUUM layout; speedup over disk: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
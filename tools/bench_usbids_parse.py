@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from update_usbids_artifacts import PARSERS, ParseState, _open_usb_ids
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_SQL_DUMP = ROOT / "assets" / "db_src" / "usbids.sql"
+
+
+def render_usb_ids_from_sql(sql_dump: Path) -> List[str]:
+    """
+    Rebuild usb.ids-formatted lines from a usbids.sql dump.
+
+    The upstream text is not checked in, so this gives benchmarks a realistic
+    input with the same sections and entry counts as the shipped artifact.
+    """
+    con = sqlite3.connect(":memory:")
+    try:
+        con.executescript(sql_dump.read_text(encoding="utf-8"))
+        meta = dict(con.execute("SELECT key, value FROM meta"))
+        lines = [
+            "#\n",
+            "#\tList of USB ID's\n",
+            "#\n",
+            f"# Version: {meta.get('version', 'unknown')}\n",
+            f"# Date:    {meta.get('date', 'unknown')}\n",
+            "#\n",
+            "\n",
+        ]
+
+        products: Dict[int, list] = {}
+        for vid, pid, name in con.execute("SELECT vid, pid, name FROM products ORDER BY rowid"):
+            products.setdefault(vid, []).append((pid, name))
+        interfaces: Dict[tuple, list] = {}
+        for vid, pid, iid, name in con.execute("SELECT vid, pid, iid, name FROM interfaces ORDER BY rowid"):
+            interfaces.setdefault((vid, pid), []).append((iid, name))
+        for vid, name in con.execute("SELECT vid, name FROM vendors ORDER BY vid"):
+            lines.append(f"{vid:04x}  {name}\n")
+            for pid, pname in products.get(vid, ()):
+                lines.append(f"\t{pid:04x}  {pname}\n")
+                for iid, iname in interfaces.get((vid, pid), ()):
+                    lines.append(f"\t\t{iid:02x}  {iname}\n")
+
+        lines.append("\n# List of known device classes, subclasses and protocols\n")
+        subclasses: Dict[int, list] = {}
+        for cid, sid, name in con.execute("SELECT class_id, subclass_id, name FROM usb_subclasses ORDER BY rowid"):
+            subclasses.setdefault(cid, []).append((sid, name))
+        protocols: Dict[tuple, list] = {}
+        for cid, sid, prid, name in con.execute(
+            "SELECT class_id, subclass_id, protocol_id, name FROM usb_protocols ORDER BY rowid"
+        ):
+            protocols.setdefault((cid, sid), []).append((prid, name))
+        for cid, name in con.execute("SELECT class_id, name FROM usb_classes ORDER BY class_id"):
+            lines.append(f"C {cid:02x}  {name}\n")
+            for sid, sname in subclasses.get(cid, ()):
+                lines.append(f"\t{sid:02x}  {sname}\n")
+                for prid, pname in protocols.get((cid, sid), ()):
+                    lines.append(f"\t\t{prid:02x}  {pname}\n")
+
+        lines.append("\n")
+        for code, name in con.execute("SELECT terminal_type, name FROM audio_terminal_types ORDER BY 1"):
+            lines.append(f"AT {code:04x}  {name}\n")
+        for code, name in con.execute("SELECT descriptor_type, name FROM hid_descriptor_types ORDER BY 1"):
+            lines.append(f"HID {code:02x}  {name}\n")
+        for code, name in con.execute("SELECT item_type, name FROM hid_descriptor_item_types ORDER BY 1"):
+            lines.append(f"R {code:02x}  {name}\n")
+        for code, name in con.execute("SELECT bias_type, name FROM physical_bias_types ORDER BY 1"):
+            lines.append(f"BIAS {code}  {name}\n")
+        for code, name in con.execute("SELECT item_type, name FROM physical_descriptor_item_types ORDER BY 1"):
+            lines.append(f"PHY {code:02x}  {name}\n")
+
+        usages: Dict[int, list] = {}
+        for page, usage, name in con.execute("SELECT page_id, usage_id, name FROM hid_usages ORDER BY rowid"):
+            usages.setdefault(page, []).append((usage, name))
+        for page, name in con.execute("SELECT page_id, name FROM hid_usage_pages ORDER BY page_id"):
+            lines.append(f"HUT {page:02x}  {name}\n")
+            for usage, uname in usages.get(page, ()):
+                lines.append(f"\t{usage:03x}  {uname}\n")
+    finally:
+        con.close()
+    return lines
+
+
+def _time_parser(name: str, lines: List[str], repeat: int) -> List[float]:
+    parse = PARSERS[name]
+    timings = []
+    for _ in range(repeat):
+        state = ParseState()
+        t0 = time.perf_counter()
+        for _rec in parse(lines, state):
+            pass
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compare usb.ids parsers (dispatch, regex cascade, parallel) on the same input")
+    ap.add_argument("--input", default=None, help="usb.ids file (default: rendered from --sql)")
+    ap.add_argument("--sql", default=str(DEFAULT_SQL_DUMP), help="usbids.sql used when --input is not given")
+    ap.add_argument("--repeat", type=int, default=7, help="Runs per parser (default: 7)")
+    ap.add_argument(
+        "--scale",
+        type=int,
+        default=1,
+        help="Concatenate the input this many times, like a local list merged over upstream (default: 1)",
+    )
+    args = ap.parse_args()
+
+    if args.input:
+        with _open_usb_ids(Path(args.input)) as f:
+            lines = f.readlines()
+        source = args.input
+    else:
+        lines = render_usb_ids_from_sql(Path(args.sql))
+        source = f"{args.sql} (rendered)"
+    if args.scale > 1:
+        lines = lines * args.scale
+        source += f" x{args.scale}"
+
+    # Both parsers must agree before their timings mean anything.
+    reference = list(PARSERS["cascade"](lines, ParseState()))
+    for name in sorted(PARSERS):
+        state = ParseState()
+        if list(PARSERS[name](lines, state)) != reference:
+            raise SystemExit(f"[FAIL] parser '{name}' disagrees with the regex cascade")
+
+    print(f"[OK] {len(lines)} lines, {len(reference)} records from {source}")
+    results = {}
+    for name in sorted(PARSERS):
+        timings = _time_parser(name, lines, args.repeat)
+        results[name] = min(timings)
+        print(
+            f"  - {name:<10} best={min(timings) * 1000:8.2f} ms  "
+            f"median={statistics.median(timings) * 1000:8.2f} ms  "
+            f"({len(lines) / min(timings):,.0f} lines/s)"
+        )
+    print(f"[OK] dispatch speedup: {results['cascade'] / results['dispatch']:.2f}x")
+    print(f"[OK] parallel vs dispatch: {results['dispatch'] / results['parallel']:.2f}x ({os.cpu_count()} CPUs)")
+
+
+if __name__ == "__main__":
+    main()
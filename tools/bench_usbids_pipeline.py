@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import multiprocessing
+import platform
+import re
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from bench_usbids_parse import DEFAULT_SQL_DUMP, render_usb_ids_from_sql
+from update_usbids_artifacts import (
+    INDEX_SQL,
+    SCHEMA_SQL,
+    BulkLoader,
+    ParseState,
+    _open_usb_ids,
+    _sha256_file,
+    _write_sha256_sidecar,
+    build_sqlite_from_usb_ids,
+    download_usb_ids,
+    dump_sql,
+    gzip_file_parallel,
+    iter_usb_ids_records,
+)
+from usbids_metrics import peak_rss_kib
+from usbids_synth import SynthSpec, iter_synthetic_usb_ids
+
+RESULT_FORMAT = "usbids-bench/1"
+
+RE_VENDOR_LINE = re.compile(r"^([0-9a-fA-F]{4})(\s)")
+RE_PRODUCT_LINE = re.compile(r"^\t([0-9a-fA-F]{4})(\s)")
+
+
+def scale_usb_ids_lines(lines: List[str], factor: int) -> List[str]:
+    """
+    Repeats the vendor tree `factor` times with shifted vendor and product
+    IDs; the other sections are kept once. IDs are 16-bit, so large factors
+    reuse vendor IDs (exercising duplicate handling) while the number of
+    distinct products still grows roughly linearly.
+    """
+    if factor <= 1:
+        return list(lines)
+    first_class = next(i for i, line in enumerate(lines) if line.startswith("C "))
+    first_vendor = next(i for i, line in enumerate(lines) if RE_VENDOR_LINE.match(line))
+    tree = lines[first_vendor:first_class]
+
+    out = lines[:first_vendor]
+    for k in range(factor):
+        vid_shift = k * 7919
+        pid_shift = k * 31
+        for line in tree:
+            m = RE_VENDOR_LINE.match(line)
+            if m:
+                vid = (int(m.group(1), 16) + vid_shift) & 0xFFFF
+                out.append(f"{vid:04x}{line[4:]}")
+                continue
+            m = RE_PRODUCT_LINE.match(line)
+            if m:
+                pid = (int(m.group(1), 16) + pid_shift) & 0xFFFF
+                out.append(f"\t{pid:04x}{line[5:]}")
+                continue
+            out.append(line)
+    out.extend(lines[first_class:])
+    return out
+
+
+def _size(path: Path) -> int:
+    return path.stat().st_size if path.exists() else 0
+
+
+# Each stage reads what earlier stages left in `work` and returns
+# (timed seconds, output sizes). Untimed setup is kept outside the timer.
+
+
+def _stage_download(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    out = work / "download" / "usb.ids"
+    shutil.rmtree(out.parent, ignore_errors=True)
+    t0 = time.perf_counter()
+    download_usb_ids(url, out, conditional=False)
+    return time.perf_counter() - t0, {"usb.ids": _size(out)}
+
+
+def _stage_parse(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    t0 = time.perf_counter()
+    with _open_usb_ids(work / "usb.ids") as f:
+        records = sum(1 for _ in iter_usb_ids_records(f, ParseState()))
+    return time.perf_counter() - t0, {"records": records}
+
+
+def _stage_load(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    state = ParseState()
+    bulk = BulkLoader()
+    with _open_usb_ids(work / "usb.ids") as f:
+        bulk.add_all(iter_usb_ids_records(f, state))
+    bulk.add_meta(state)
+    db = work / "load.sqlite"
+    if db.exists():
+        db.unlink()
+
+    t0 = time.perf_counter()
+    con = sqlite3.connect(str(db))
+    try:
+        con.execute("PRAGMA journal_mode=OFF;")
+        con.execute("PRAGMA synchronous=OFF;")
+        con.executescript(SCHEMA_SQL)
+        cur = con.cursor()
+        cur.execute("BEGIN;")
+        bulk.write(cur)
+        cur.execute("COMMIT;")
+        con.executescript(INDEX_SQL)
+    finally:
+        con.close()
+    return time.perf_counter() - t0, {"load.sqlite": _size(db)}
+
+
+def _stage_vacuum(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    db = work / "usbids.sqlite"
+    shutil.copyfile(work / "load.sqlite", db)
+    con = sqlite3.connect(str(db))
+    try:
+        t0 = time.perf_counter()
+        con.execute("VACUUM;")
+        seconds = time.perf_counter() - t0
+    finally:
+        con.close()
+    return seconds, {"usbids.sqlite": _size(db)}
+
+
+def _stage_optimize(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    con = sqlite3.connect(str(work / "usbids.sqlite"))
+    try:
+        t0 = time.perf_counter()
+        con.execute("PRAGMA optimize;")
+        seconds = time.perf_counter() - t0
+    finally:
+        con.close()
+    return seconds, {}
+
+
+def _stage_build(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    db = work / "build.sqlite"
+    t0 = time.perf_counter()
+    build_sqlite_from_usb_ids(work / "usb.ids", db, vacuum=True)
+    return time.perf_counter() - t0, {"build.sqlite": _size(db)}
+
+
+def _stage_dump_sql(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    out = work / "usbids.sql"
+    t0 = time.perf_counter()
+    dump_sql(work / "usbids.sqlite", out, "benchmark")
+    return time.perf_counter() - t0, {"usbids.sql": _size(out)}
+
+
+def _stage_gzip(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    out = work / "usbids.sqlite.gz"
+    t0 = time.perf_counter()
+    gzip_file_parallel(work / "usbids.sqlite", out)
+    return time.perf_counter() - t0, {"usbids.sqlite.gz": _size(out)}
+
+
+def _stage_sha256(work: Path, url: str) -> Tuple[float, Dict[str, int]]:
+    # What a separate hashing pass over every output would cost; main() now
+    # takes these digests from HashingWriter instead.
+    gz = work / "usbids.sqlite.gz"
+    sidecar = work / "usbids.sqlite.gz.sha256"
+    t0 = time.perf_counter()
+    _write_sha256_sidecar(gz, sidecar)
+    for path in (work / "usbids.sql", gz, sidecar):
+        _sha256_file(path)
+    seconds = time.perf_counter() - t0
+    return seconds, {"bytes_hashed": _size(work / "usbids.sql") + 2 * _size(gz) + _size(sidecar)}
+
+
+STAGES: Dict[str, Callable[[Path, str], Tuple[float, Dict[str, int]]]] = {
+    "download": _stage_download,
+    "parse": _stage_parse,
+    "load": _stage_load,
+    "vacuum": _stage_vacuum,
+    "optimize": _stage_optimize,
+    "dump_sql": _stage_dump_sql,
+    "gzip": _stage_gzip,
+    "sha256": _stage_sha256,
+    "build": _stage_build,
+}
+
+
+def _run_stage_in_child(stage: str, work: str, url: str) -> Tuple[float, int, Dict[str, int]]:
+    seconds, sizes = STAGES[stage](Path(work), url)
+    return seconds, peak_rss_kib(), sizes
+
+
+def run_stage(stage: str, work: Path, url: str) -> Tuple[float, int, Dict[str, int]]:
+    """Runs one stage in a fresh process so its peak RSS is its own."""
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_run_stage_in_child, stage, str(work), url).result()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def bench_input(name: str, lines: List[str], stages: List[str], repeat: int) -> Dict[str, dict]:
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix=f"usbids_bench_{name}_") as td:
+        work = Path(td)
+        (work / "usb.ids").write_text("".join(lines), encoding="utf-8")
+
+        handler = functools.partial(_QuietHandler, directory=str(work))
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(target=srv.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{srv.server_address[1]}/usb.ids"
+        try:
+            for stage in stages:
+                timings, peaks, sizes = [], [], {}
+                for _ in range(repeat):
+                    seconds, peak, sizes = run_stage(stage, work, url)
+                    timings.append(seconds)
+                    peaks.append(peak)
+                results[stage] = {
+                    "seconds": statistics.median(timings),
+                    "seconds_min": min(timings),
+                    "peak_rss_kib": max(peaks),
+                    "outputs": sizes,
+                }
+                print(
+                    f"  - {name:<14} {stage:<9} {results[stage]['seconds'] * 1000:10.2f} ms  "
+                    f"rss={results[stage]['peak_rss_kib'] / 1024:7.1f} MiB  "
+                    + " ".join(f"{k}={v}" for k, v in sizes.items())
+                )
+        finally:
+            srv.shutdown()
+            srv.server_close()
+    return results
+
+
+def compare(results: dict, baseline: dict, time_tolerance: float, rss_tolerance: float) -> List[str]:
+    """Returns one message per stage that regressed beyond the tolerances."""
+    regressions = []
+    for input_name, stages in results["inputs"].items():
+        for stage, cur in stages.items():
+            base = baseline.get("inputs", {}).get(input_name, {}).get(stage)
+            if not base:
+                continue
+            if cur["seconds"] > base["seconds"] * time_tolerance:
+                regressions.append(
+                    f"{input_name}/{stage}: {cur['seconds'] * 1000:.1f} ms vs baseline {base['seconds'] * 1000:.1f} ms"
+                )
+            if cur["peak_rss_kib"] > base["peak_rss_kib"] * rss_tolerance:
+                regressions.append(
+                    f"{input_name}/{stage}: peak RSS {cur['peak_rss_kib']} KiB vs baseline {base['peak_rss_kib']} KiB"
+                )
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark the usbids artifact pipeline stage by stage")
+    ap.add_argument("--sql", default=str(DEFAULT_SQL_DUMP), help="usbids.sql the base input is rendered from")
+    ap.add_argument("--input", default=None, help="Use this usb.ids as the base input instead")
+    ap.add_argument("--scales", default="1,10,100", help="Comma-separated input scale factors (default: 1,10,100)")
+    ap.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Use generated corpora (tools/usbids_synth.py) of each scale instead of repeating the base input",
+    )
+    ap.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages (default: all)")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs per stage; the median time is kept (default: 3)")
+    ap.add_argument("--out", default=None, help="Write results as JSON here")
+    ap.add_argument("--baseline", default=None, help="Compare against a previous --out JSON")
+    ap.add_argument("--time-tolerance", type=float, default=1.25, help="Allowed slowdown factor (default: 1.25)")
+    ap.add_argument("--rss-tolerance", type=float, default=1.25, help="Allowed peak RSS growth factor (default: 1.25)")
+    args = ap.parse_args()
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        ap.error(f"unknown stages: {', '.join(unknown)}")
+
+    if args.input:
+        with _open_usb_ids(Path(args.input)) as f:
+            base_lines = f.readlines()
+    else:
+        base_lines = render_usb_ids_from_sql(Path(args.sql))
+
+    results = {
+        "format": RESULT_FORMAT,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "inputs": {},
+    }
+    for factor in (int(x) for x in args.scales.split(",") if x):
+        if args.synthetic:
+            name = f"generated-{factor}x"
+            lines = list(iter_synthetic_usb_ids(SynthSpec.scaled(factor)))
+        else:
+            name = "checked-in" if factor == 1 else f"synthetic-{factor}x"
+            lines = scale_usb_ids_lines(base_lines, factor)
+        print(f"[..] {name}: {len(lines)} lines")
+        results["inputs"][name] = bench_input(name, lines, stages, args.repeat)
+
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"[OK] Wrote {out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.time_tolerance, args.rss_tolerance)
+        if regressions:
+            print("[FAIL] Regressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            raise SystemExit(1)
+        print(f"[OK] No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
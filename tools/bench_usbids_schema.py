@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from bench_usbids_parse import DEFAULT_SQL_DUMP, render_usb_ids_from_sql
+from update_usbids_artifacts import SCHEMA_PROFILES, build_sqlite_from_usb_ids, gzip_file_parallel
+from usbids_delta import content_digest
+
+# The point lookups the app runs per device, keyed by what they bind.
+QUERIES: Dict[str, Tuple[str, str]] = {
+    "product": (
+        "SELECT name FROM products WHERE vid = ? AND pid = ?",
+        "SELECT vid, pid FROM products",
+    ),
+    "subclass": (
+        "SELECT name FROM usb_subclasses WHERE class_id = ? AND subclass_id = ?",
+        "SELECT class_id, subclass_id FROM usb_subclasses",
+    ),
+    "protocol": (
+        "SELECT name FROM usb_protocols WHERE class_id = ? AND subclass_id = ? AND protocol_id = ?",
+        "SELECT class_id, subclass_id, protocol_id FROM usb_protocols",
+    ),
+    "hid_usage": (
+        "SELECT name FROM hid_usages WHERE page_id = ? AND usage_id = ?",
+        "SELECT page_id, usage_id FROM hid_usages",
+    ),
+}
+
+
+def _sample_keys(con: sqlite3.Connection, keys_sql: str, count: int) -> List[tuple]:
+    keys = con.execute(keys_sql).fetchall()
+    rng = random.Random(0)
+    # Mostly hits; bumping the last key component usually gives a miss.
+    return [k if rng.random() < 0.8 else (*k[:-1], (k[-1] + 1) & 0xFF) for k in rng.choices(keys, k=count)]
+
+
+def time_lookups(db_path: Path, lookups: int, repeat: int) -> Dict[str, float]:
+    """Median microseconds per point lookup, per query kind."""
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        results = {}
+        for kind, (sql, keys_sql) in QUERIES.items():
+            sample = _sample_keys(con, keys_sql, lookups)
+            timings = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                for key in sample:
+                    con.execute(sql, key).fetchone()
+                timings.append(time.perf_counter() - t0)
+            results[kind] = statistics.median(timings) / lookups * 1e6
+        return results
+    finally:
+        con.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compare artifact size and lookup latency across schema profiles")
+    ap.add_argument("--input", default=None, help="usb.ids file (default: rendered from --sql)")
+    ap.add_argument("--sql", default=str(DEFAULT_SQL_DUMP), help="usbids.sql used when --input is not given")
+    ap.add_argument("--lookups", type=int, default=20_000, help="Lookups per query kind (default: 20000)")
+    ap.add_argument("--repeat", type=int, default=5, help="Timed passes per query kind (default: 5)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="usbids_bench_") as td:
+        td_path = Path(td)
+        if args.input:
+            ids_txt = Path(args.input)
+        else:
+            ids_txt = td_path / "usb.ids"
+            ids_txt.write_text("".join(render_usb_ids_from_sql(Path(args.sql))), encoding="utf-8")
+
+        sizes = {}
+        latencies = {}
+        digests = {}
+        for profile in SCHEMA_PROFILES:
+            db_path = td_path / f"{profile}.sqlite"
+            build_sqlite_from_usb_ids(ids_txt, db_path, vacuum=True, schema=profile)
+            gz = gzip_file_parallel(db_path, td_path / f"{profile}.sqlite.gz")
+            sizes[profile] = (db_path.stat().st_size, gz.size)
+            latencies[profile] = time_lookups(db_path, args.lookups, args.repeat)
+            con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                digests[profile] = content_digest(con)
+            finally:
+                con.close()
+
+        if len(set(digests.values())) != 1:
+            raise SystemExit(f"[FAIL] schema profiles hold different rows: {digests}")
+        print("[OK] All schema profiles hold identical rows")
+
+        base = SCHEMA_PROFILES[0]
+        for profile in SCHEMA_PROFILES:
+            db_size, gz_size = sizes[profile]
+            print(
+                f"  - {profile:<7} sqlite={db_size:>9} bytes ({db_size / sizes[base][0]:5.3f})"
+                f"  gz={gz_size:>9} bytes ({gz_size / sizes[base][1]:5.3f})"
+            )
+            for kind, us in latencies[profile].items():
+                print(f"      {kind:<9} {us:7.2f} us/lookup ({latencies[base][kind] / us:4.2f}x vs {base})")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,17 @@ from __future__ import annotations
 import argparse
 import sqlite3
 from pathlib import Path
+from typing import Iterator, List, Optional
 
 ROOT = Path(__file__).resolve().parents[1]
 
 DEFAULT_SQL_DUMP = ROOT / "assets" / "db_src" / "usbids.sql"
 DEFAULT_OUT_DB = ROOT / "assets" / "db" / "usbids.sqlite"
 
+# Header fields that count writes rather than describe content: file change
+# counter (24), schema cookie (40) and version-valid-for (92).
+_HEADER_COUNTERS = ((24, 28), (40, 44), (92, 96))
+
 
 def _cleanup_sidecars(db_path: Path) -> None:
     for suffix in ("-wal", "-shm"):
@@ -18,10 +23,118 @@ def _cleanup_sidecars(db_path: Path) -> None:
             p.unlink()
 
 
+def iter_sql_statements(sql_dump: Path) -> Iterator[str]:
+    """
+    Yields the statements of a SQL dump one at a time without reading the
+    whole file. Works for both iterdump() output and the multi-row INSERT
+    format written by update_usbids_artifacts.dump_sql().
+    """
+    buf = []
+    with sql_dump.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not buf and (line.startswith("--") or not line.strip()):
+                continue
+            buf.append(line)
+            # complete_statement() also handles ';' inside quoted names.
+            if line.rstrip().endswith(";"):
+                stmt = "".join(buf)
+                if sqlite3.complete_statement(stmt):
+                    yield stmt
+                    buf = []
+    if "".join(buf).strip():
+        raise SystemExit(f"Truncated SQL dump: {sql_dump}")
+
+
+def load_sql_dump(con: sqlite3.Connection, sql_dump: Path) -> int:
+    """
+    Executes a dump statement by statement; the dump's own BEGIN/COMMIT
+    control the transaction. Returns the number of statements run.
+    """
+    isolation_level = con.isolation_level
+    con.isolation_level = None
+    try:
+        count = 0
+        for stmt in iter_sql_statements(sql_dump):
+            con.execute(stmt)
+            count += 1
+    finally:
+        con.isolation_level = isolation_level
+    return count
+
+
+def open_memory_db(page_size: Optional[int] = None) -> sqlite3.Connection:
+    """
+    Opens the in-memory connection a build is loaded into. `page_size` must
+    be set here, before the first table exists; save_memory_db() keeps it.
+    """
+    con = sqlite3.connect(":memory:")
+    if page_size:
+        con.execute(f"PRAGMA page_size={int(page_size)};")
+    con.execute("PRAGMA temp_store=MEMORY;")
+    return con
+
+
+def save_memory_db(con: sqlite3.Connection, out_db: Path, vacuum: bool = True) -> None:
+    """
+    Writes a finished in-memory build to `out_db` in one pass.
+
+    VACUUM runs in RAM, so the only disk write is the page copy done by
+    Connection.backup(); the file gets the same page layout an on-disk
+    build followed by VACUUM would have.
+    """
+    if vacuum:
+        con.execute("VACUUM;")
+    con.execute("PRAGMA optimize;")
+
+    out_db.parent.mkdir(parents=True, exist_ok=True)
+    if out_db.exists():
+        out_db.unlink()
+    _cleanup_sidecars(out_db)
+
+    dst = sqlite3.connect(str(out_db))
+    try:
+        dst.execute("PRAGMA journal_mode=OFF;")
+        dst.execute("PRAGMA synchronous=OFF;")
+        con.backup(dst)
+        dst.execute("PRAGMA journal_mode=DELETE;")
+    finally:
+        dst.close()
+    _cleanup_sidecars(out_db)
+
+
+def _header_page_size(header: bytes) -> int:
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size
+
+
+def page_layout_diff(db_a: Path, db_b: Path) -> List[int]:
+    """
+    Returns the 1-based numbers of pages that differ between two database
+    files, ignoring the header counters that only record how many writes
+    produced the file. An empty list means the layouts match.
+    """
+    a = bytearray(db_a.read_bytes())
+    b = bytearray(db_b.read_bytes())
+    page_size = _header_page_size(a)
+    if page_size != _header_page_size(b):
+        return [1]
+    for start, end in _HEADER_COUNTERS:
+        a[start:end] = b[start:end] = bytes(end - start)
+
+    pages = max(len(a), len(b)) // page_size
+    return [
+        n + 1
+        for n in range(pages)
+        if a[n * page_size : (n + 1) * page_size] != b[n * page_size : (n + 1) * page_size]
+    ]
+
+
 def main() -> None:
     ap = argparse.ArgumentParser(description="Build assets/db/usbids.sqlite from assets/db_src/usbids.sql")
     ap.add_argument("--sql", default=str(DEFAULT_SQL_DUMP), help="Path to usbids.sql")
     ap.add_argument("--out", default=str(DEFAULT_OUT_DB), help="Output sqlite path")
+    ap.add_argument("--page-size", type=int, default=None, help="SQLite page size in bytes (default: SQLite's)")
+    ap.add_argument("--no-vacuum", action="store_true", help="Skip the in-memory VACUUM before writing")
     args = ap.parse_args()
 
     sql_dump = Path(args.sql)
@@ -30,30 +143,13 @@ def main() -> None:
     if not sql_dump.exists():
         raise SystemExit(f"Missing SQL dump: {sql_dump}")
 
-    out_db.parent.mkdir(parents=True, exist_ok=True)
-    if out_db.exists():
-        out_db.unlink()
-    _cleanup_sidecars(out_db)
-
-    sql = sql_dump.read_text(encoding="utf-8")
-
-    con = sqlite3.connect(str(out_db))
+    con = open_memory_db(args.page_size)
     try:
-        con.execute("PRAGMA journal_mode=OFF;")
-        con.execute("PRAGMA synchronous=OFF;")
-        con.execute("PRAGMA temp_store=MEMORY;")
-
-        con.executescript(sql)
-        con.commit()
-
-        con.execute("PRAGMA journal_mode=DELETE;")
-        con.execute("PRAGMA optimize;")
-        con.commit()
+        load_sql_dump(con, sql_dump)
+        save_memory_db(con, out_db, vacuum=not args.no_vacuum)
     finally:
         con.close()
 
-    _cleanup_sidecars(out_db)
-
     if not out_db.exists() or out_db.stat().st_size < 1024:
         raise SystemExit(f"DB generation failed: {out_db}")
 
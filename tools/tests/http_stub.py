@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import sys
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Type
+
+# Make the tools/ scripts importable from the tests.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves `server.body` with an ETag, honouring If-None-Match and
+    single-range Range/If-Range the way a static file server would.
+    """
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        srv = self.server
+        srv.requests.append(dict(self.headers))
+        body: bytes = srv.files.get(self.path.split("?", 1)[0], srv.body)
+        etag = f'"{srv.etag}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start, end = 0, len(body) - 1
+        rng = self.headers.get("Range")
+        if rng and srv.honour_range and self.headers.get("If-Range", etag) == etag:
+            first, last = rng.split("=", 1)[1].split("-", 1)
+            start = int(first)
+            if last:
+                end = min(int(last), end)
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        else:
+            self.send_response(200)
+        payload = body[start : end + 1]
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.write_payload(payload)
+
+    def write_payload(self, payload: bytes) -> None:
+        self.wfile.write(payload)
+
+
+@contextmanager
+def serve(
+    body: bytes,
+    etag: str = "v1",
+    handler: Type[StubHandler] = StubHandler,
+    honour_range: bool = True,
+    files: Optional[Dict[str, bytes]] = None,
+) -> Iterator[ThreadingHTTPServer]:
+    """Serves `body` at every path, except the paths in `files`."""
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    srv.daemon_threads = True
+    srv.body = body
+    srv.etag = etag
+    srv.honour_range = honour_range
+    srv.files = files or {}
+    srv.requests: List[dict] = []
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}/usb.ids"
+    thread = threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield srv
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        thread.join()
+
+
+def last_header(srv: ThreadingHTTPServer, name: str) -> Optional[str]:
+    return srv.requests[-1].get(name)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from build_usbids_db import load_sql_dump, page_layout_diff
+import update_usbids_artifacts
+from update_usbids_artifacts import WITHOUT_ROWID_TABLES, _build_db, build_sqlite_from_usb_ids, dump_sql
+from usbids_metrics import StageRecorder
+from usbids_delta import apply_delta, content_digest, diff_catalogs, open_catalog
+from usbids_overlay import compile_overlay, merge_overlay
+
+USB_IDS = "".join(
+    [
+        "# Version: 2024.01.01\n",
+        "# Date:    2024-01-01 00:00:00\n",
+        *(f"{vid:04x}  Vendor {vid}\n\t{vid:04x}  Product {vid}\n\t\t01  Interface\n" for vid in range(1, 3000)),
+        "C 03  Human Interface Device\n\t01  Boot Interface Subclass\n\t\t02  Mouse\n",
+        "HUT 01  Generic Desktop Controls\n\t002  Mouse\n",
+    ]
+)
+
+
+class BuildEngineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.ids = self.dir / "usb.ids"
+        self.ids.write_text(USB_IDS, encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _build(self, name: str, **kwargs) -> Path:
+        out = self.dir / name
+        build_sqlite_from_usb_ids(self.ids, out, **kwargs)
+        return out
+
+    def test_memory_engine_matches_vacuumed_disk_layout(self) -> None:
+        for page_size in (None, 1024, 8192):
+            with self.subTest(page_size=page_size):
+                mem = self._build("mem.sqlite", vacuum=True, engine="memory", page_size=page_size)
+                disk = self._build("disk.sqlite", vacuum=True, engine="disk", page_size=page_size)
+                self.assertEqual(page_layout_diff(mem, disk), [])
+
+    def test_bulk_loader_matches_per_row_upserts(self) -> None:
+        # Repeated keys in every kind of section: the last name wins.
+        self.ids.write_text(
+            USB_IDS
+            + "0005  Vendor 5 (renamed)\n\t0005  Product 5 (renamed)\n\t0005  Product 5 (again)\n\t\t01  Iface 2\n"
+            + "C 03  HID (renamed)\n\t01  Boot (renamed)\n\t\t02  Mouse (renamed)\n"
+            + "HUT 01  Generic Desktop\n\t002  Mouse (renamed)\n",
+            encoding="utf-8",
+        )
+        for schema in ("compat", "lookup"):
+            with self.subTest(schema=schema):
+                bulk = self._build("bulk.sqlite", vacuum=True, loader="bulk", schema=schema)
+                upsert = self._build("upsert.sqlite", vacuum=True, loader="upsert", schema=schema)
+                self.assertEqual(page_layout_diff(bulk, upsert), [])
+                self.assertEqual(bulk.read_bytes(), upsert.read_bytes())
+                con = sqlite3.connect(str(bulk))
+                try:
+                    self.assertEqual(
+                        con.execute("SELECT name FROM vendors WHERE vid = 5").fetchone()[0], "Vendor 5 (renamed)"
+                    )
+                    self.assertEqual(
+                        con.execute("SELECT name FROM products WHERE vid = 5 AND pid = 5").fetchone()[0],
+                        "Product 5 (again)",
+                    )
+                    self.assertEqual(
+                        con.execute("SELECT name FROM usb_protocols WHERE class_id = 3").fetchone()[0],
+                        "Mouse (renamed)",
+                    )
+                    self.assertEqual(con.execute("SELECT COUNT(*) FROM vendors").fetchone()[0], 2999)
+                finally:
+                    con.close()
+
+    def test_verify_layout_builds_the_reference_with_the_same_options(self) -> None:
+        args = argparse.Namespace(
+            no_vacuum=False,
+            parser="dispatch",
+            loader="upsert",
+            engine="memory",
+            page_size=8192,
+            schema="lookup",
+            search_index=False,
+            parse_workers=None,
+            verify_layout=True,
+        )
+        with mock.patch.object(
+            update_usbids_artifacts, "build_sqlite_from_usb_ids", wraps=build_sqlite_from_usb_ids
+        ) as build:
+            _build_db(args, self.ids, self.ids, self.dir / "out.sqlite", self.dir, StageRecorder())
+        (_, main), (_, reference) = build.call_args_list
+        for option in ("parser", "loader", "page_size", "schema", "search_index"):
+            self.assertEqual(reference[option], main[option], option)
+        self.assertEqual(reference["engine"], "disk")
+
+    def test_page_size_is_applied(self) -> None:
+        out = self._build("mem.sqlite", vacuum=False, page_size=8192)
+        con = sqlite3.connect(str(out))
+        try:
+            self.assertEqual(con.execute("PRAGMA page_size").fetchone()[0], 8192)
+            self.assertEqual(con.execute("SELECT COUNT(*) FROM interfaces").fetchone()[0], 2999)
+            self.assertEqual(con.execute("PRAGMA integrity_check").fetchone()[0], "ok")
+        finally:
+            con.close()
+        self.assertFalse(Path(str(out) + "-journal").exists())
+
+    def test_unvacuumed_layout_is_reported(self) -> None:
+        mem = self._build("mem.sqlite", vacuum=False, engine="memory")
+        disk = self._build("disk.sqlite", vacuum=True, engine="disk")
+        self.assertNotEqual(page_layout_diff(mem, disk), [])
+
+    def test_lookup_schema_keeps_rows_and_drops_autoindexes(self) -> None:
+        digests = {}
+        index_names = {}
+        for profile in ("compat", "lookup"):
+            con = sqlite3.connect(str(self._build(f"{profile}.sqlite", vacuum=True, schema=profile)))
+            try:
+                digests[profile] = content_digest(con)
+                index_names[profile] = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+            finally:
+                con.close()
+
+        self.assertEqual(digests["compat"], digests["lookup"])
+        self.assertIn("idx_products_vid", index_names["compat"])
+        self.assertNotIn("idx_products_vid", index_names["lookup"])
+        for table in WITHOUT_ROWID_TABLES:
+            self.assertIn(f"sqlite_autoindex_{table}_1", index_names["compat"])
+            self.assertNotIn(f"sqlite_autoindex_{table}_1", index_names["lookup"])
+
+    def test_compact_schema_codes_names_behind_views(self) -> None:
+        self.ids.write_text(
+            "".join(
+                f"{vid:04x}  Maker {vid} Technology Co., Ltd.\n"
+                f"\t{vid:04x}  Fry's Wireless Adapter {vid % 7}\n"
+                f"\t\t00  Wireless Adapter 'Interface'\n"
+                for vid in range(1, 500)
+            ),
+            encoding="utf-8",
+        )
+        lookup = self._build("lookup.sqlite", vacuum=True, schema="lookup")
+        compact = self._build("compact.sqlite", vacuum=True, schema="compact", search_index=True)
+        disk = self._build("disk.sqlite", vacuum=True, schema="compact", search_index=True, engine="disk")
+        self.assertEqual(page_layout_diff(compact, disk), [])
+        plain = self._build("plain.sqlite", vacuum=True, schema="compact")
+        self.assertLess(plain.stat().st_size, lookup.stat().st_size)
+
+        sql = self.dir / "compact.sql"
+        dump_sql(compact, sql, "test")
+        reloaded = sqlite3.connect(":memory:")
+        load_sql_dump(reloaded, sql)
+        cons = [sqlite3.connect(str(lookup)), sqlite3.connect(str(compact)), reloaded]
+        try:
+            self.assertEqual(len({content_digest(con) for con in cons}), 1)
+            con = cons[1]
+            words = [w for (w,) in con.execute("SELECT word FROM name_tokens")]
+            self.assertIn(" Wireless", words)
+            self.assertEqual(
+                {r[0] for r in con.execute("SELECT type FROM sqlite_master WHERE name IN ('vendors', 'products')")},
+                {"view"},
+            )
+            self.assertEqual(
+                con.execute("SELECT name FROM products WHERE vid = 3 AND pid = 3").fetchone(),
+                ("Fry's Wireless Adapter 3",),
+            )
+        finally:
+            for con in cons:
+                con.close()
+
+    def test_compact_schema_refuses_delta_and_overlay(self) -> None:
+        compact = self._build("compact.sqlite", vacuum=True, schema="compact")
+        before = compact.read_bytes()
+        self.ids.write_text(USB_IDS.replace("Product 7\n", "Renamed 7\n"), encoding="utf-8")
+        target = self._build("target.sqlite", vacuum=True, schema="compact")
+        base_con, target_con = open_catalog(compact), open_catalog(target)
+        try:
+            delta = diff_catalogs(base_con, target_con)
+        finally:
+            base_con.close()
+            target_con.close()
+        self.assertEqual(delta["tables"], {"products": {"update": [[7, 7, "Renamed 7"]]}})
+
+        with self.assertRaisesRegex(ValueError, "compact.*products, vendors"):
+            apply_delta(compact, delta)
+        overlay_ids = self.dir / "overlay.ids"
+        overlay_ids.write_text("0007  Vendor 7\n\t0007  Local 7\n", encoding="utf-8")
+        compile_overlay(overlay_ids, self.dir / "overlay.sqlite")
+        with self.assertRaisesRegex(ValueError, "compact"):
+            merge_overlay(compact, self.dir / "overlay.sqlite", self.dir / "merged.sqlite")
+        self.assertEqual(compact.read_bytes(), before)
+        self.assertFalse((self.dir / "merged.sqlite").exists())
+
+        # The lookup profile stays writable.
+        lookup = self._build("lookup.sqlite", vacuum=True, schema="lookup")
+        self.assertEqual(merge_overlay(lookup, self.dir / "overlay.sqlite"), {"products": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
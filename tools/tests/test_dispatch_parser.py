@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import ParseState, iter_usb_ids_records, iter_usb_ids_records_cascade
+
+# Lines the dispatch parser routes by their first characters rather than by
+# trying every pattern: CRLF endings, blank and whitespace-only lines,
+# entries superseded later in the file, lines indented one tab too deep,
+# IDs that are not hex or have the wrong width, and every section switch
+# (vendor -> class -> tagged -> HUT -> vendor) with indented lines that must
+# not attach to the section before the switch.
+USB_IDS = [
+    "# Version: 2024.01.01\r\n",
+    "# Date:    2024-01-01 20:34:03\r\n",
+    "\r\n",
+    "   \n",
+    "0001  Fry's Electronics\r\n",
+    "\t7778  Counterfeit flash drive\r\n",
+    "\t\t00  Interface zero\r\n",
+    "\t\t\t01  Indented too deep\n",
+    "\t\t\t\n",
+    "\t7778  Counterfeit flash drive (superseded)\n",
+    "\tzz01  Not hex\n",
+    "\t123  Short product ID\n",
+    "\t\tzz  Not hex interface\n",
+    "zzzz  Not a vendor\n",
+    "\t0002  Product after a bad vendor line\n",
+    "000  Short vendor ID\n",
+    "\t0003  Product after a short vendor line\n",
+    "abcd  Vendor starting with a tag letter\n",
+    "\t1234  Thing\n",
+    "AT 0100  USB Undefined\r\n",
+    "\t5678  Still abcd's product\n",
+    "C 03  Human Interface Device\r\n",
+    "\t01  Boot Interface Subclass\n",
+    "\t\t01  Keyboard\r\n",
+    "\t\t\t02  Indented too deep\n",
+    "\tg1  Not hex subclass\n",
+    "\t\t02  Mouse\n",
+    "\t01  Boot Interface Subclass (superseded)\n",
+    "\t\t1  Short protocol\n",
+    "AT 0101  USB Streaming\n",
+    "HID 21  HID\r\n",
+    "R 04  Usage Page\n",
+    "BIAS 0  Not Applicable\n",
+    "BIAS x  Not a number\n",
+    "PHY 00  None\n",
+    "\t02  Subclass after tagged lines\n",
+    "\t\t03  Protocol after tagged lines\n",
+    "HUT 01  Generic Desktop Controls\r\n",
+    "\t000  Undefined\r\n",
+    "\t001  Pointer\n",
+    "\t\t01  Indented under a usage\n",
+    "\tzzz  Not hex usage\n",
+    "\t001  Pointer (superseded)\n",
+    "HUT 123  Three digit page\n",
+    "\t002  Usage after a bad page line\n",
+    "0001  Fry's (superseded)\n",
+    "\t7778  Local flash drive\n",
+    "\t\t00  Local interface\n",
+    "C 03  HID (superseded)\n",
+    "\t01  Boot\n",
+    "\t\t01  Keyboard (superseded)\n",
+    "HUT 01  Generic Desktop\n",
+    "\t001  Pointer again\n",
+    "ffff  Last vendor\n",
+    "\tffff  Last product\n",
+    "\t\tffff  Wide interface\n",
+    "# Version: 2024.02.02\n",
+    "\t0001  Product after a late comment\n",
+]
+
+
+class DispatchParserTest(unittest.TestCase):
+    def _parse(self, parser, lines) -> tuple:
+        state = ParseState()
+        return list(parser(lines, state)), state
+
+    def test_matches_the_cascade(self) -> None:
+        records, state = self._parse(iter_usb_ids_records, USB_IDS)
+        reference, reference_state = self._parse(iter_usb_ids_records_cascade, USB_IDS)
+        self.assertEqual(records, reference)
+        self.assertEqual(state, reference_state)
+
+        # Spot-check the cascade itself so both cannot drift together.
+        names = {(r.table, r.key): r.name for r in reference}
+        self.assertEqual(state.meta_version, "2024.02.02")
+        self.assertEqual(names[("products", (0x0001, 0x7778))], "Local flash drive")
+        self.assertEqual(names[("products", (0xABCD, 0x5678))], "Still abcd's product")
+        self.assertEqual(names[("usb_protocols", (0x03, 0x01, 0x01))], "Keyboard (superseded)")
+        self.assertEqual(names[("hid_usages", (0x01, 0x001))], "Pointer again")
+        self.assertEqual(names[("interfaces", (0xFFFF, 0xFFFF, 0xFFFF))], "Wide interface")
+        # Comments do not end a vendor block.
+        self.assertEqual(names[("products", (0xFFFF, 0x0001))], "Product after a late comment")
+
+    def test_every_prefix_leaves_the_same_state(self) -> None:
+        # The state after each line is what the next line is routed by.
+        for end in range(1, len(USB_IDS) + 1):
+            with self.subTest(line=USB_IDS[end - 1]):
+                lines = USB_IDS[:end]
+                self.assertEqual(
+                    self._parse(iter_usb_ids_records, lines), self._parse(iter_usb_ids_records_cascade, lines)
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from http_stub import StubHandler, last_header, serve
+
+from update_usbids_artifacts import download_usb_ids
+
+BODY = b"".join(b"%04x  Vendor %d\n\t0001  Product\n" % (i, i) for i in range(4000))
+
+
+class UnsizedHandler(StubHandler):
+    """No Content-Length, and the connection drops after `server.cut` bytes."""
+
+    def send_header(self, keyword: str, value: str) -> None:
+        if keyword != "Content-Length":
+            super().send_header(keyword, value)
+
+    def write_payload(self, payload: bytes) -> None:
+        self.wfile.write(payload[: getattr(self.server, "cut", None)])
+
+
+class DownloadUsbIdsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.out = Path(self._td.name) / "usb.ids"
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def test_full_download_hashes_while_writing(self) -> None:
+        with serve(BODY) as srv:
+            result = download_usb_ids(srv.url, self.out, chunk_size=4096)
+
+        self.assertEqual(result.status, 200)
+        self.assertEqual(self.out.read_bytes(), BODY)
+        self.assertEqual(result.sha256, hashlib.sha256(BODY).hexdigest())
+        self.assertEqual(result.size, len(BODY))
+        self.assertFalse(Path(str(self.out) + ".part").exists())
+
+        state = json.loads(Path(str(self.out) + ".http.json").read_text(encoding="utf-8"))
+        self.assertEqual(state["etag"], '"v1"')
+        self.assertEqual(state["sha256"], result.sha256)
+
+    def test_unchanged_upstream_returns_304(self) -> None:
+        with serve(BODY) as srv:
+            first = download_usb_ids(srv.url, self.out)
+            second = download_usb_ids(srv.url, self.out)
+            self.assertEqual(last_header(srv, "If-None-Match"), '"v1"')
+
+        self.assertTrue(second.not_modified)
+        self.assertEqual(second.sha256, first.sha256)
+        self.assertEqual(self.out.read_bytes(), BODY)
+
+    def test_changed_upstream_downloads_again(self) -> None:
+        with serve(BODY) as srv:
+            download_usb_ids(srv.url, self.out)
+        new_body = BODY + b"ffff  New vendor\n"
+        with serve(new_body, etag="v2") as srv:
+            result = download_usb_ids(srv.url, self.out)
+
+        self.assertEqual(result.status, 200)
+        self.assertEqual(self.out.read_bytes(), new_body)
+
+    def test_unconditional_download_ignores_validators(self) -> None:
+        with serve(BODY) as srv:
+            download_usb_ids(srv.url, self.out)
+            result = download_usb_ids(srv.url, self.out, conditional=False)
+            self.assertIsNone(last_header(srv, "If-None-Match"))
+        self.assertEqual(result.status, 200)
+
+    def _leave_partial(self, etag: str, size: int) -> None:
+        Path(str(self.out) + ".part").write_bytes(BODY[:size])
+        Path(str(self.out) + ".part.json").write_text(
+            json.dumps({"url": self._url, "etag": f'"{etag}"', "last_modified": None}), encoding="utf-8"
+        )
+
+    def test_resumes_partial_download_with_range(self) -> None:
+        with serve(BODY) as srv:
+            self._url = srv.url
+            self._leave_partial("v1", 10000)
+            result = download_usb_ids(srv.url, self.out)
+            self.assertEqual(last_header(srv, "Range"), "bytes=10000-")
+            self.assertEqual(last_header(srv, "If-Range"), '"v1"')
+
+        self.assertEqual(result.status, 206)
+        self.assertEqual(self.out.read_bytes(), BODY)
+        self.assertEqual(result.sha256, hashlib.sha256(BODY).hexdigest())
+
+    def test_stale_partial_is_replaced_by_full_body(self) -> None:
+        with serve(BODY, etag="v2") as srv:
+            self._url = srv.url
+            self._leave_partial("v1", 10000)
+            result = download_usb_ids(srv.url, self.out)
+
+        self.assertEqual(result.status, 200)
+        self.assertEqual(self.out.read_bytes(), BODY)
+
+    def test_oversized_partial_restarts(self) -> None:
+        with serve(BODY[:5000]) as srv:
+            self._url = srv.url
+            self._leave_partial("v1", 10000)
+            result = download_usb_ids(srv.url, self.out)
+
+        self.assertEqual(result.status, 200)
+        self.assertEqual(self.out.read_bytes(), BODY[:5000])
+
+    def test_unsized_body_must_look_complete(self) -> None:
+        full = BODY + b"C 03  Human Interface Device\n\t01  Boot Interface Subclass\n"
+        with serve(full, handler=UnsizedHandler) as srv:
+            srv.cut = 10001
+            with self.assertRaisesRegex(SystemExit, "mid-line"):
+                download_usb_ids(srv.url, self.out)
+            self.assertFalse(self.out.exists())
+            # The partial is kept and resumed; Content-Range then gives the size.
+            srv.cut = None
+            result = download_usb_ids(srv.url, self.out)
+            self.assertEqual(last_header(srv, "Range"), "bytes=10001-")
+        self.assertEqual((result.status, self.out.read_bytes()), (206, full))
+
+        # Cut on a line boundary: only the missing "C" section gives it away.
+        new = full + b"ffff  New vendor\n"
+        with serve(new, etag="v2", handler=UnsizedHandler) as srv:
+            srv.cut = len(BODY)
+            with self.assertRaisesRegex(SystemExit, "lacks sections.*: C"):
+                download_usb_ids(srv.url, self.out)
+        self.assertEqual(self.out.read_bytes(), full)
+        self.assertEqual(Path(str(self.out) + ".part").read_bytes(), BODY)
+
+        with serve(new, etag="v2", handler=UnsizedHandler, honour_range=False) as srv:
+            result = download_usb_ids(srv.url, self.out)
+        self.assertEqual((result.status, self.out.read_bytes()), (200, new))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import queue
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import update_usbids_artifacts
+from update_usbids_artifacts import (
+    ParseState,
+    _worker_context,
+    build_sqlite_from_usb_ids,
+    iter_usb_ids_records,
+    iter_usb_ids_records_parallel,
+)
+
+# Upstream-shaped input followed by a local list merged on top: duplicate
+# keys across chunks, meta comments late in the file, vendor IDs that start
+# with the "A"/"B"/"C" tag letters, and tagged lines (AT, R) in the middle of
+# a vendor that do not reset the context of the indented lines after them.
+USB_IDS = """\
+# Version: 2024.01.01
+# Date:    2024-01-01 20:34:03
+0001  Fry's Electronics
+\t7778  Counterfeit flash drive
+\t\t00  Interface zero
+abcd  Unknown vendor A
+\t1234  Thing
+AT 0100  USB Undefined
+\t5678  Still abcd's product
+bead  Vendor B
+c0de  Vendor C
+\t0001  Code device
+R 04  Usage Page
+\t0002  Another code device
+C 00  (Defined at Interface level)
+C 03  Human Interface Device
+\t01  Boot Interface Subclass
+\t\t01  Keyboard
+HID 21  HID
+BIAS 0  Not Applicable
+PHY 00  None
+HUT 01  Generic Desktop Controls
+\t000  Undefined
+\t001  Pointer
+# Version: 2024.02.02
+0001  Fry's (local name)
+\t7778  Local flash drive
+\t9999  Local only device
+\t\t01  Local interface
+c0de  Vendor C
+\t0001  Code device (renamed)
+C 03  HID (local)
+\t01  Boot
+HUT 01  Generic Desktop
+\t001  Local pointer
+"""
+
+
+class ParallelParseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.lines = USB_IDS.splitlines(keepends=True)
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def test_records_and_state_match_sequential_parse(self) -> None:
+        expected_state = ParseState()
+        expected = list(iter_usb_ids_records(self.lines, expected_state))
+        for chunk_lines in (1, 2, 5, 1000):
+            with self.subTest(chunk_lines=chunk_lines):
+                state = ParseState()
+                records = list(iter_usb_ids_records_parallel(self.lines, state, workers=2, chunk_lines=chunk_lines))
+                self.assertEqual(records, expected)
+                self.assertEqual(state, expected_state)
+        self.assertEqual(expected_state.meta_version, "2024.02.02")
+
+    def test_workers_are_not_forked_from_a_threaded_parent(self) -> None:
+        # As with --stream: lines arrive from a live thread while the pool starts.
+        self.assertNotEqual(_worker_context().get_start_method(), "fork")
+        lines: "queue.Queue[object]" = queue.Queue()
+        done = object()
+
+        def feed() -> None:
+            for line in self.lines:
+                lines.put(line)
+            lines.put(done)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        records = list(
+            iter_usb_ids_records_parallel(iter(lines.get, done), ParseState(), workers=2, chunk_lines=2)  # type: ignore[arg-type]
+        )
+        feeder.join()
+        self.assertEqual(records, list(iter_usb_ids_records(self.lines, ParseState())))
+
+    def test_build_is_identical_to_dispatch(self) -> None:
+        ids = self.dir / "usb.ids"
+        ids.write_text(USB_IDS, encoding="utf-8")
+        for loader in update_usbids_artifacts.LOADERS:
+            with self.subTest(loader=loader):
+                reference = self.dir / f"dispatch-{loader}.sqlite"
+                build_sqlite_from_usb_ids(ids, reference, vacuum=True, loader=loader)
+                db = self.dir / f"parallel-{loader}.sqlite"
+                with mock.patch.object(update_usbids_artifacts, "PARALLEL_CHUNK_LINES", 3):
+                    build_sqlite_from_usb_ids(ids, db, vacuum=True, loader=loader, parser="parallel", parse_workers=2)
+                self.assertEqual(db.read_bytes(), reference.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from http_stub import StubHandler, serve
+
+from update_usbids_artifacts import (
+    StreamedDownload,
+    _open_usb_ids,
+    build_sqlite_from_usb_ids,
+    download_usb_ids,
+)
+
+# CRLF and bare CR line ends, multi-byte names, an invalid UTF-8 byte and no
+# final newline: everything the text decoder has to get right across chunks.
+BODY = (
+    "# Version: 2024.01.01\r\n".encode("utf-8")
+    + b"".join(
+        f"{vid:04x}  Vendör {vid} – 東芝\r\n\t0001  Pröduct\r\t\t01  If\n".encode("utf-8")
+        for vid in range(1, 2500)
+    )
+    + b"ffff  Bad \xff byte\n\tffff  Last line"
+)
+
+
+class ThrottledHandler(StubHandler):
+    """Sends the body in small slices with pauses, like a slow link."""
+
+    def write_payload(self, payload: bytes) -> None:
+        for i in range(0, len(payload), 4096):
+            self.wfile.write(payload[i : i + 4096])
+            self.wfile.flush()
+            time.sleep(0.002)
+        self.server.finished_at = time.perf_counter()
+
+
+class StreamedDownloadTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def test_lines_match_saved_file_and_parsing_overlaps_transfer(self) -> None:
+        out = self.dir / "usb.ids"
+        first_line_at = None
+        lines = []
+        with serve(BODY, handler=ThrottledHandler) as srv:
+            stream = StreamedDownload(srv.url, out, chunk_size=1000)
+            for line in stream:
+                if first_line_at is None:
+                    first_line_at = time.perf_counter()
+                lines.append(line)
+
+        self.assertLess(first_line_at, srv.finished_at)
+        self.assertEqual(out.read_bytes(), BODY)
+        self.assertEqual(stream.result.sha256, hashlib.sha256(BODY).hexdigest())
+        self.assertEqual(stream.bytes_read, len(BODY))
+        with _open_usb_ids(out) as f:
+            self.assertEqual(lines, list(f))
+
+    def test_streamed_build_equals_two_step_build(self) -> None:
+        with serve(BODY, handler=ThrottledHandler) as srv:
+            streamed = StreamedDownload(srv.url, self.dir / "streamed" / "usb.ids", chunk_size=1000)
+            build_sqlite_from_usb_ids(streamed, self.dir / "streamed.sqlite", vacuum=True)
+            two_step = download_usb_ids(srv.url, self.dir / "two_step" / "usb.ids")
+        build_sqlite_from_usb_ids(two_step.path, self.dir / "two_step.sqlite", vacuum=True)
+
+        self.assertEqual(streamed.result.sha256, two_step.sha256)
+        self.assertEqual(
+            (self.dir / "streamed.sqlite").read_bytes(),
+            (self.dir / "two_step.sqlite").read_bytes(),
+        )
+
+    def test_not_modified_replays_saved_file(self) -> None:
+        out = self.dir / "usb.ids"
+        with serve(BODY) as srv:
+            download_usb_ids(srv.url, out)
+            stream = StreamedDownload(srv.url, out)
+            self.assertTrue(stream.wait_ready())
+            lines = list(stream)
+        self.assertEqual(stream.result.status, 304)
+        with _open_usb_ids(out) as f:
+            self.assertEqual(lines, list(f))
+
+    def test_consumer_can_stop_early(self) -> None:
+        with serve(BODY, handler=ThrottledHandler) as srv:
+            stream = StreamedDownload(srv.url, self.dir / "usb.ids", chunk_size=1000, queue_depth=2)
+            for i, _ in enumerate(stream):
+                if i == 10:
+                    break
+        self.assertIsNone(stream.result)
+        self.assertFalse((self.dir / "usb.ids").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import TaskGraph
+
+
+class TaskGraphTest(unittest.TestCase):
+    def test_dependencies_receive_results(self) -> None:
+        graph = TaskGraph()
+        graph.add("a", lambda: 2)
+        graph.add("b", lambda: 3)
+        graph.add("sum", lambda a, b: a + b, "a", "b")
+        graph.add("double", lambda s: s * 2, "sum")
+        self.assertEqual(graph.run(workers=4), {"a": 2, "b": 3, "sum": 5, "double": 10})
+
+    def test_independent_tasks_overlap(self) -> None:
+        barrier = threading.Barrier(3, timeout=5)
+        graph = TaskGraph()
+        for name in ("sql", "gz", "xz"):
+            graph.add(name, barrier.wait)
+        self.assertEqual(len(graph.run(workers=3)), 3)
+
+    def test_first_declared_failure_wins_and_dependents_never_start(self) -> None:
+        started = []
+
+        def fail(message: str, delay: float):
+            def run():
+                time.sleep(delay)
+                raise RuntimeError(message)
+
+            return run
+
+        graph = TaskGraph()
+        graph.add("sql", fail("sql failed", 0.05))
+        graph.add("gz", fail("gz failed", 0.0))
+        graph.add("gz.sha256", lambda gz: started.append("gz.sha256"), "gz")
+        with self.assertRaisesRegex(RuntimeError, "sql failed"):
+            graph.run(workers=2)
+        self.assertEqual(started, [])
+
+    def test_unknown_dependency(self) -> None:
+        graph = TaskGraph()
+        with self.assertRaises(ValueError):
+            graph.add("gz.sha256", lambda gz: None, "gz")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import OUTPUT_WRITERS
+from usbids_cache import _TOOL_SOURCES, BuildCache, build_key
+
+
+class BuildCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.cache = BuildCache(self.dir / "cache", max_bytes=10_000)
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _files(self, tag: str, size: int = 1000) -> dict:
+        src = self.dir / "src" / tag
+        src.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for role in ("sql", "gz"):
+            path = src / role
+            path.write_bytes((tag + role).encode() * (size // len(tag + role)))
+            files[role] = path
+        return files
+
+    def test_key_covers_input_and_options(self) -> None:
+        key = build_key("a" * 64, {"schema": "compat"})
+        self.assertEqual(key, build_key("a" * 64, {"schema": "compat"}))
+        self.assertNotEqual(key, build_key("b" * 64, {"schema": "compat"}))
+        self.assertNotEqual(key, build_key("a" * 64, {"schema": "lookup"}))
+
+    def test_fingerprint_covers_every_output_writer(self) -> None:
+        for module, _ in OUTPUT_WRITERS.values():
+            self.assertIn(f"{module}.py", _TOOL_SOURCES)
+        # Imported by the writers and the build, not listed by hand.
+        self.assertIn("build_usbids_db.py", _TOOL_SOURCES)
+        self.assertIn("usbids_sync.py", _TOOL_SOURCES)
+
+    def test_store_and_restore(self) -> None:
+        files = self._files("one")
+        self.cache.store("k1", files)
+        self.assertIsNone(self.cache.restore("k2", {"sql": self.dir / "out.sql"}))
+
+        targets = {"sql": self.dir / "out" / "usbids.sql", "gz": self.dir / "out" / "usbids.sqlite.gz"}
+        targets["sql"].parent.mkdir()
+        restored = self.cache.restore("k1", targets)
+        self.assertEqual([f.path for f in restored], list(targets.values()))
+        for role, target in targets.items():
+            self.assertEqual(target.read_bytes(), files[role].read_bytes())
+            self.assertEqual(restored[list(targets).index(role)].sha256, hashlib.sha256(target.read_bytes()).hexdigest())
+
+    def test_corrupt_entry_is_dropped_and_targets_untouched(self) -> None:
+        self.cache.store("k1", self._files("one"))
+        (self.cache.root / "k1" / "gz").write_bytes(b"garbage")
+        target = self.dir / "usbids.sql"
+        target.write_bytes(b"previous")
+
+        self.assertIsNone(self.cache.restore("k1", {"sql": target, "gz": self.dir / "usbids.sqlite.gz"}))
+        self.assertEqual(target.read_bytes(), b"previous")
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir()), ["cache", "src", "usbids.sql"])
+        self.assertIsNone(self.cache.lookup("k1"))
+
+    def test_evicts_least_recently_used(self) -> None:
+        for i, key in enumerate(("k1", "k2", "k3")):
+            self.cache.store(key, self._files(key, size=1500))
+            manifest = self.cache.root / key / "manifest.json"
+            os.utime(manifest, (1000 + i, 1000 + i))
+        self.cache.lookup("k1")  # now the most recently used
+
+        self.cache.store("k4", self._files("k4", size=1500))
+        self.assertEqual(sorted(m["key"] for m in self.cache.entries()), ["k1", "k3", "k4"])
+        self.assertLessEqual(sum(m["size"] for m in self.cache.entries()), self.cache.max_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import build_sqlite_from_usb_ids, dump_sql
+from usbids_delta import apply_delta, content_digest, diff_catalogs, open_catalog, read_delta, write_delta
+
+
+def _usb_ids(version: str, edited: bool = False) -> str:
+    lines = [f"# Version: {version}\n"]
+    for vid in range(1, 300):
+        if edited and vid == 9:
+            continue
+        lines.append(f"{vid:04x}  Vendor {vid}\n")
+        lines.append(f"\t0001  {'Renamed' if edited and vid == 5 else 'Receiver'} {vid}\n")
+        if vid == 0x46:
+            lines.append("\t\t00  Keyboard Interface\n")
+            if edited:
+                lines.append("\t\t01  Mouse Interface\n")
+    lines.append("C 03  Human Interface Device\n\t01  Boot Interface Subclass\n")
+    if edited:
+        lines.append("\t\t02  Mouse\n")
+    return "".join(lines)
+
+
+class CatalogDeltaTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.base = self._build("base", _usb_ids("2024.01.01"))
+        self.target = self._build("target", _usb_ids("2024.02.01", edited=True))
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _build(self, name: str, text: str, **kwargs) -> Path:
+        ids = self.dir / f"{name}.ids"
+        ids.write_text(text, encoding="utf-8")
+        out = self.dir / f"{name}.sqlite"
+        build_sqlite_from_usb_ids(ids, out, vacuum=True, **kwargs)
+        return out
+
+    def _digest(self, db: Path) -> str:
+        con = sqlite3.connect(db)
+        try:
+            return content_digest(con)
+        finally:
+            con.close()
+
+    def _diff(self, base: Path, target: Path) -> dict:
+        cons = [open_catalog(base), open_catalog(target)]
+        try:
+            return diff_catalogs(*cons)
+        finally:
+            for con in cons:
+                con.close()
+
+    def test_diff_and_apply_reach_the_target(self) -> None:
+        delta = self._diff(self.base, self.target)
+        tables = delta["tables"]
+        self.assertEqual(tables["meta"], {"update": [["version", "2024.02.01"]]})
+        self.assertEqual(tables["vendors"], {"delete": [[9]]})
+        self.assertEqual(tables["products"], {"update": [[5, 1, "Renamed 5"]], "delete": [[9, 1]]})
+        self.assertEqual(tables["interfaces"], {"insert": [[0x46, 1, 1, "Mouse Interface"]]})
+        self.assertEqual(tables["usb_protocols"], {"insert": [[3, 1, 2, "Mouse"]]})
+
+        path = self.dir / "delta.json.gz"
+        write_delta(delta, path)
+        self.assertEqual(read_delta(path), delta)
+
+        patched = self.dir / "patched.sqlite"
+        patched.write_bytes(self.base.read_bytes())
+        self.assertEqual(apply_delta(patched, read_delta(path)), (2, 2, 2))
+        self.assertEqual(self._digest(patched), delta["target_sha256"])
+        self.assertEqual(self._digest(patched), self._digest(self.target))
+
+        # A .sql dump diffs the same as its DB; an unchanged pair is empty.
+        sql = self.dir / "base.sql"
+        dump_sql(self.base, sql, "test")
+        self.assertEqual(self._diff(sql, self.target), delta)
+        self.assertEqual(self._diff(patched, self.target)["tables"], {})
+
+    def test_search_index_follows_the_delta(self) -> None:
+        base = self._build("indexed", _usb_ids("2024.01.01"), search_index=True)
+        apply_delta(base, self._diff(base, self.target))
+        con = sqlite3.connect(base)
+        try:
+            hits = con.execute("SELECT rowid FROM name_search WHERE name_search MATCH 'Renamed'").fetchall()
+        finally:
+            con.close()
+        self.assertEqual(hits, [((5 << 16) | 1,)])
+
+    def test_wrong_base_is_refused(self) -> None:
+        delta = self._diff(self.base, self.target)
+        before = self.target.read_bytes()
+        with self.assertRaisesRegex(ValueError, "base mismatch"):
+            apply_delta(self.target, delta)
+        self.assertEqual(self.target.read_bytes(), before)
+
+    def test_target_mismatch_rolls_back(self) -> None:
+        delta = self._diff(self.base, self.target)
+        delta["target_sha256"] = "0" * 64
+        patched = self.dir / "patched.sqlite"
+        patched.write_bytes(self.base.read_bytes())
+        with self.assertRaisesRegex(ValueError, "target mismatch"):
+            apply_delta(patched, delta)
+        self.assertEqual(self._digest(patched), self._digest(self.base))
+
+
+if __name__ == "__main__":
+    unittest.main()
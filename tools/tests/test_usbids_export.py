@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import csv
+import json
+import sqlite3
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import TABLE_COLUMNS, build_sqlite_from_usb_ids
+from usbids_export import EXPORT_FORMATS, export_catalog, export_table, read_packed
+
+USB_IDS = (
+    "# Version: 2024.01.01\n"
+    + "".join(
+        f'{vid:04x}  Vendör {vid}, "Ltd"\n' + "".join(f"\t{pid:04x}  Prodüct {vid}/{pid} – 東芝\n" for pid in range(1, 8))
+        for vid in range(1, 3000)
+    )
+    + "\t\t01  Interface\n"
+    + "C 03  Human Interface Device\n\t01  Boot Interface Subclass\n\t\t02  Mouse\n"
+    + "HUT 01  Generic Desktop Controls\n\t0002  Mouse\n"
+)
+
+
+class ExportTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._td = tempfile.TemporaryDirectory()
+        cls.dir = Path(cls._td.name)
+        ids = cls.dir / "usb.ids"
+        ids.write_text(USB_IDS, encoding="utf-8")
+        cls.db = cls.dir / "usbids.sqlite"
+        build_sqlite_from_usb_ids(ids, cls.db, vacuum=True)
+        con = sqlite3.connect(cls.db)
+        try:
+            cls.rows = {
+                t: con.execute(f"SELECT {', '.join(c)} FROM {t} ORDER BY {', '.join(c[:-1])}").fetchall()
+                for t, c in TABLE_COLUMNS.items()
+            }
+        finally:
+            con.close()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls._td.cleanup()
+
+    def test_formats_round_trip(self) -> None:
+        for fmt in EXPORT_FORMATS:
+            out = self.dir / fmt
+            manifest = export_catalog(self.db, out, fmt, workers=4)
+            self.assertEqual(json.loads((out / "export.json").read_text(encoding="utf-8")), manifest)
+            for table, cols in TABLE_COLUMNS.items():
+                entry = manifest["tables"][table]
+                path = out / entry["file"]
+                if fmt == "ndjson":
+                    with path.open(encoding="utf-8") as f:
+                        back = [tuple(json.loads(line)[c] for c in cols) for line in f]
+                elif fmt == "csv":
+                    with path.open(encoding="utf-8", newline="") as f:
+                        reader = csv.reader(f)
+                        self.assertEqual(next(reader), list(cols))
+                        text_cols = ("name", "key", "value")
+                        back = [tuple(v if c in text_cols else int(v) for c, v in zip(cols, row)) for row in reader]
+                else:
+                    back = list(read_packed(path, entry))
+                    self.assertEqual(path.stat().st_size, entry["record_size"] * len(back))
+                self.assertEqual(back, self.rows[table], f"{fmt} {table}")
+                self.assertEqual(entry["rows"], len(self.rows[table]))
+
+        layout = {c["name"]: c for c in manifest["tables"]["products"]["layout"]}
+        self.assertEqual((layout["vid"]["format"], layout["pid"]["format"]), ("H", "B"))
+
+    def test_output_is_deterministic(self) -> None:
+        def snapshot(out: Path) -> dict:
+            return {p.name: p.read_bytes() for p in sorted(out.iterdir())}
+
+        export_catalog(self.db, self.dir / "serial", "csv", workers=1)
+        export_catalog(self.db, self.dir / "parallel", "csv", workers=8, batch_rows=7)
+        self.assertEqual(snapshot(self.dir / "serial"), snapshot(self.dir / "parallel"))
+
+    def test_memory_is_bounded_by_the_batch(self) -> None:
+        out = self.dir / "bounded" / "products.ndjson"
+        tracemalloc.start()
+        try:
+            written, _ = export_table(self.db, "products", out, "ndjson", batch_rows=200)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(written.size, 1_000_000)
+        self.assertLess(peak, written.size // 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import build_sqlite_from_usb_ids
+from usbids_delta import content_digest
+from usbids_history import CatalogHistory, ingest_catalog, ingest_usb_ids
+
+
+def _usb_ids(version: str, receiver: str, drop_vendor: bool = False, added: bool = False) -> str:
+    lines = [f"# Version: {version}\n"]
+    for vid in range(1, 400):
+        if drop_vendor and vid == 7:
+            continue
+        lines.append(f"{vid:04x}  Vendor {vid}\n")
+        lines.append(f"\t0001  Receiver {vid}\n")
+        if vid == 0x46:
+            lines.append(f"\tc52b  {receiver}\n")
+            if added:
+                lines.append("\t\t01  Keyboard Interface\n")
+    lines.append("C 03  Human Interface Device\n\t01  Boot Interface Subclass\n")
+    return "".join(lines)
+
+
+SNAPSHOTS = [
+    ("2023.01.01", _usb_ids("2023.01.01", "Unifying Receiver")),
+    ("2024.01.01", _usb_ids("2024.01.01", "Unifying Receiver (2nd gen)", drop_vendor=True, added=True)),
+    ("2025.01.01", _usb_ids("2025.01.01", "Unifying Receiver")),
+]
+
+
+class CatalogHistoryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.store = self.dir / "history.sqlite"
+        self.builds = []
+        for label, text in SNAPSHOTS:
+            ids = self.dir / f"{label}.ids"
+            ids.write_text(text, encoding="utf-8")
+            db = self.dir / f"{label}.sqlite"
+            build_sqlite_from_usb_ids(ids, db, vacuum=True)
+            self.builds.append(db)
+        self.ingested = [ingest_usb_ids(self.store, self.dir / "2023.01.01.ids")]
+        self.ingested += [ingest_catalog(self.store, db) for db in self.builds[1:]]
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def test_every_version_reads_back_as_its_snapshot(self) -> None:
+        with CatalogHistory(self.store) as hist:
+            self.assertEqual([label for _, label, _ in hist.versions()], [label for label, _ in SNAPSHOTS])
+            for (label, _), db in zip(SNAPSHOTS, self.builds):
+                out = self.dir / "materialized" / f"{label}.sqlite"
+                hist.materialize(label, out)
+                cons = [hist.as_of(label), sqlite3.connect(out), sqlite3.connect(db)]
+                try:
+                    self.assertEqual(len({content_digest(con) for con in cons}), 1)
+                finally:
+                    for con in cons:
+                        con.close()
+
+        # Only changed rows are stored again: far smaller than three DBs.
+        self.assertLess(self.store.stat().st_size, sum(db.stat().st_size for db in self.builds) / 2)
+        self.assertEqual(self.ingested[1][1]["vendors"], (0, 1))
+        self.assertEqual(self.ingested[1][1]["products"], (1, 2))
+
+    def test_name_history_and_point_lookup(self) -> None:
+        with CatalogHistory(self.store) as hist:
+            self.assertEqual(
+                hist.history("products", (0x46, 0xC52B)),
+                [
+                    ("2023.01.01", "2024.01.01", "Unifying Receiver"),
+                    ("2024.01.01", "2025.01.01", "Unifying Receiver (2nd gen)"),
+                    ("2025.01.01", None, "Unifying Receiver"),
+                ],
+            )
+            self.assertEqual(
+                hist.history("vendors", (7,)),
+                [("2023.01.01", "2024.01.01", "Vendor 7"), ("2025.01.01", None, "Vendor 7")],
+            )
+            self.assertEqual(hist.lookup("vendors", (7,), "2023.01.01"), "Vendor 7")
+            self.assertIsNone(hist.lookup("vendors", (7,), "2024.01.01"))
+            self.assertEqual(hist.lookup("products", (0x46, 0xC52B), 2), "Unifying Receiver (2nd gen)")
+            self.assertEqual(hist.lookup("interfaces", (0x46, 0xC52B, 1), "latest"), None)
+            self.assertEqual(hist.lookup("meta", ("version",), "2024.01.01"), "2024.01.01")
+
+            plan = " ".join(
+                row[-1]
+                for row in hist.con.execute(
+                    "EXPLAIN QUERY PLAN SELECT name FROM products_history WHERE vid=1 AND pid=1 AND valid_from <= 2"
+                )
+            )
+            self.assertIn("PRIMARY KEY", plan)
+            with self.assertRaises(KeyError):
+                hist.as_of("1999.01.01")
+
+    def test_version_labels_are_unique(self) -> None:
+        with self.assertRaises(ValueError):
+            ingest_catalog(self.store, self.builds[2])
+        version, counts = ingest_catalog(self.store, self.builds[2], label="2025.01.01-rebuild")
+        self.assertEqual((version, counts), (4, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import usbids_index
+from update_usbids_artifacts import build_sqlite_from_usb_ids
+from usbids_index import SECTIONS, LookupIndex, write_lookup_index
+
+# Boundary IDs at both ends of every key range, shared and non-ASCII names.
+USB_IDS = "".join(
+    [
+        "# Version: 2024.01.01\n",
+        "0000  Zero Vendor\n\t0000  Zero Product\n\tffff  Last Product\n",
+        *(f"{vid:04x}  Vendor {vid}\n\t{vid:04x}  Gerät {vid % 5}\n\t0001  Receiver\n" for vid in range(3, 2000, 7)),
+        "ffff  Last Vendor\n\t0000  Receiver\n\tffff  Gerät 0\n",
+        "C 00  (Defined at Interface level)\n",
+        "C 03  Human Interface Device\n\t00  No Subclass\n\t01  Boot Interface Subclass\n\t\t00  None\n\t\t02  Mouse\n",
+        "C ff  Vendor Specific Class\n\tff  Vendor Specific Subclass\n\t\tff  Vendor Specific Protocol\n",
+        "HUT 01  Generic Desktop Controls\n\t000  Undefined\n\t002  Mouse\n",
+        "HUT ff  Last Page\n\tffff  Last Usage\n",
+    ]
+)
+
+
+class LookupIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        ids = self.dir / "usb.ids"
+        ids.write_text(USB_IDS, encoding="utf-8")
+        self.db = self.dir / "usbids.sqlite"
+        build_sqlite_from_usb_ids(ids, self.db, vacuum=True)
+        self.index = self.dir / "usbids.idx"
+        self.counts, _ = write_lookup_index(self.db, self.index)
+
+        con = sqlite3.connect(self.db)
+        try:
+            self.rows = {name: dict(con.execute(sql)) for name, sql in SECTIONS.items()}
+        finally:
+            con.close()
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _check_against_db(self, idx: LookupIndex) -> None:
+        for section, rows in self.rows.items():
+            with self.subTest(section=section):
+                self.assertEqual(self.counts[section], len(rows))
+                for key, name in rows.items():
+                    self.assertEqual(idx.lookup(section, key), name)
+                    for near in (key - 1, key + 1):
+                        if near >= 0 and near not in rows:
+                            self.assertIsNone(idx.lookup(section, near))
+
+    def test_every_row_matches_the_db(self) -> None:
+        self.assertEqual(self.counts["products"], 2 * len(range(3, 2000, 7)) + 4)
+        with LookupIndex(self.index) as idx:
+            self._check_against_db(idx)
+            self.assertEqual(idx.vendor_name(0x0000), "Zero Vendor")
+            self.assertEqual(idx.vendor_name(0xFFFF), "Last Vendor")
+            self.assertEqual(idx.product_name(0x0000, 0x0000), "Zero Product")
+            self.assertEqual(idx.product_name(0xFFFF, 0xFFFF), "Gerät 0")
+            self.assertEqual(idx.class_name(0x00), "(Defined at Interface level)")
+            self.assertEqual(idx.subclass_name(0x03, 0x00), "No Subclass")
+            self.assertEqual(idx.protocol_name(0xFF, 0xFF, 0xFF), "Vendor Specific Protocol")
+            self.assertEqual(idx.hid_usage_name(0x01, 0x0000), "Undefined")
+            self.assertEqual(idx.hid_usage_name(0xFF, 0xFFFF), "Last Usage")
+            self.assertEqual(bytes(idx.raw("products", (0xFFFF << 16) | 0xFFFF)), "Gerät 0".encode("utf-8"))
+
+    def test_misses(self) -> None:
+        with LookupIndex(self.index) as idx:
+            self.assertIsNone(idx.vendor_name(0x0001))
+            self.assertIsNone(idx.product_name(0x0000, 0x0001))
+            self.assertIsNone(idx.product_name(0x0001, 0x0000))
+            self.assertIsNone(idx.product_name(0xFFFF, 0xFFFE))
+            self.assertIsNone(idx.class_name(0xFE))
+            self.assertIsNone(idx.subclass_name(0xFF, 0x00))
+            self.assertIsNone(idx.protocol_name(0x03, 0x01, 0x01))
+            self.assertIsNone(idx.hid_usage_name(0x01, 0x0001))
+            self.assertIsNone(idx.lookup("hid_usages", (0xFF << 16) | 0xFFFE))
+            self.assertIsNone(idx.lookup("vendors", 0xFFFFFFFF))
+
+    def test_big_endian_reader(self) -> None:
+        with mock.patch.object(usbids_index.sys, "byteorder", "big"):
+            idx = LookupIndex(self.index)
+        with idx:
+            self._check_against_db(idx)
+
+    def test_rejects_other_files(self) -> None:
+        short = self.dir / "short.idx"
+        short.write_bytes(self.index.read_bytes()[:8])
+        empty = self.dir / "empty.idx"
+        empty.write_bytes(b"")
+        for path in (self.db, short, empty):
+            with self.subTest(path=path.name):
+                opened = []
+                real_open, real_mmap = Path.open, usbids_index.mmap.mmap
+
+                def record(real):
+                    return lambda *args, **kwargs: opened.append(real(*args, **kwargs)) or opened[-1]
+
+                with mock.patch.object(Path, "open", record(real_open)), mock.patch.object(
+                    usbids_index.mmap, "mmap", record(real_mmap)
+                ):
+                    with self.assertRaisesRegex(ValueError, "Not a usbids lookup index"):
+                        LookupIndex(path)
+                # Neither the file nor the map is left open.
+                self.assertTrue(opened)
+                self.assertTrue(all(f.closed for f in opened))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import pstats
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import build_sqlite_from_usb_ids
+from usbids_metrics import StageRecorder, read_metrics
+
+USB_IDS = "1d6b  Linux Foundation\n\t0002  2.0 root hub\n\t0003  3.0 root hub\nC 09  Hub\n"
+
+
+class StageRecorderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def test_build_stages_are_written_as_json_lines(self) -> None:
+        ids = self.dir / "usb.ids"
+        ids.write_text(USB_IDS, encoding="utf-8")
+        metrics = self.dir / "metrics" / "run.jsonl"
+        recorder = StageRecorder(metrics, profile_stage="parse", profile_out=self.dir / "parse.pstats")
+
+        build_sqlite_from_usb_ids(ids, self.dir / "usbids.sqlite", vacuum=True, recorder=recorder)
+        recorder.finish(result="built")
+
+        records = read_metrics(metrics)
+        self.assertEqual(records, recorder.records)
+        self.assertEqual([r["stage"] for r in records], ["parse", "load", "index", "vacuum", "write", "total"])
+        self.assertEqual({r["run"] for r in records}, {recorder.run_id})
+        by_stage = {r["stage"]: r for r in records}
+        self.assertEqual(by_stage["parse"]["bytes_read"], ids.stat().st_size)
+        self.assertEqual(by_stage["load"]["rows"]["products"], 2)
+        self.assertEqual(by_stage["write"]["bytes_written"], (self.dir / "usbids.sqlite").stat().st_size)
+        self.assertTrue(all(r["seconds"] >= 0 for r in records))
+        self.assertGreater(pstats.Stats(by_stage["parse"]["profile"]).total_calls, 0)
+
+    def test_failed_stage_is_recorded(self) -> None:
+        recorder = StageRecorder()
+        with self.assertRaises(ValueError):
+            with recorder.stage("gzip"):
+                raise ValueError("boom")
+        self.assertEqual(recorder.records[-1]["error"], "ValueError: boom")
+
+
+if __name__ == "__main__":
+    unittest.main()
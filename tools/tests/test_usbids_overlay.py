@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import build_sqlite_from_usb_ids
+from usbids_lookup import UsbIdsLookup
+from usbids_overlay import OVERLAY_TABLES, compile_overlay, merge_overlay
+
+UPSTREAM = """\
+# Version: 2024.01.01
+1d6b  Linux Foundation
+\t0002  2.0 root hub
+\t0003  3.0 root hub
+046d  Logitech, Inc.
+\tc52b  Unifying Receiver
+C 03  Human Interface Device
+\t01  Boot Interface Subclass
+"""
+
+OVERRIDES = """\
+1d6b  Linux Foundation (lab)
+\t0002  2.0 root hub (lab)
+\tbeef  Lab gadget
+\t\t00  Lab interface
+f00d  Acme Internal
+\t0001  Prototype
+C 03  Human Interface Device
+\t01  Boot
+"""
+
+
+class OverlayTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.base = self._build("base", UPSTREAM)
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _build(self, name: str, text: str, **kwargs) -> Path:
+        ids = self.dir / f"{name}.ids"
+        ids.write_text(text, encoding="utf-8")
+        db = self.dir / f"{name}.sqlite"
+        build_sqlite_from_usb_ids(ids, db, vacuum=True, **kwargs)
+        return db
+
+    def _compile(self, name: str, text: str) -> Path:
+        ids = self.dir / f"{name}.ids"
+        ids.write_text(text, encoding="utf-8")
+        db = self.dir / f"{name}.sqlite"
+        compile_overlay(ids, db)
+        return db
+
+    def _rows(self, db: Path) -> dict:
+        con = sqlite3.connect(str(db))
+        try:
+            return {t: con.execute(f"SELECT * FROM {t}").fetchall() for t in OVERLAY_TABLES}
+        finally:
+            con.close()
+
+    def test_merge_matches_build_of_appended_input(self) -> None:
+        overlay = self._compile("overlay", OVERRIDES)
+        merged = self.dir / "merged.sqlite"
+        counts = merge_overlay(self.base, overlay, merged)
+
+        self.assertEqual(self._rows(merged), self._rows(self._build("appended", UPSTREAM + OVERRIDES)))
+        # The subclass and class rows already matched, so only real changes count.
+        self.assertEqual(counts, {"vendors": 2, "products": 3, "interfaces": 1, "usb_subclasses": 1})
+
+    def test_remerging_an_edited_overlay_starts_from_base(self) -> None:
+        base_bytes = self.base.read_bytes()
+        merged = self.dir / "merged.sqlite"
+        merge_overlay(self.base, self._compile("v1", OVERRIDES), merged)
+        merge_overlay(self.base, self._compile("v2", "f00d  Acme Internal\n"), merged)
+
+        self.assertEqual(self.base.read_bytes(), base_bytes)
+        with UsbIdsLookup(merged) as lookup:
+            self.assertEqual(lookup.vendor_name(0x1D6B), "Linux Foundation")
+            self.assertIsNone(lookup.product_name(0x1D6B, 0xBEEF))
+            self.assertEqual(lookup.vendor_name(0xF00D), "Acme Internal")
+
+    def test_merge_rebuilds_search_index(self) -> None:
+        base = self._build("searchable", UPSTREAM, search_index=True)
+        merge_overlay(base, self._compile("overlay", OVERRIDES))
+        with UsbIdsLookup(base) as lookup:
+            self.assertEqual([(h.vid, h.pid) for h in lookup.search("gadget")], [(0x1D6B, 0xBEEF)])
+
+    def test_layered_lookup_priority(self) -> None:
+        high = self._compile("high", "1d6b  Linux Foundation (high)\n")
+        low = self._compile("low", OVERRIDES)
+        with UsbIdsLookup(self.base, overlays=[high, low]) as lookup:
+            self.assertEqual(lookup.vendor_name(0x1D6B), "Linux Foundation (high)")
+            self.assertEqual(lookup.product_name(0x1D6B, 0x0002), "2.0 root hub (lab)")
+            self.assertEqual(lookup.product_name(0x1D6B, 0x0003), "3.0 root hub")
+            self.assertEqual(lookup.usb_subclass_name(0x03, 0x01), "Boot")
+            self.assertIsNone(lookup.vendor_name(0x1234))
+            self.assertEqual(
+                lookup.resolve_many([(0x1D6B, 0xBEEF), (0x046D, 0xC52B), (0xF00D, 0x0002)]),
+                [
+                    ("Linux Foundation (high)", "Lab gadget"),
+                    ("Logitech, Inc.", "Unifying Receiver"),
+                    ("Acme Internal", None),
+                ],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import update_usbids_artifacts
+from build_usbids_db import load_sql_dump
+from update_usbids_artifacts import build_sqlite_from_usb_ids, dump_sql
+from usbids_lookup import SearchHit, UsbIdsLookup
+
+USB_IDS = """\
+10c4  Silicon Labs
+\tea60  CP210x UART Bridge
+\tea70  CP2105 Dual UART Bridge
+046d  Logitech, Inc.
+\tc52b  Unifying Receiver
+1a86  QinHeng Electronics
+\t7523  CH340 serial converter
+"""
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.ids = self.dir / "usb.ids"
+        self.ids.write_text(USB_IDS, encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _search(self, db: Path, query: str, limit: int = 20):
+        with UsbIdsLookup(db) as lookup:
+            return lookup.search(query, limit)
+
+    def _build(self, name: str = "usbids.sqlite") -> Path:
+        db = self.dir / name
+        build_sqlite_from_usb_ids(self.ids, db, vacuum=True, search_index=True)
+        return db
+
+    def test_trigram_substring_search(self) -> None:
+        db = self._build()
+        self.assertEqual(
+            {(h.vid, h.pid) for h in self._search(db, "cp210")},
+            {(0x10C4, 0xEA60), (0x10C4, 0xEA70)},
+        )
+        self.assertEqual([h.pid for h in self._search(db, "cp210x bridge")], [0xEA60])
+        self.assertEqual(self._search(db, "gitech"), [SearchHit("vendor", 0x046D, None, "Logitech, Inc.")])
+        self.assertEqual(len(self._search(db, "uart", limit=1)), 1)
+
+    def test_short_query_uses_name_prefix(self) -> None:
+        db = self._build()
+        self.assertEqual(
+            self._search(db, "CH"),
+            [SearchHit("product", 0x1A86, 0x7523, "CH340 serial converter")],
+        )
+        self.assertEqual(self._search(db, "%"), [])
+
+    def test_short_terms_match_word_starts_with_the_rest(self) -> None:
+        db = self._build()
+        # Each short term is ANDed with the others, not taken as a name prefix.
+        self.assertEqual([h.pid for h in self._search(db, "uart du")], [0xEA70])
+        self.assertEqual([h.pid for h in self._search(db, "cp bridge")], [0xEA60, 0xEA70])
+        self.assertEqual([h.name for h in self._search(db, "serial ch")], ["CH340 serial converter"])
+        self.assertEqual(self._search(db, "uart x"), [])
+        self.assertEqual(self._search(db, "la si"), [SearchHit("vendor", 0x10C4, None, "Silicon Labs")])
+        self.assertEqual(self._search(db, "in"), [SearchHit("vendor", 0x046D, None, "Logitech, Inc.")])
+
+    def test_prefix_tokenizer_fallback(self) -> None:
+        tokenizers = update_usbids_artifacts.SEARCH_TOKENIZERS[1:]
+        with mock.patch.object(update_usbids_artifacts, "SEARCH_TOKENIZERS", tokenizers):
+            db = self._build()
+        self.assertEqual([h.name for h in self._search(db, "unify rec")], ["Unifying Receiver"])
+        self.assertEqual(self._search(db, "nifying"), [])
+
+    def test_dump_recreates_index(self) -> None:
+        db = self._build()
+        sql = self.dir / "usbids.sql"
+        dump_sql(db, sql, "test")
+        rebuilt = self.dir / "rebuilt.sqlite"
+        con = sqlite3.connect(str(rebuilt))
+        try:
+            load_sql_dump(con, sql)
+        finally:
+            con.close()
+        self.assertEqual(self._search(rebuilt, "bridge"), self._search(db, "bridge"))
+
+    def test_missing_index(self) -> None:
+        db = self.dir / "plain.sqlite"
+        build_sqlite_from_usb_ids(self.ids, db, vacuum=True)
+        with self.assertRaises(LookupError):
+            self._search(db, "uart")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from update_usbids_artifacts import _write_sha256_sidecar, build_sqlite_from_usb_ids, gzip_file
+from usbids_lookup import UsbIdsLookup
+from usbids_server import ResolverServer
+
+USB_IDS = """\
+046d  Logitech, Inc.
+\tc52b  Unifying Receiver
+1d6b  Linux Foundation
+\t0002  2.0 root hub
+C 03  Human Interface Device
+\t01  Boot Interface Subclass
+\t\t02  Mouse
+HUT 01  Generic Desktop Controls
+\t002  Mouse
+"""
+
+
+class ResolverServerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.artifact = self.dir / "out" / "usbids.sqlite.gz"
+        self._publish(USB_IDS)
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _publish(self, text: str, sidecar: bool = True) -> None:
+        """Writes the artifact the way the pipeline does: gzip first, then its sidecar."""
+        ids = self.dir / "usb.ids"
+        ids.write_text(text, encoding="utf-8")
+        db = self.dir / "usbids.sqlite"
+        build_sqlite_from_usb_ids(ids, db, vacuum=True)
+        written = gzip_file(db, self.artifact)
+        if sidecar:
+            _write_sha256_sidecar(self.artifact, Path(str(self.artifact) + ".sha256"), written.sha256)
+
+    def _run(self, scenario) -> None:
+        async def main() -> None:
+            server = ResolverServer(self.artifact, work_dir=self.dir / "work", poll_interval=0.02)
+            try:
+                srv = await server.start()
+                host, port = srv.sockets[0].getsockname()[:2]
+                reader, writer = await asyncio.open_connection(host, port)
+
+                async def ask(request) -> dict:
+                    line = request if isinstance(request, bytes) else json.dumps(request).encode()
+                    writer.write(line + b"\n")
+                    await writer.drain()
+                    return json.loads(await reader.readline())
+
+                try:
+                    await scenario(server, ask)
+                finally:
+                    writer.close()
+            finally:
+                await server.close()
+
+        asyncio.run(main())
+
+    def test_batched_resolve_and_errors(self) -> None:
+        async def scenario(server, ask) -> None:
+            response = await ask(
+                {
+                    "id": 7,
+                    "queries": [
+                        ["product", 0x046D, 0xC52B],
+                        ["vendor", 0x1D6B],
+                        ["product", 0x046D, 0xFFFF],
+                        ["protocol", 3, 1, 2],
+                        ["hid_usage", 1, 2],
+                        ["product", 0x046D, 0xC52B],
+                    ],
+                }
+            )
+            self.assertEqual(
+                response["results"],
+                ["Unifying Receiver", "Linux Foundation", None, "Mouse", "Mouse", "Unifying Receiver"],
+            )
+            self.assertEqual(response["id"], 7)
+            self.assertEqual(response["sha256"], server.digest)
+
+            self.assertIn("error", await ask({"id": 8, "queries": [["nope", 1]]}))
+            self.assertIn("error", await ask({"id": 9, "queries": [["product", 1]]}))
+            self.assertIn("error", await ask(b"{not json"))
+            # Same connection still answers, from the shared cache.
+            again = await ask({"id": 10, "queries": [["vendor", 0x1D6B]]})
+            self.assertEqual(again["results"], ["Linux Foundation"])
+            stats = await ask({"op": "stats"})
+            self.assertEqual(stats["errors"], 3)
+            self.assertGreaterEqual(stats["cache"]["hits"], 1)
+
+        self._run(scenario)
+
+    def test_hot_swap_on_sidecar_change(self) -> None:
+        async def wait_for(predicate) -> None:
+            for _ in range(250):
+                if predicate():
+                    return
+                await asyncio.sleep(0.02)
+            self.fail("timed out")
+
+        async def scenario(server, ask) -> None:
+            first = server.digest
+            self.assertEqual((await ask({"queries": [["vendor", 0x046D]]}))["results"], ["Logitech, Inc."])
+
+            # A new gzip without a matching sidecar yet is not picked up.
+            self._publish(USB_IDS.replace("Logitech, Inc.", "Logitech"), sidecar=False)
+            await asyncio.sleep(0.1)
+            self.assertEqual(server.digest, first)
+
+            # Warming the new DB must not block the loop: every lookup on a
+            # not yet installed DB runs on the staging thread.
+            lookup_many = UsbIdsLookup.lookup_many
+            calls = []
+
+            def spy(lookup, kind, keys):
+                calls.append((lookup is server.lookup, threading.current_thread() is threading.main_thread()))
+                return lookup_many(lookup, kind, keys)
+
+            with mock.patch.object(UsbIdsLookup, "lookup_many", spy):
+                _write_sha256_sidecar(self.artifact, Path(str(self.artifact) + ".sha256"))
+                await wait_for(lambda: server.digest != first)
+            warm_calls = [on_loop for installed, on_loop in calls if not installed]
+            self.assertTrue(warm_calls)
+            self.assertFalse(any(warm_calls))
+            self.assertEqual(server.lookup.cache.keys(), [("vendor", 0x046D)])
+            response = await ask({"queries": [["vendor", 0x046D]]})
+            self.assertEqual(response["results"], ["Logitech"])
+            self.assertEqual(response["sha256"], server.digest)
+            self.assertEqual(server.stats["swaps"], 1)
+            self.assertEqual(len(list((self.dir / "work").iterdir())), 1)
+
+        self._run(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from http_stub import serve
+
+import update_usbids_artifacts
+from update_usbids_artifacts import build_sqlite_from_usb_ids
+from usbids_delta import read_delta
+from usbids_sync import block_manifest, match_blocks, sync_file, weak_checksum, write_block_manifest
+
+
+def _usb_ids(renamed: int = -1, added: bool = False) -> str:
+    lines = ["# Version: 2024.01.01\n"]
+    for vid in range(1, 1500):
+        lines.append(f"{vid:04x}  Vendor {vid} Corporation\n")
+        lines.append(f"\t0001  {'Renamed' if vid == renamed else 'Wireless'} Receiver {vid}\n")
+        if added and vid == 700:
+            lines.append("\t0002  Added Keyboard\n")
+    lines.append("C 03  Human Interface Device\n")
+    return "".join(lines)
+
+
+class BlockSyncTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+        self.old = self._build("old", _usb_ids())
+        self.new = self._build("new", _usb_ids(renamed=300, added=True))
+        self.manifest_path = self.dir / "usbids.sqlite.blocks.json"
+        self.manifest, _ = write_block_manifest(self.new, self.manifest_path, file_name="usbids.sqlite")
+        self.local = self.dir / "local.sqlite"
+        self.local.write_bytes(self.old.read_bytes())
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _build(self, name: str, text: str) -> Path:
+        ids = self.dir / f"{name}.ids"
+        ids.write_text(text, encoding="utf-8")
+        out = self.dir / f"{name}.sqlite"
+        build_sqlite_from_usb_ids(ids, out, vacuum=True, schema="lookup")
+        return out
+
+    def _files(self):
+        return {
+            "/db/usbids.sqlite": self.new.read_bytes(),
+            "/db/usbids.sqlite.blocks.json": self.manifest_path.read_bytes(),
+        }
+
+    def test_manifest_describes_pages(self) -> None:
+        data = self.new.read_bytes()
+        self.assertEqual(self.manifest["block_size"], 4096)
+        self.assertEqual(self.manifest["size"], len(data))
+        self.assertEqual(len(self.manifest["blocks"]), len(data) // 4096)
+        self.assertEqual(self.manifest["blocks"][1][0], weak_checksum(data[4096:8192]))
+        self.assertEqual(block_manifest(self.new, file_name="usbids.sqlite"), self.manifest)
+        self.assertEqual(json.loads(self.manifest_path.read_text(encoding="utf-8")), self.manifest)
+
+    def test_sync_fetches_only_changed_blocks(self) -> None:
+        with serve(b"", files=self._files()) as srv:
+            base = f"http://127.0.0.1:{srv.server_address[1]}/db/"
+            result = sync_file(base + "usbids.sqlite.blocks.json", self.local)
+            ranges = [r["Range"] for r in srv.requests if "Range" in r]
+
+        self.assertEqual(self.local.read_bytes(), self.new.read_bytes())
+        self.assertEqual(result.sha256, self.manifest["sha256"])
+        self.assertGreater(result.blocks_reused, result.blocks // 2)
+        self.assertLess(result.bytes_fetched, result.size // 2)
+        self.assertEqual(result.bytes_fetched, (result.blocks - result.blocks_reused) * 4096)
+        self.assertEqual(len(ranges), result.requests)
+        self.assertTrue(all(r.startswith("bytes=") for r in ranges))
+
+    def test_missing_local_file_and_server_without_ranges(self) -> None:
+        out = self.dir / "fresh.sqlite"
+        with serve(b"", files=self._files()) as srv:
+            url = f"http://127.0.0.1:{srv.server_address[1]}/db/usbids.sqlite.blocks.json"
+            fresh = sync_file(url, self.dir / "absent.sqlite", out)
+        self.assertEqual(out.read_bytes(), self.new.read_bytes())
+        self.assertEqual((fresh.blocks_reused, fresh.requests), (0, 1))
+
+        with serve(b"", files=self._files(), honour_range=False) as srv:
+            url = f"http://127.0.0.1:{srv.server_address[1]}/db/usbids.sqlite.blocks.json"
+            sync_file(url, self.local)
+        self.assertEqual(self.local.read_bytes(), self.new.read_bytes())
+
+    def test_rolling_match_finds_shifted_blocks(self) -> None:
+        old = self.old.read_bytes()
+        aligned = match_blocks(self.manifest, old)
+        shifted = b"\x01\x02\x03" + old
+        self.assertLess(len(match_blocks(self.manifest, shifted)), len(aligned))
+        rolled = match_blocks(self.manifest, shifted, rolling=True)
+        self.assertGreaterEqual(len(rolled), len(aligned))
+        for index, offset in rolled.items():
+            self.assertEqual(self.manifest["blocks"][index][0], weak_checksum(shifted[offset : offset + 4096]))
+
+    def test_digest_mismatch_leaves_local_file(self) -> None:
+        files = self._files()
+        manifest = dict(self.manifest, sha256="0" * 64)
+        files["/db/usbids.sqlite.blocks.json"] = json.dumps(manifest).encode("utf-8")
+        with serve(b"", files=files) as srv:
+            url = f"http://127.0.0.1:{srv.server_address[1]}/db/usbids.sqlite.blocks.json"
+            with self.assertRaises(ValueError):
+                sync_file(url, self.local)
+        self.assertEqual(self.local.read_bytes(), self.old.read_bytes())
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir() if p.name.startswith(".")), [])
+
+    def test_delta_base_may_be_the_published_db(self) -> None:
+        out = self.dir / "out"
+        args = [
+            "update_usbids_artifacts.py",
+            "--no-vacuum",
+            "--out-sql", str(out / "usbids.sql"),
+            "--out-gz", str(out / "usbids.sqlite.gz"),
+            "--out-gz-sha256", str(out / "usbids.sqlite.gz.sha256"),
+            "--out-blocks", str(out / "usbids.sqlite.blocks.json"),
+        ]
+        for text, extra in (
+            (_usb_ids(), []),
+            (_usb_ids(renamed=300), ["--delta-base", str(out / "usbids.sqlite"), "--out-delta", str(out / "d.json")]),
+        ):
+            with serve(text.encode("utf-8")) as srv, contextlib.redirect_stdout(io.StringIO()):
+                with mock.patch.object(sys, "argv", [*args, "--url", srv.url, *extra]):
+                    update_usbids_artifacts.main()
+
+        # The published usbids.sqlite is overwritten during the run; the delta
+        # must still be taken against the previous build.
+        delta = read_delta(out / "d.json")
+        self.assertNotEqual(delta["base_sha256"], delta["target_sha256"])
+        self.assertEqual(delta["tables"], {"products": {"update": [[300, 1, "Renamed Receiver 300"]]}})
+
+
+if __name__ == "__main__":
+    unittest.main()
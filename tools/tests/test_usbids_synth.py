@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import update_usbids_artifacts
+from update_usbids_artifacts import (
+    TABLE_COLUMNS,
+    ParseState,
+    _table_counts,
+    build_sqlite_from_usb_ids,
+    iter_usb_ids_records,
+    iter_usb_ids_records_cascade,
+    iter_usb_ids_records_parallel,
+)
+from usbids_metrics import peak_rss_kib
+from usbids_synth import SynthSpec, expected_counts, expected_rows, iter_synthetic_usb_ids, write_synthetic_usb_ids
+
+# The scale test builds 250k products on the streaming path several times
+# (about a minute).
+LARGE_TESTS = os.environ.get("USBIDS_LARGE_TESTS") == "1"
+
+# Every edge case at a high rate, on a corpus small enough to compare row by row.
+EDGY = SynthSpec(
+    vendors=300,
+    products_per_vendor=6,
+    interfaces_per_product=2,
+    duplicate_rate=0.1,
+    odd_whitespace_rate=0.3,
+    bad_line_rate=0.2,
+    seed=7,
+)
+
+
+# The default pipeline (in-memory engine, bulk loader) and the streaming one.
+BUILD_PATHS = {
+    "default": {"vacuum": True},
+    "streaming": {"vacuum": False, "loader": "upsert", "engine": "disk"},
+}
+
+# SQLite VM instructions between two progress-handler calls.
+VM_STEP = 1000
+
+
+def _count_vm_steps(build: Callable[[], object]) -> int:
+    """
+    SQLite VM instructions, in units of VM_STEP, run on every connection
+    `build` opens. Unlike wall time this does not depend on machine load.
+    """
+    steps = 0
+    connect = sqlite3.connect
+
+    def tick() -> int:
+        nonlocal steps
+        steps += 1
+        return 0
+
+    def counting_connect(*args, **kwargs) -> sqlite3.Connection:
+        con = connect(*args, **kwargs)
+        con.set_progress_handler(tick, VM_STEP)
+        return con
+
+    with mock.patch.object(sqlite3, "connect", counting_connect):
+        build()
+    return steps
+
+
+def _streaming_build_in_child(spec: SynthSpec, out: str, trace: bool) -> Tuple[int, Optional[int], int]:
+    if trace:
+        tracemalloc.start()
+    steps = _count_vm_steps(
+        lambda: build_sqlite_from_usb_ids(iter_synthetic_usb_ids(spec), Path(out), **BUILD_PATHS["streaming"])
+    )
+    traced = tracemalloc.get_traced_memory()[1] if trace else 0
+    return steps, peak_rss_kib(), traced
+
+
+def _run_in_child(spec: SynthSpec, out: Path, trace: bool = False) -> Tuple[int, Optional[int], int]:
+    """Builds in a fresh process, so its peak RSS (SQLite's page cache included) is the build's own."""
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_streaming_build_in_child, spec, str(out), trace).result()
+
+
+class SyntheticCorpusTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.dir = Path(self._td.name)
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def _build(self, spec: SynthSpec, path: str) -> int:
+        out = self.dir / f"{path}.sqlite"
+        out.unlink(missing_ok=True)
+        options = BUILD_PATHS[path]
+        return _count_vm_steps(lambda: build_sqlite_from_usb_ids(iter_synthetic_usb_ids(spec), out, **options))
+
+    def test_generator_is_deterministic(self) -> None:
+        self.assertEqual(list(iter_synthetic_usb_ids(EDGY)), list(iter_synthetic_usb_ids(EDGY)))
+        a = write_synthetic_usb_ids(EDGY, self.dir / "a.ids")
+        b = write_synthetic_usb_ids(SynthSpec(**{**EDGY.__dict__, "seed": 8}), self.dir / "b.ids")
+        self.assertEqual(a.sha256, write_synthetic_usb_ids(EDGY, self.dir / "a2.ids").sha256)
+        self.assertNotEqual(a.sha256, b.sha256)
+        with self.assertRaises(ValueError):
+            SynthSpec(vendors=70000)
+
+    def test_build_matches_expected_rows(self) -> None:
+        ids = self.dir / "usb.ids"
+        write_synthetic_usb_ids(EDGY, ids)
+        raw = ids.read_bytes()
+        for edge_case in (b"\r\n", b"(superseded)", b"\t\t\t", b"zz"):
+            self.assertIn(edge_case, raw)
+
+        db = self.dir / "usbids.sqlite"
+        build_sqlite_from_usb_ids(ids, db, vacuum=True)
+        con = sqlite3.connect(db)
+        try:
+            rows = [
+                (table, tuple(row[:-1]), row[-1])
+                for table, cols in TABLE_COLUMNS.items()
+                for row in con.execute(f"SELECT {', '.join(cols)} FROM {table} ORDER BY {', '.join(cols[:-1])}")
+            ]
+            self.assertEqual(_table_counts(con), expected_counts(EDGY))
+        finally:
+            con.close()
+        self.assertEqual(rows, list(expected_rows(EDGY)))
+
+        lines = list(iter_synthetic_usb_ids(EDGY))
+        reference = list(iter_usb_ids_records_cascade(lines, ParseState()))
+        self.assertEqual(list(iter_usb_ids_records(lines, ParseState())), reference)
+        with mock.patch.object(update_usbids_artifacts, "PARALLEL_CHUNK_LINES", 50):
+            self.assertEqual(list(iter_usb_ids_records_parallel(lines, ParseState(), workers=2)), reference)
+
+    def test_build_work_is_linear(self) -> None:
+        small, large = SynthSpec(vendors=1500, products_per_vendor=4), SynthSpec(vendors=6000, products_per_vendor=4)
+        for path in BUILD_PATHS:
+            with self.subTest(path=path):
+                steps_small, steps_large = self._build(small, path), self._build(large, path)
+                con = sqlite3.connect(self.dir / f"{path}.sqlite")
+                try:
+                    self.assertEqual(_table_counts(con), expected_counts(large))
+                finally:
+                    con.close()
+                # 4x the input (about 3.6x here); quadratic behaviour would take ~16x.
+                self.assertLess(steps_large, steps_small * 6)
+
+    def test_streaming_build_memory_is_bounded(self) -> None:
+        # Only the streaming path: the default bulk loader and in-memory
+        # engine hold the whole catalog by design.
+        peaks = []
+        for spec in (SynthSpec(vendors=300, products_per_vendor=4), SynthSpec(vendors=1200, products_per_vendor=4)):
+            tracemalloc.start()
+            try:
+                self._build(spec, "streaming")
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        self.assertLess(peaks[1], peaks[0] * 1.5 + 16 * 1024)
+
+    @unittest.skipUnless(LARGE_TESTS, "set USBIDS_LARGE_TESTS=1 to build 250k products")
+    def test_streaming_build_at_scale(self) -> None:
+        small, large = SynthSpec(vendors=2500, products_per_vendor=10), SynthSpec(vendors=25000, products_per_vendor=10)
+        self.assertGreaterEqual(expected_counts(large)["products"], 250_000)
+        runs = {}
+        for name, spec in (("small", small), ("large", large)):
+            steps, rss, _ = _run_in_child(spec, self.dir / f"{name}.sqlite")
+            traced = _run_in_child(spec, self.dir / f"{name}-traced.sqlite", trace=True)[2]
+            runs[name] = (steps, rss, traced)
+        con = sqlite3.connect(self.dir / "large.sqlite")
+        try:
+            self.assertEqual(_table_counts(con), expected_counts(large))
+        finally:
+            con.close()
+
+        (steps_small, rss_small, traced_small), (steps_large, rss_large, traced_large) = runs["small"], runs["large"]
+        # 10x the input; quadratic behaviour would take ~100x.
+        self.assertLess(steps_large, steps_small * 15)
+        # tracemalloc only sees Python objects; RSS also covers SQLite's own
+        # allocations. Neither may grow with the corpus.
+        self.assertLess(traced_large, traced_small * 1.5 + 16 * 1024)
+        if rss_small is not None:
+            self.assertLess(rss_large, rss_small + 16 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,17 +2,37 @@
 from __future__ import annotations
 
 import argparse
+import bz2
+import codecs
 import hashlib
+import importlib
+import io
+import json
+import lzma
+import multiprocessing
+import os
+import queue
 import re
 import sqlite3
 import struct
 import tempfile
+import threading
+import time
+import urllib.error
 import urllib.request
-from dataclasses import dataclass
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 import zlib
 
+from build_usbids_db import open_memory_db, save_memory_db
+from usbids_metrics import StageRecorder
+
 # usb.ids parsing patterns
 RE_META_VERSION = re.compile(r"^#\s*Version:\s*(.+)\s*$")
 RE_META_DATE = re.compile(r"^#\s*Date:\s*(.+)\s*$")
@@ -49,6 +69,17 @@ class ParseState:
     meta_date: Optional[str] = None
 
 
+class UsbIdsRecord(NamedTuple):
+    """
+    One parsed usb.ids entry: the target table, its key columns (in primary
+    key order) and the display name.
+    """
+
+    table: str
+    key: Tuple[int, ...]
+    name: str
+
+
 # SQLite schema (NO WAL)
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS meta (
@@ -137,13 +168,187 @@ CREATE TABLE IF NOT EXISTS hid_usages (
   PRIMARY KEY (page_id, usage_id),
   FOREIGN KEY (page_id) REFERENCES hid_usage_pages(page_id) ON DELETE CASCADE
 );
+"""
 
+# Secondary indexes, created after the bulk load so rows are not indexed one by one.
+INDEX_SQL = """
 CREATE INDEX IF NOT EXISTS idx_products_pid ON products(pid);
 CREATE INDEX IF NOT EXISTS idx_products_vid ON products(vid);
 CREATE INDEX IF NOT EXISTS idx_interfaces_iid ON interfaces(iid);
 CREATE INDEX IF NOT EXISTS idx_hid_usages_usage ON hid_usages(usage_id);
 """
 
+# Composite-key tables that the "lookup" schema profile stores WITHOUT ROWID,
+# i.e. clustered on their primary key, so a point lookup is one B-tree search
+# instead of a search in the key's autoindex followed by one in the table.
+WITHOUT_ROWID_TABLES = ("products", "interfaces", "usb_subclasses", "usb_protocols", "hid_usages")
+
+# Indexes the "lookup" profile leaves out: idx_products_vid is a prefix of
+# the products (vid, pid) primary key.
+REDUNDANT_INDEXES = ("idx_products_vid",)
+
+# "compat" is the schema the app has always shipped; "lookup" is the
+# WITHOUT ROWID variant with redundant indexes dropped; "compact" is "lookup"
+# with common words in vendor-tree names coded (see pack_names()). Same rows
+# in all three.
+SCHEMA_PROFILES = ("compat", "lookup", "compact")
+
+_RE_CREATE_TABLE = re.compile(r"(CREATE TABLE IF NOT EXISTS (\w+) \(.*?\n\))(;)", re.S)
+
+
+def schema_sql(profile: str = "compat") -> Tuple[str, str]:
+    """
+    Returns (tables_sql, indexes_sql) for a schema profile; see SCHEMA_PROFILES.
+    """
+    if profile == "compat":
+        return SCHEMA_SQL, INDEX_SQL
+    # "compact" loads like "lookup"; pack_names() reshapes it afterwards.
+    if profile not in ("lookup", "compact"):
+        raise ValueError(f"Unknown schema profile: {profile}")
+    tables = _RE_CREATE_TABLE.sub(
+        lambda m: m.group(1) + (" WITHOUT ROWID" if m.group(2) in WITHOUT_ROWID_TABLES else "") + m.group(3),
+        SCHEMA_SQL,
+    )
+    indexes = "".join(
+        line + "\n"
+        for line in INDEX_SQL.splitlines()
+        if not any(f" {name} " in line for name in REDUNDANT_INDEXES)
+    )
+    return tables, indexes
+
+
+# Column order per table: primary key columns first, the value column last.
+# Parents come before children so foreign keys hold while loading in this order.
+TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "meta": ("key", "value"),
+    "vendors": ("vid", "name"),
+    "products": ("vid", "pid", "name"),
+    "interfaces": ("vid", "pid", "iid", "name"),
+    "usb_classes": ("class_id", "name"),
+    "usb_subclasses": ("class_id", "subclass_id", "name"),
+    "usb_protocols": ("class_id", "subclass_id", "protocol_id", "name"),
+    "audio_terminal_types": ("terminal_type", "name"),
+    "hid_descriptor_types": ("descriptor_type", "name"),
+    "hid_descriptor_item_types": ("item_type", "name"),
+    "physical_bias_types": ("bias_type", "name"),
+    "physical_descriptor_item_types": ("item_type", "name"),
+    "hid_usage_pages": ("page_id", "name"),
+    "hid_usages": ("page_id", "usage_id", "name"),
+}
+
+
+# Tables whose names the "compact" profile stores coded (see pack_names()).
+PACKED_TABLES = ("vendors", "products", "interfaces")
+
+NAME_TOKENS_SQL = """
+CREATE TABLE name_tokens (
+  code INTEGER PRIMARY KEY,
+  word TEXT NOT NULL
+);
+"""
+
+# Control characters that stand in for common words in coded names; tab, LF
+# and CR are left alone. The views decode with nested replace() calls, and
+# SQLite's parser stack stops at about 26 levels.
+_NAME_TOKEN_CODES = tuple(chr(c) for c in range(1, 32) if chr(c) not in "\t\n\r")
+NAME_TOKEN_LIMIT = 20
+
+
+def _choose_name_tokens(names: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Picks (code, word) pairs for the most space-saving words (" Wireless",
+    " Inc.", ...) across distinct names. Codes already used in a name are
+    skipped, so encoding stays reversible.
+    """
+    names = set(names)
+    used = set().union(*names) if names else set()
+    codes = [c for c in _NAME_TOKEN_CODES if c not in used]
+    counts: Dict[str, int] = {}
+    for name in names:
+        for word in name.split(" ")[1:]:
+            if len(word) >= 4:
+                counts[" " + word] = counts.get(" " + word, 0) + 1
+    ranked = sorted((w for w, n in counts.items() if n > 1), key=lambda w: (-counts[w] * (len(w) - 1), w))
+    return list(zip(codes, ranked[:NAME_TOKEN_LIMIT]))
+
+
+def _decode_name_sql(expr: str, tokens: List[Tuple[str, str]]) -> str:
+    # Undo the replacements in reverse order of encoding.
+    for code, word in reversed(tokens):
+        expr = f"replace({expr}, char({ord(code)}), '{word.replace(chr(39), chr(39) * 2)}')"
+    return expr
+
+
+def pack_names(con: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Turns a freshly loaded "lookup" DB into the "compact" profile.
+
+    The most space-saving words of vendor, product and interface names are
+    replaced by one-character codes (listed in name_tokens), each table is
+    renamed to <table>_packed, and a view with the original name decodes
+    the names again. Queries against vendors/products/interfaces keep
+    working; writes (usbids_delta, usbids_overlay) need the compat or
+    lookup profile, see require_writable_catalog(). Returns the number of
+    words coded.
+    """
+    names = [name for table in PACKED_TABLES for (name,) in con.execute(f"SELECT name FROM {table}")]
+    tokens = _choose_name_tokens(names)
+
+    def encode(name: str) -> str:
+        for code, word in tokens:
+            name = name.replace(word, code)
+        return name
+
+    con.create_function("usbids_encode_name", 1, encode, deterministic=True)
+    cur = con.cursor()
+    cur.execute("BEGIN;")
+    cur.execute(NAME_TOKENS_SQL)
+    cur.executemany("INSERT INTO name_tokens(code, word) VALUES(?, ?);", [(ord(c), w) for c, w in tokens])
+    for table in PACKED_TABLES:
+        # RENAME also rewrites the children's foreign keys and moves the indexes.
+        cur.execute(f"ALTER TABLE {table} RENAME TO {table}_packed;")
+        cur.execute(f"UPDATE {table}_packed SET name = usbids_encode_name(name);")
+        keys = ", ".join(TABLE_COLUMNS[table][:-1])
+        cur.execute(
+            f"CREATE VIEW {table} AS SELECT {keys}, {_decode_name_sql('name', tokens)} AS name FROM {table}_packed;"
+        )
+    cur.execute("COMMIT;")
+    return {"tokens": len(tokens)}
+
+
+def require_writable_catalog(con: sqlite3.Connection, action: str) -> None:
+    """
+    Raises ValueError when `con` holds a "compact" catalog: its vendor-tree
+    tables are read-only views over coded names, so `action` could only
+    fail part way through.
+    """
+    placeholders = ", ".join("?" * len(PACKED_TABLES))
+    views = [
+        name
+        for (name,) in con.execute(
+            f"SELECT name FROM sqlite_master WHERE type='view' AND name IN ({placeholders}) ORDER BY name;",
+            PACKED_TABLES,
+        )
+    ]
+    if views:
+        raise ValueError(
+            f"Cannot {action}: this is a \"compact\" catalog ({', '.join(views)} are read-only views); "
+            "use a build with --schema compat or lookup"
+        )
+
+
+def _insert_sql(table: str) -> str:
+    cols = TABLE_COLUMNS[table]
+    return f"INSERT INTO {table}({', '.join(cols)}) VALUES({', '.join('?' * len(cols))});"
+
+
+def _upsert_sql(table: str) -> str:
+    cols = TABLE_COLUMNS[table]
+    return (
+        _insert_sql(table)[:-1]
+        + f" ON CONFLICT({', '.join(cols[:-1])}) DO UPDATE SET {cols[-1]}=excluded.{cols[-1]};"
+    )
+
 
 def _count_leading_tabs(line: str) -> Tuple[int, str]:
     tabs = 0
@@ -157,6 +362,456 @@ def _to_int_hex(s: str) -> int:
     return int(s, 16)
 
 
+def _open_usb_ids(source: Union[Path, Iterable[str]]):
+    """
+    Lines of usb.ids from a file path, or any iterable of lines (e.g. a
+    StreamedDownload) passed through as is.
+    """
+    if isinstance(source, Path):
+        return source.open("r", encoding="utf-8", errors="replace")
+    return nullcontext(source)
+
+
+def _source_size(source: Union[Path, Iterable[str]]) -> Optional[int]:
+    if isinstance(source, Path):
+        return source.stat().st_size
+    return getattr(source, "bytes_read", None)
+
+
+def _parse_meta_comment(line: str, state: ParseState) -> None:
+    m = RE_META_VERSION.match(line)
+    if m:
+        state.meta_version = m.group(1).strip()
+        return
+    m = RE_META_DATE.match(line)
+    if m:
+        state.meta_date = m.group(1).strip()
+
+
+def iter_usb_ids_records_cascade(lines: Iterable[str], state: ParseState) -> Iterator[UsbIdsRecord]:
+    """
+    Reference parser: tries every pattern in turn against each line.
+
+    Kept for benchmarking and as the behavioural spec for
+    iter_usb_ids_records(); both must yield identical records.
+    """
+    for raw_line in lines:
+        line = raw_line.rstrip("\n")
+
+        if line.startswith("#"):
+            _parse_meta_comment(line, state)
+            continue
+
+        if not line.strip():
+            continue
+
+        # Tagged sections
+        m = RE_AT.match(line)
+        if m:
+            yield UsbIdsRecord("audio_terminal_types", (_to_int_hex(m.group(1)),), m.group(2).strip())
+            continue
+
+        m = RE_HID_DESC.match(line)
+        if m:
+            yield UsbIdsRecord("hid_descriptor_types", (_to_int_hex(m.group(1)),), m.group(2).strip())
+            continue
+
+        m = RE_R_ITEM.match(line)
+        if m:
+            yield UsbIdsRecord("hid_descriptor_item_types", (_to_int_hex(m.group(1)),), m.group(2).strip())
+            continue
+
+        m = RE_BIAS.match(line)
+        if m:
+            yield UsbIdsRecord("physical_bias_types", (int(m.group(1)),), m.group(2).strip())
+            continue
+
+        m = RE_PHY.match(line)
+        if m:
+            yield UsbIdsRecord("physical_descriptor_item_types", (_to_int_hex(m.group(1)),), m.group(2).strip())
+            continue
+
+        # HUT page header
+        m = RE_HUT_PAGE.match(line)
+        if m:
+            state.current_hut_page = _to_int_hex(m.group(1))
+            yield UsbIdsRecord("hid_usage_pages", (state.current_hut_page,), m.group(2).strip())
+            # Avoid consuming vendor/class indents accidentally
+            state.current_class = None
+            state.current_subclass = None
+            state.current_vid = None
+            state.current_pid = None
+            continue
+
+        # USB class header
+        m = RE_CLASS.match(line)
+        if m:
+            state.current_class = _to_int_hex(m.group(1))
+            state.current_subclass = None
+            yield UsbIdsRecord("usb_classes", (state.current_class,), m.group(2).strip())
+            # Avoid consuming vendor/HUT indents accidentally
+            state.current_hut_page = None
+            state.current_vid = None
+            state.current_pid = None
+            continue
+
+        tabs, rest = _count_leading_tabs(line)
+        rest = rest.rstrip()
+
+        # HUT usages
+        if tabs == 1 and state.current_hut_page is not None:
+            m = RE_HUT_USAGE.match(rest)
+            if m:
+                yield UsbIdsRecord(
+                    "hid_usages", (state.current_hut_page, _to_int_hex(m.group(1))), m.group(2).strip()
+                )
+                continue
+
+        # Subclass/protocol lines under a class
+        if state.current_class is not None:
+            if tabs == 1:
+                m = RE_SUBCLASS.match(rest)
+                if m:
+                    state.current_subclass = _to_int_hex(m.group(1))
+                    yield UsbIdsRecord(
+                        "usb_subclasses", (state.current_class, state.current_subclass), m.group(2).strip()
+                    )
+                    continue
+            elif tabs == 2 and state.current_subclass is not None:
+                m = RE_PROTOCOL.match(rest)
+                if m:
+                    yield UsbIdsRecord(
+                        "usb_protocols",
+                        (state.current_class, state.current_subclass, _to_int_hex(m.group(1))),
+                        m.group(2).strip(),
+                    )
+                    continue
+
+        # Vendor/device/interface tree
+        if tabs == 0:
+            m = RE_VENDOR.match(rest)
+            if m:
+                state.current_vid = _to_int_hex(m.group(1))
+                state.current_pid = None
+                yield UsbIdsRecord("vendors", (state.current_vid,), m.group(2).strip())
+                # Leave other contexts
+                state.current_hut_page = None
+                state.current_class = None
+                state.current_subclass = None
+                continue
+
+        if tabs == 1 and state.current_vid is not None:
+            m = RE_DEVICE.match(rest)
+            if m:
+                state.current_pid = _to_int_hex(m.group(1))
+                yield UsbIdsRecord("products", (state.current_vid, state.current_pid), m.group(2).strip())
+                continue
+
+        if tabs == 2 and state.current_vid is not None and state.current_pid is not None:
+            m = RE_INTERFACE.match(rest)
+            if m:
+                yield UsbIdsRecord(
+                    "interfaces",
+                    (state.current_vid, state.current_pid, _to_int_hex(m.group(1))),
+                    m.group(2).strip(),
+                )
+                continue
+
+
+# Column-0 tags whose first character is not a hex digit, so a vendor line can
+# never start with them. "AT", "BIAS" and "C " start with hex letters and are
+# checked explicitly in iter_usb_ids_records().
+_TAGGED_SINGLE = {
+    "R": (RE_R_ITEM, "hid_descriptor_item_types"),
+    "P": (RE_PHY, "physical_descriptor_item_types"),
+}
+
+
+def iter_usb_ids_records(lines: Iterable[str], state: ParseState) -> Iterator[UsbIdsRecord]:
+    """
+    Single-pass dispatch parser.
+
+    Routes each line by its tab depth and first characters to the only pattern
+    that could match it, so every line costs at most one regex match. Yields
+    exactly the same records (and leaves `state` in the same shape) as
+    iter_usb_ids_records_cascade().
+
+    At most one of current_vid / current_class / current_hut_page is set at any
+    time (each header clears the other two), which is what lets indented lines
+    skip the fall-through chain of the cascade.
+    """
+    for raw_line in lines:
+        line = raw_line.rstrip("\n")
+        if not line:
+            continue
+
+        c = line[0]
+
+        if c == "\t":
+            tabs, rest = _count_leading_tabs(line)
+            if tabs == 1:
+                if state.current_vid is not None:
+                    m = RE_DEVICE.match(rest.rstrip())
+                    if m:
+                        state.current_pid = _to_int_hex(m.group(1))
+                        yield UsbIdsRecord("products", (state.current_vid, state.current_pid), m.group(2).strip())
+                elif state.current_hut_page is not None:
+                    m = RE_HUT_USAGE.match(rest.rstrip())
+                    if m:
+                        yield UsbIdsRecord(
+                            "hid_usages", (state.current_hut_page, _to_int_hex(m.group(1))), m.group(2).strip()
+                        )
+                elif state.current_class is not None:
+                    m = RE_SUBCLASS.match(rest.rstrip())
+                    if m:
+                        state.current_subclass = _to_int_hex(m.group(1))
+                        yield UsbIdsRecord(
+                            "usb_subclasses", (state.current_class, state.current_subclass), m.group(2).strip()
+                        )
+            elif tabs == 2:
+                if state.current_vid is not None:
+                    if state.current_pid is not None:
+                        m = RE_INTERFACE.match(rest.rstrip())
+                        if m:
+                            yield UsbIdsRecord(
+                                "interfaces",
+                                (state.current_vid, state.current_pid, _to_int_hex(m.group(1))),
+                                m.group(2).strip(),
+                            )
+                elif state.current_class is not None and state.current_subclass is not None:
+                    m = RE_PROTOCOL.match(rest.rstrip())
+                    if m:
+                        yield UsbIdsRecord(
+                            "usb_protocols",
+                            (state.current_class, state.current_subclass, _to_int_hex(m.group(1))),
+                            m.group(2).strip(),
+                        )
+            continue
+
+        if c == "#":
+            _parse_meta_comment(line, state)
+            continue
+
+        if c == "C" and line[1:2].isspace():
+            m = RE_CLASS.match(line)
+            if m:
+                state.current_class = _to_int_hex(m.group(1))
+                state.current_subclass = None
+                yield UsbIdsRecord("usb_classes", (state.current_class,), m.group(2).strip())
+                state.current_hut_page = None
+                state.current_vid = None
+                state.current_pid = None
+            continue
+
+        if c == "H":
+            if line.startswith("HUT"):
+                m = RE_HUT_PAGE.match(line)
+                if m:
+                    state.current_hut_page = _to_int_hex(m.group(1))
+                    yield UsbIdsRecord("hid_usage_pages", (state.current_hut_page,), m.group(2).strip())
+                    state.current_class = None
+                    state.current_subclass = None
+                    state.current_vid = None
+                    state.current_pid = None
+            else:
+                m = RE_HID_DESC.match(line)
+                if m:
+                    yield UsbIdsRecord("hid_descriptor_types", (_to_int_hex(m.group(1)),), m.group(2).strip())
+            continue
+
+        if c == "A" and line.startswith("AT"):
+            m = RE_AT.match(line)
+            if m:
+                yield UsbIdsRecord("audio_terminal_types", (_to_int_hex(m.group(1)),), m.group(2).strip())
+            continue
+
+        if c == "B" and line.startswith("BIAS"):
+            m = RE_BIAS.match(line)
+            if m:
+                yield UsbIdsRecord("physical_bias_types", (int(m.group(1)),), m.group(2).strip())
+            continue
+
+        tagged = _TAGGED_SINGLE.get(c)
+        if tagged is not None:
+            regex, table = tagged
+            m = regex.match(line)
+            if m:
+                yield UsbIdsRecord(table, (_to_int_hex(m.group(1)),), m.group(2).strip())
+            continue
+
+        m = RE_VENDOR.match(line.rstrip())
+        if m:
+            state.current_vid = _to_int_hex(m.group(1))
+            state.current_pid = None
+            yield UsbIdsRecord("vendors", (state.current_vid,), m.group(2).strip())
+            state.current_hut_page = None
+            state.current_class = None
+            state.current_subclass = None
+
+
+def _starts_section(line: str) -> bool:
+    """
+    True for a vendor, "C" class or "HUT" page header at column 0.
+
+    Each of these resets every context field of ParseState in both parsers,
+    so the lines from one of them onwards parse the same from a fresh state.
+    """
+    line = line.rstrip("\n")
+    if RE_CLASS.match(line) or (line.startswith("HUT") and RE_HUT_PAGE.match(line)):
+        return True
+    return RE_VENDOR.match(line.rstrip()) is not None
+
+
+def _split_sections(lines: Iterable[str], chunk_lines: int) -> Iterator[List[str]]:
+    """Groups lines into chunks of at least chunk_lines, cutting only before section headers."""
+    chunk: List[str] = []
+    for line in lines:
+        if len(chunk) >= chunk_lines and _starts_section(line):
+            yield chunk
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield chunk
+
+
+def _parse_chunk(lines: List[str], state: ParseState) -> Tuple[List[tuple], ParseState]:
+    # Plain tuples pickle several times faster than UsbIdsRecord instances.
+    records = [tuple(rec) for rec in iter_usb_ids_records(lines, state)]
+    return records, state
+
+
+def _merge_chunk_state(state: ParseState, chunk_state: ParseState) -> None:
+    """Folds a later chunk's end state into `state` as if its lines had been parsed in sequence."""
+    state.current_vid = chunk_state.current_vid
+    state.current_pid = chunk_state.current_pid
+    state.current_class = chunk_state.current_class
+    state.current_subclass = chunk_state.current_subclass
+    state.current_hut_page = chunk_state.current_hut_page
+    if chunk_state.meta_version is not None:
+        state.meta_version = chunk_state.meta_version
+    if chunk_state.meta_date is not None:
+        state.meta_date = chunk_state.meta_date
+
+
+PARALLEL_CHUNK_LINES = 8192
+
+
+def _worker_context() -> multiprocessing.context.BaseContext:
+    """
+    Start method for parser processes. Never fork: with --stream the
+    download thread is running, and a child forked from a process with live
+    threads can deadlock on locks they held.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def iter_usb_ids_records_parallel(
+    lines: Iterable[str],
+    state: ParseState,
+    workers: Optional[int] = None,
+    chunk_lines: Optional[int] = None,
+) -> Iterator[UsbIdsRecord]:
+    """
+    Dispatch parser fanned out over a process pool.
+
+    Lines are cut into chunks before vendor / class / HUT headers (see
+    _starts_section()), so every chunk but the first parses from a fresh
+    ParseState, and the chunks are parsed by `workers` processes. Records
+    come back in input order and `state` ends up as the sequential parse
+    leaves it, so the output is exactly iter_usb_ids_records()'s. Chunks
+    (PARALLEL_CHUNK_LINES lines by default) are submitted as lines arrive,
+    which keeps a streamed download overlapping the parse; an input that fits
+    in one chunk, or a single worker, is parsed inline.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _split_sections(lines, chunk_lines or PARALLEL_CHUNK_LINES)
+    first = next(chunks, None)
+    if first is None:
+        return
+    second = next(chunks, None)
+    if second is None or workers == 1:
+        rest = [] if second is None else chain([second], chunks)
+        yield from iter_usb_ids_records(chain(first, chain.from_iterable(rest)), state)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context())
+    pending: Deque[Future] = deque()
+    try:
+        for i, chunk in enumerate(chain([first, second], chunks)):
+            pending.append(pool.submit(_parse_chunk, chunk, replace(state) if i == 0 else ParseState()))
+            # Bound how much parsed-but-unconsumed work piles up.
+            while len(pending) > 2 * workers:
+                records, chunk_state = pending.popleft().result()
+                _merge_chunk_state(state, chunk_state)
+                yield from map(UsbIdsRecord._make, records)
+        while pending:
+            records, chunk_state = pending.popleft().result()
+            _merge_chunk_state(state, chunk_state)
+            yield from map(UsbIdsRecord._make, records)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+PARSERS: Dict[str, Callable[[Iterable[str], ParseState], Iterator[UsbIdsRecord]]] = {
+    "dispatch": iter_usb_ids_records,
+    "cascade": iter_usb_ids_records_cascade,
+    "parallel": iter_usb_ids_records_parallel,
+}
+
+
+def _meta_rows(state: ParseState) -> Iterator[Tuple[str, str]]:
+    if state.meta_version:
+        yield "version", state.meta_version
+    if state.meta_date:
+        yield "date", state.meta_date
+    yield "source_format", "usb.ids"
+
+
+class BulkLoader:
+    """
+    Collects parsed rows per table and writes each table with one executemany.
+
+    Duplicate keys are resolved here (last write wins, first position kept),
+    which is exactly what the per-row ON CONFLICT DO UPDATE path produced, so
+    a plain INSERT is enough and rows keep the same rowid order.
+    """
+
+    def __init__(self) -> None:
+        self.rows: Dict[str, Dict[tuple, str]] = {table: {} for table in TABLE_COLUMNS}
+
+    def add(self, rec: UsbIdsRecord) -> None:
+        self.rows[rec.table][rec.key] = rec.name
+
+    def add_all(self, records: Iterable[UsbIdsRecord]) -> None:
+        rows = self.rows
+        for table, key, name in records:
+            rows[table][key] = name
+
+    def add_meta(self, state: ParseState) -> None:
+        meta = self.rows["meta"]
+        for key, value in _meta_rows(state):
+            meta[(key,)] = value
+
+    def counts(self) -> Dict[str, int]:
+        return {table: len(rows) for table, rows in self.rows.items()}
+
+    def write(self, cur: sqlite3.Cursor) -> None:
+        for table, rows in self.rows.items():
+            if rows:
+                cur.executemany(_insert_sql(table), [(*key, name) for key, name in rows.items()])
+
+
+def _write_upsert(cur: sqlite3.Cursor, records: Iterable[UsbIdsRecord]) -> None:
+    """Row-at-a-time reference writer: one INSERT ... ON CONFLICT DO UPDATE per record."""
+    statements = {table: _upsert_sql(table) for table in TABLE_COLUMNS}
+    for rec in records:
+        cur.execute(statements[rec.table], (*rec.key, rec.name))
+
+
+LOADERS = ("bulk", "upsert")
+
+
 def _sha256_file(path: Path) -> str:
     h = hashlib.sha256()
     with path.open("rb") as f:
@@ -165,327 +820,668 @@ def _sha256_file(path: Path) -> str:
     return h.hexdigest()
 
 
-def _write_sha256_sidecar(target_file: Path, out_sha_path: Path) -> str:
+@dataclass
+class WrittenFile:
+    path: Path
+    size: int
+    sha256: str
+    crc32: Optional[int] = None
+
+
+class HashingWriter:
+    """
+    Binary file sink that hashes bytes (sha256, optionally CRC-32) as they
+    stream out, so an output's digest is ready when it closes instead of
+    needing a second read of the file.
+    """
+
+    def __init__(self, path: Path, crc32: bool = False) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.size = 0
+        self._file = path.open("wb")
+        self._sha256 = hashlib.sha256()
+        self._crc32: Optional[int] = 0 if crc32 else None
+        self._result: Optional[WrittenFile] = None
+
+    def write(self, data: bytes) -> int:
+        self._sha256.update(data)
+        if self._crc32 is not None:
+            self._crc32 = zlib.crc32(data, self._crc32) & 0xFFFFFFFF
+        self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def close(self) -> WrittenFile:
+        if self._result is None:
+            self._file.close()
+            self._result = WrittenFile(self.path, self.size, self._sha256.hexdigest(), self._crc32)
+        return self._result
+
+    def __enter__(self) -> "HashingWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _write_sha256_sidecar(target_file: Path, out_sha_path: Path, digest: Optional[str] = None) -> WrittenFile:
     """
     Writes a sha256 sidecar file containing the hex digest + newline.
-    Returns the digest.
+    `digest` is the target's sha256 when the caller already has it (e.g. from
+    a HashingWriter); otherwise the target is read and hashed.
+    Returns the sidecar's own WrittenFile.
     """
-    digest = _sha256_file(target_file)
-    out_sha_path.parent.mkdir(parents=True, exist_ok=True)
-    out_sha_path.write_text(digest + "\n", encoding="utf-8", newline="\n")
-    return digest
+    if digest is None:
+        digest = _sha256_file(target_file)
+    with HashingWriter(out_sha_path) as out:
+        out.write((digest + "\n").encode("utf-8"))
+    return out.close()
 
 
-def download_usb_ids(url: str, out_path: Path, timeout: int = 60) -> None:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    req = urllib.request.Request(
-        url,
-        headers={
-            "User-Agent": "usbdevinfo-usbids-updater/1.1 (+https://github.com/)",
-            "Accept": "text/plain,*/*",
-        },
-    )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        if getattr(resp, "status", 200) != 200:
-            raise SystemExit(f"Download failed: HTTP {resp.status}")
-        data = resp.read()
-    out_path.write_bytes(data)
-
-
-def build_sqlite_from_usb_ids(input_path: Path, output_db: Path, vacuum: bool) -> ParseState:
-    if not input_path.exists():
-        raise FileNotFoundError(f"Input file not found: {input_path}")
+DOWNLOAD_CHUNK = 256 * 1024
 
-    if output_db.exists():
-        output_db.unlink()
+_CONTENT_RANGE = re.compile(r"^bytes\s+(\d+)-(\d+)/(\d+|\*)$")
 
-    state = ParseState()
 
-    con = sqlite3.connect(str(output_db))
-    try:
-        con.execute("PRAGMA journal_mode=OFF;")
-        con.execute("PRAGMA synchronous=OFF;")
-        con.execute("PRAGMA temp_store=MEMORY;")
-        con.execute("PRAGMA locking_mode=EXCLUSIVE;")
-        con.execute("PRAGMA foreign_keys=ON;")
-        con.executescript(SCHEMA_SQL)
+@dataclass
+class DownloadResult:
+    status: int  # 200 (full), 206 (resumed) or 304 (not modified)
+    path: Path
+    sha256: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
 
-        cur = con.cursor()
-        cur.execute("BEGIN;")
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
 
-        def upsert_meta(key: str, value: str) -> None:
-            cur.execute(
-                "INSERT INTO meta(key, value) VALUES(?, ?) "
-                "ON CONFLICT(key) DO UPDATE SET value=excluded.value;",
-                (key, value),
-            )
 
-        def upsert_vendor(vid: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO vendors(vid, name) VALUES(?, ?) "
-                "ON CONFLICT(vid) DO UPDATE SET name=excluded.name;",
-                (vid, name),
-            )
+def _read_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
 
-        def upsert_product(vid: int, pid: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO products(vid, pid, name) VALUES(?, ?, ?) "
-                "ON CONFLICT(vid, pid) DO UPDATE SET name=excluded.name;",
-                (vid, pid, name),
-            )
 
-        def upsert_interface(vid: int, pid: int, iid: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO interfaces(vid, pid, iid, name) VALUES(?, ?, ?, ?) "
-                "ON CONFLICT(vid, pid, iid) DO UPDATE SET name=excluded.name;",
-                (vid, pid, iid, name),
-            )
+def _write_json(path: Path, data: dict) -> None:
+    path.write_text(json.dumps(data, sort_keys=True, indent=2) + "\n", encoding="utf-8", newline="\n")
 
-        def upsert_class(class_id: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO usb_classes(class_id, name) VALUES(?, ?) "
-                "ON CONFLICT(class_id) DO UPDATE SET name=excluded.name;",
-                (class_id, name),
-            )
 
-        def upsert_subclass(class_id: int, subclass_id: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO usb_subclasses(class_id, subclass_id, name) VALUES(?, ?, ?) "
-                "ON CONFLICT(class_id, subclass_id) DO UPDATE SET name=excluded.name;",
-                (class_id, subclass_id, name),
-            )
+_RE_VENDOR_HEAD = re.compile(rb"^[0-9A-Fa-f]{4}$")
 
-        def upsert_protocol(class_id: int, subclass_id: int, protocol_id: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO usb_protocols(class_id, subclass_id, protocol_id, name) VALUES(?, ?, ?, ?) "
-                "ON CONFLICT(class_id, subclass_id, protocol_id) DO UPDATE SET name=excluded.name;",
-                (class_id, subclass_id, protocol_id, name),
-            )
 
-        def upsert_at(term_type: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO audio_terminal_types(terminal_type, name) VALUES(?, ?) "
-                "ON CONFLICT(terminal_type) DO UPDATE SET name=excluded.name;",
-                (term_type, name),
-            )
+def _section_kinds(path: Path) -> List[str]:
+    """Top-level section kinds of a usb.ids file in order: "vendor", "C", "AT", ..., "VT"."""
+    kinds: Dict[str, None] = {}
+    with path.open("rb") as f:
+        for line in f:
+            if line[:1] in (b"#", b"\t") or not line.strip():
+                continue
+            head = line.split(None, 1)[0]
+            kinds.setdefault("vendor" if _RE_VENDOR_HEAD.match(head) else head.decode("ascii", "replace"), None)
+    return list(kinds)
 
-        def upsert_hid_desc(code: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO hid_descriptor_types(descriptor_type, name) VALUES(?, ?) "
-                "ON CONFLICT(descriptor_type) DO UPDATE SET name=excluded.name;",
-                (code, name),
-            )
 
-        def upsert_r_item(code: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO hid_descriptor_item_types(item_type, name) VALUES(?, ?) "
-                "ON CONFLICT(item_type) DO UPDATE SET name=excluded.name;",
-                (code, name),
-            )
+def _unsized_body_problem(path: Path, previous: Optional[Path]) -> Optional[str]:
+    """
+    Why a body received without a known length looks cut short, or None.
 
-        def upsert_bias(code: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO physical_bias_types(bias_type, name) VALUES(?, ?) "
-                "ON CONFLICT(bias_type) DO UPDATE SET name=excluded.name;",
-                (code, name),
+    With no Content-Length (or Content-Range total) a dropped connection
+    reads like the end of the body, so the file must end with a complete
+    line and keep every top-level section the previous copy had.
+    """
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return "empty body"
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            return "body ends mid-line"
+    if previous is not None:
+        missing = [k for k in _section_kinds(previous) if k not in set(_section_kinds(path))]
+        if missing:
+            return f"body lacks sections of the previous copy: {', '.join(missing)}"
+    return None
+
+
+def download_usb_ids(
+    url: str,
+    out_path: Path,
+    timeout: int = 60,
+    conditional: bool = True,
+    chunk_size: int = DOWNLOAD_CHUNK,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+) -> DownloadResult:
+    """
+    Streams `url` to `out_path`, hashing while writing.
+
+    Validators (ETag / Last-Modified) and the digest of the last complete
+    download are kept in `<out_path>.http.json`; with `conditional` they are
+    sent as If-None-Match / If-Modified-Since, and a 304 returns without
+    touching the file. Bytes land in `<out_path>.part` first; an interrupted
+    transfer is resumed with a Range + If-Range request on the next call, and
+    the file is only renamed into place once complete: its size matches
+    Content-Length / Content-Range, or, when the server sent neither, it
+    passes _unsized_body_problem().
+
+    `on_chunk` receives the body in order from its first byte (including a
+    resumed prefix read back from the partial file) as it is written; it is
+    not called for a 304.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = Path(str(out_path) + ".part")
+    part_state_path = Path(str(part_path) + ".json")
+    state_path = Path(str(out_path) + ".http.json")
+
+    def restart() -> DownloadResult:
+        for stale in (part_path, part_state_path):
+            if stale.exists():
+                stale.unlink()
+        return download_usb_ids(url, out_path, timeout, conditional, chunk_size, on_chunk)
+
+    cached = _read_json(state_path) if out_path.exists() else {}
+    if cached.get("url") != url:
+        cached = {}
+    part_state = _read_json(part_state_path) if part_path.exists() else {}
+    if part_state.get("url") != url:
+        part_state = {}
+
+    headers = {
+        "User-Agent": "usbdevinfo-usbids-updater/1.1 (+https://github.com/)",
+        "Accept": "text/plain,*/*",
+    }
+    offset = 0
+    resume_validator = part_state.get("etag") or part_state.get("last_modified")
+    if resume_validator and part_path.stat().st_size > 0:
+        offset = part_path.stat().st_size
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = resume_validator
+    elif conditional and cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        resp = urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            return DownloadResult(
+                status=304,
+                path=out_path,
+                sha256=cached.get("sha256") or _sha256_file(out_path),
+                size=out_path.stat().st_size,
+                etag=cached.get("etag"),
+                last_modified=cached.get("last_modified"),
             )
+        if e.code == 416 and offset:
+            # The partial file no longer fits the remote one: start over.
+            return restart()
+        raise SystemExit(f"Download failed: HTTP {e.code}")
+
+    with resp:
+        status = getattr(resp, "status", 200)
+        expected_size: Optional[int] = None
+        content_length = resp.headers.get("Content-Length")
+
+        if status == 206:
+            m = _CONTENT_RANGE.match(resp.headers.get("Content-Range", "").strip())
+            if not m or int(m.group(1)) != offset:
+                return restart()
+            if m.group(3) != "*":
+                expected_size = int(m.group(3))
+            etag = part_state.get("etag")
+            last_modified = part_state.get("last_modified")
+        elif status == 200:
+            # A full body, either fresh or because If-Range no longer matched.
+            offset = 0
+            if content_length is not None:
+                expected_size = int(content_length)
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+            _write_json(part_state_path, {"url": url, "etag": etag, "last_modified": last_modified})
+        else:
+            raise SystemExit(f"Download failed: HTTP {status}")
+
+        h = hashlib.sha256()
+        if offset:
+            with part_path.open("rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    h.update(chunk)
+                    if on_chunk is not None:
+                        on_chunk(chunk)
+
+        size = offset
+        with part_path.open("ab" if offset else "wb") as f:
+            for chunk in iter(lambda: resp.read(chunk_size), b""):
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+
+    # Keep the partial file either way; the next call resumes from here.
+    if expected_size is not None and size != expected_size:
+        raise SystemExit(f"Download incomplete: got {size} of {expected_size} bytes")
+    if expected_size is None:
+        problem = _unsized_body_problem(part_path, out_path if out_path.exists() else None)
+        if problem:
+            raise SystemExit(f"Download incomplete: {problem} ({size} bytes, length not given)")
+
+    os.replace(part_path, out_path)
+    if part_state_path.exists():
+        part_state_path.unlink()
+
+    digest = h.hexdigest()
+    _write_json(
+        state_path,
+        {"url": url, "etag": etag, "last_modified": last_modified, "sha256": digest, "size": size},
+    )
+    return DownloadResult(
+        status=status, path=out_path, sha256=digest, size=size, etag=etag, last_modified=last_modified
+    )
 
-        def upsert_phy(code: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO physical_descriptor_item_types(item_type, name) VALUES(?, ?) "
-                "ON CONFLICT(item_type) DO UPDATE SET name=excluded.name;",
-                (code, name),
-            )
 
-        def upsert_hut_page(page_id: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO hid_usage_pages(page_id, name) VALUES(?, ?) "
-                "ON CONFLICT(page_id) DO UPDATE SET name=excluded.name;",
-                (page_id, name),
-            )
+_STREAM_END = object()
 
-        def upsert_hut_usage(page_id: int, usage_id: int, name: str) -> None:
-            cur.execute(
-                "INSERT INTO hid_usages(page_id, usage_id, name) VALUES(?, ?, ?) "
-                "ON CONFLICT(page_id, usage_id) DO UPDATE SET name=excluded.name;",
-                (page_id, usage_id, name),
-            )
 
-        with input_path.open("r", encoding="utf-8", errors="replace") as f:
-            for raw_line in f:
-                line = raw_line.rstrip("\n")
+class StreamedDownload:
+    """
+    Downloads usb.ids on a background thread and yields it as text lines
+    while it arrives, so the parser runs during the transfer instead of
+    after it.
+
+    The transfer is download_usb_ids() itself: the file is still saved
+    (resumably) to `out_path`, hashed, and validated against the cache
+    state. Bytes are decoded exactly as _open_usb_ids() reads the saved
+    file (UTF-8 with replacement, universal newlines), so the lines are
+    identical to the two-step path. On a 304 the lines come from the
+    already saved file. Iterate once; `result` is set afterwards.
+    """
 
-                if line.startswith("#"):
-                    m = RE_META_VERSION.match(line)
-                    if m:
-                        state.meta_version = m.group(1).strip()
-                        continue
-                    m = RE_META_DATE.match(line)
-                    if m:
-                        state.meta_date = m.group(1).strip()
-                        continue
-                    continue
+    def __init__(
+        self,
+        url: str,
+        out_path: Path,
+        timeout: int = 60,
+        conditional: bool = True,
+        chunk_size: int = DOWNLOAD_CHUNK,
+        queue_depth: int = 64,
+    ) -> None:
+        self.url = url
+        self.out_path = out_path
+        self.timeout = timeout
+        self.conditional = conditional
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.result: Optional[DownloadResult] = None
+        self._chunks: "queue.Queue[object]" = queue.Queue(maxsize=queue_depth)
+        self._ready = threading.Event()
+        self._closed = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StreamedDownload":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._download, name="usbids-download", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait_ready(self) -> bool:
+        """Blocks until body bytes arrive or the request ends; True on a 304."""
+        self.start()._ready.wait()
+        return self.result is not None and self.result.not_modified
+
+    def _put(self, item: object) -> None:
+        while not self._closed.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _StreamClosed()
+
+    def _on_chunk(self, chunk: bytes) -> None:
+        self._ready.set()
+        self._put(chunk)
+
+    def _download(self) -> None:
+        try:
+            self.result = download_usb_ids(
+                self.url,
+                self.out_path,
+                timeout=self.timeout,
+                conditional=self.conditional,
+                chunk_size=self.chunk_size,
+                on_chunk=self._on_chunk,
+            )
+        except _StreamClosed:
+            pass
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._ready.set()
+            try:
+                self._put(_STREAM_END)
+            except _StreamClosed:
+                pass
+
+    def _chunks_in_order(self) -> Iterator[bytes]:
+        while True:
+            item = self._chunks.get()
+            if item is _STREAM_END:
+                break
+            yield item  # type: ignore[misc]
+        if self._error is not None:
+            raise self._error
+        if self.result is not None and self.result.not_modified:
+            with self.out_path.open("rb") as f:
+                yield from iter(lambda: f.read(self.chunk_size), b"")
+
+    def __iter__(self) -> Iterator[str]:
+        self.start()
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(errors="replace"), translate=True)
+        pending = ""
+        try:
+            for chunk in self._chunks_in_order():
+                self.bytes_read += len(chunk)
+                pending += decoder.decode(chunk)
+                lines = pending.split("\n")
+                pending = lines.pop()
+                for line in lines:
+                    yield line + "\n"
+            pending += decoder.decode(b"", final=True)
+            lines = pending.split("\n")
+            for line in lines[:-1]:
+                yield line + "\n"
+            if lines[-1]:
+                yield lines[-1]
+        finally:
+            # Also reached when the consumer stops early: unblock the thread.
+            self._closed.set()
+            if self._thread is not None:
+                self._thread.join()
+
+
+class _StreamClosed(Exception):
+    pass
+
+
+# Optional name search index (--search-index). The FTS5 table is external
+# content over a view, so it stores only the index and can be rebuilt from
+# the catalog tables with one statement. Rowids encode the entry: vid << 16 | pid
+# for products, SEARCH_VENDOR_BIT | vid for vendors.
+SEARCH_TABLE = "name_search"
+SEARCH_VENDOR_BIT = 1 << 32
+
+SEARCH_SOURCE_SQL = f"""
+CREATE VIEW IF NOT EXISTS {SEARCH_TABLE}_source AS
+  SELECT (vid << 16) | pid AS id, name FROM products
+  UNION ALL
+  SELECT {SEARCH_VENDOR_BIT} | vid AS id, name FROM vendors;
+"""
 
-                if not line.strip():
-                    continue
+# Tried in order: trigram matches any substring of 3+ characters (SQLite
+# 3.34+); older builds fall back to word tokens with prefix indexes.
+SEARCH_TOKENIZERS = ("tokenize='trigram'", "tokenize='unicode61', prefix='2 3 4'")
 
-                # Tagged sections
-                m = RE_AT.match(line)
-                if m:
-                    upsert_at(_to_int_hex(m.group(1)), m.group(2).strip())
-                    continue
 
-                m = RE_HID_DESC.match(line)
-                if m:
-                    upsert_hid_desc(_to_int_hex(m.group(1)), m.group(2).strip())
-                    continue
+def add_search_index(con: sqlite3.Connection) -> str:
+    """
+    Creates and fills the FTS5 name index over vendors and products.
+    Returns the tokenizer options used.
+    """
+    con.executescript(SEARCH_SOURCE_SQL)
+    for options in SEARCH_TOKENIZERS:
+        try:
+            con.execute(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                f"name, content='{SEARCH_TABLE}_source', content_rowid='id', {options});"
+            )
+        except sqlite3.OperationalError as e:
+            if "no such module" in str(e):
+                raise RuntimeError("This SQLite build has no FTS5; cannot add the search index") from e
+            continue
+        with con:
+            con.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('rebuild');")
+        return options
+    raise RuntimeError("No usable FTS5 tokenizer for the search index")
+
+
+# "memory" loads into :memory: and writes the file once with backup();
+# "disk" loads into the output file and VACUUMs it in place.
+ENGINES = ("memory", "disk")
+
+
+def build_sqlite_from_usb_ids(
+    input_path: Union[Path, Iterable[str]],
+    output_db: Path,
+    vacuum: bool,
+    parser: str = "dispatch",
+    loader: str = "bulk",
+    engine: str = "memory",
+    page_size: Optional[int] = None,
+    schema: str = "compat",
+    search_index: bool = False,
+    recorder: Optional[StageRecorder] = None,
+    parse_workers: Optional[int] = None,
+) -> ParseState:
+    """
+    Parses usb.ids into a new SQLite DB at output_db. `input_path` is the
+    file, or any iterable of its lines. Stages (parse, load, index,
+    search_index, vacuum, write) are timed through `recorder`.
+    `parse_workers` sets the process count of the "parallel" parser.
+    """
+    if isinstance(input_path, Path) and not input_path.exists():
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+    if loader not in LOADERS:
+        raise ValueError(f"Unknown loader: {loader}")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    parse = PARSERS[parser]
+    if parser == "parallel":
+        parse = partial(parse, workers=parse_workers)
+    tables_sql, indexes_sql = schema_sql(schema)
+    recorder = recorder or StageRecorder()
 
-                m = RE_R_ITEM.match(line)
-                if m:
-                    upsert_r_item(_to_int_hex(m.group(1)), m.group(2).strip())
-                    continue
+    state = ParseState()
 
-                m = RE_BIAS.match(line)
-                if m:
-                    upsert_bias(int(m.group(1)), m.group(2).strip())
-                    continue
+    if engine == "memory":
+        con = open_memory_db(page_size)
+    else:
+        if output_db.exists():
+            output_db.unlink()
+        con = sqlite3.connect(str(output_db))
+        if page_size:
+            con.execute(f"PRAGMA page_size={int(page_size)};")
+        con.execute("PRAGMA journal_mode=OFF;")
+        con.execute("PRAGMA synchronous=OFF;")
+        con.execute("PRAGMA temp_store=MEMORY;")
+        con.execute("PRAGMA locking_mode=EXCLUSIVE;")
+    try:
+        con.execute("PRAGMA foreign_keys=ON;")
+        con.executescript(tables_sql)
 
-                m = RE_PHY.match(line)
-                if m:
-                    upsert_phy(_to_int_hex(m.group(1)), m.group(2).strip())
-                    continue
+        cur = con.cursor()
 
-                # HUT page header
-                m = RE_HUT_PAGE.match(line)
-                if m:
-                    state.current_hut_page = _to_int_hex(m.group(1))
-                    upsert_hut_page(state.current_hut_page, m.group(2).strip())
-                    # Avoid consuming vendor/class indents accidentally
-                    state.current_class = None
-                    state.current_subclass = None
-                    state.current_vid = None
-                    state.current_pid = None
-                    continue
+        if loader == "bulk":
+            with recorder.stage("parse") as info:
+                bulk = BulkLoader()
+                with _open_usb_ids(input_path) as f:
+                    bulk.add_all(parse(f, state))
+                bulk.add_meta(state)
+                info["bytes_read"] = _source_size(input_path)
+
+            with recorder.stage("load") as info:
+                # Parents always precede children in the parse, so check foreign
+                # keys once for the whole load instead of once per inserted row.
+                con.execute("PRAGMA foreign_keys=OFF;")
+                cur.execute("BEGIN;")
+                bulk.write(cur)
+                cur.execute("COMMIT;")
+                con.execute("PRAGMA foreign_keys=ON;")
+                violations = con.execute("PRAGMA foreign_key_check;").fetchall()
+                if violations:
+                    raise RuntimeError(f"Foreign key violations after bulk load: {violations[:5]}")
+                info["rows"] = _table_counts(con)
+
+            with recorder.stage("index"):
+                # Same statements (and commit count) as the upsert path, so the
+                # VACUUMed file stays byte-identical; only the timing moves.
+                con.executescript(indexes_sql)
+        else:
+            with recorder.stage("index"):
+                con.executescript(indexes_sql)
+            # Upserts consume the parse as it goes, so both share one stage.
+            with recorder.stage("parse_load") as info:
+                cur.execute("BEGIN;")
+                with _open_usb_ids(input_path) as f:
+                    _write_upsert(cur, parse(f, state))
+                _write_upsert(cur, (UsbIdsRecord("meta", (k,), v) for k, v in _meta_rows(state)))
+                cur.execute("COMMIT;")
+                info["bytes_read"] = _source_size(input_path)
+                info["rows"] = _table_counts(con)
+
+        if schema == "compact":
+            with recorder.stage("pack_names") as info:
+                info.update(pack_names(con))
+
+        if search_index:
+            with recorder.stage("search_index") as info:
+                info["tokenizer"] = add_search_index(con)
 
-                # USB class header
-                m = RE_CLASS.match(line)
-                if m:
-                    state.current_class = _to_int_hex(m.group(1))
-                    state.current_subclass = None
-                    upsert_class(state.current_class, m.group(2).strip())
-                    # Avoid consuming vendor/HUT indents accidentally
-                    state.current_hut_page = None
-                    state.current_vid = None
-                    state.current_pid = None
-                    continue
+        if vacuum:
+            with recorder.stage("vacuum"):
+                con.execute("VACUUM;")
 
-                tabs, rest = _count_leading_tabs(line)
-                rest = rest.rstrip()
+        with recorder.stage("write") as info:
+            if engine == "memory":
+                save_memory_db(con, output_db, vacuum=False)
+            else:
+                con.execute("PRAGMA optimize;")
+            info["bytes_written"] = output_db.stat().st_size
 
-                # HUT usages
-                if tabs == 1 and state.current_hut_page is not None:
-                    m = RE_HUT_USAGE.match(rest)
-                    if m:
-                        upsert_hut_usage(state.current_hut_page, _to_int_hex(m.group(1)), m.group(2).strip())
-                        continue
+    finally:
+        con.close()
 
-                # Subclass/protocol lines under a class
-                if state.current_class is not None:
-                    if tabs == 1:
-                        m = RE_SUBCLASS.match(rest)
-                        if m:
-                            state.current_subclass = _to_int_hex(m.group(1))
-                            upsert_subclass(state.current_class, state.current_subclass, m.group(2).strip())
-                            continue
-                    elif tabs == 2 and state.current_subclass is not None:
-                        m = RE_PROTOCOL.match(rest)
-                        if m:
-                            upsert_protocol(
-                                state.current_class,
-                                state.current_subclass,
-                                _to_int_hex(m.group(1)),
-                                m.group(2).strip(),
-                            )
-                            continue
+    return state
 
-                # Vendor/device/interface tree
-                if tabs == 0:
-                    m = RE_VENDOR.match(rest)
-                    if m:
-                        state.current_vid = _to_int_hex(m.group(1))
-                        state.current_pid = None
-                        upsert_vendor(state.current_vid, m.group(2).strip())
-                        # Leave other contexts
-                        state.current_hut_page = None
-                        state.current_class = None
-                        state.current_subclass = None
-                        continue
-
-                if tabs == 1 and state.current_vid is not None:
-                    m = RE_DEVICE.match(rest)
-                    if m:
-                        state.current_pid = _to_int_hex(m.group(1))
-                        upsert_product(state.current_vid, state.current_pid, m.group(2).strip())
-                        continue
 
-                if tabs == 2 and state.current_vid is not None and state.current_pid is not None:
-                    m = RE_INTERFACE.match(rest)
-                    if m:
-                        upsert_interface(state.current_vid, state.current_pid, _to_int_hex(m.group(1)), m.group(2).strip())
-                        continue
+def _table_counts(con: sqlite3.Connection) -> Dict[str, int]:
+    return {table: con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLE_COLUMNS}
 
-        # Metadata
-        if state.meta_version:
-            upsert_meta("version", state.meta_version)
-        if state.meta_date:
-            upsert_meta("date", state.meta_date)
-        upsert_meta("source_format", "usb.ids")
 
-        cur.execute("COMMIT;")
+# Upper bound on rows per multi-row INSERT in dump_sql().
+DUMP_ROWS_PER_INSERT = 1000
 
-        if vacuum:
-            con.execute("VACUUM;")
 
-        con.execute("PRAGMA optimize;")
+def iter_dump_statements(con: sqlite3.Connection, rows_per_insert: int = DUMP_ROWS_PER_INSERT) -> Iterator[str]:
+    """
+    Deterministic, diff-friendly replacement for Connection.iterdump().
+
+    Tables come in name order, rows in primary key order, one row per line,
+    grouped into multi-row INSERTs. Group boundaries follow the key (the
+    parent key for composite keys, the high byte for integer keys) rather
+    than a running row count, so one changed entry only touches its own
+    lines. Rows are fetched with a cursor, so memory stays at one statement.
 
+    Virtual tables are written last, without their shadow tables, followed by
+    an FTS5 'rebuild'; this assumes external-content tables such as the
+    search index, whose rows are derived from the other tables.
+    """
+    yield "BEGIN TRANSACTION;"
+
+    tables = con.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type='table' AND sql NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+    virtual = [(name, sql) for name, sql in tables if sql.upper().startswith("CREATE VIRTUAL TABLE")]
+    shadow_prefixes = tuple(f"{name}_" for name, _ in virtual)
+    for table, create_sql in tables:
+        if (table, create_sql) in virtual or (shadow_prefixes and table.startswith(shadow_prefixes)):
+            continue
+        yield f"{create_sql};"
+
+        info = con.execute(f'PRAGMA table_info("{table}")').fetchall()
+        pk = sorted((r for r in info if r[5] > 0), key=lambda r: r[5])
+        order = ", ".join(f'"{r[1]}"' for r in pk) if pk else "rowid"
+        if len(pk) > 1:
+            group_expr = f'"{pk[0][1]}"'
+        elif len(pk) == 1 and pk[0][2].upper() == "INTEGER":
+            group_expr = f'"{pk[0][1]}" >> 8'
+        else:
+            group_expr = "NULL"
+        # Let SQLite render the literals (same quoting as iterdump()).
+        row_expr = "'(' || " + " || ',' || ".join(f'quote("{r[1]}")' for r in info) + " || ')'"
+
+        head = f'INSERT INTO "{table}" VALUES\n'
+        batch = []
+        group = None
+        for g, literal in con.execute(f'SELECT {group_expr}, {row_expr} FROM "{table}" ORDER BY {order}'):
+            if batch and (g != group or len(batch) >= rows_per_insert):
+                yield head + ",\n".join(batch) + ";"
+                batch = []
+            group = g
+            batch.append(literal)
+        if batch:
+            yield head + ",\n".join(batch) + ";"
+
+    for (create_sql,) in con.execute(
+        "SELECT sql FROM sqlite_master "
+        "WHERE sql NOT NULL AND type IN ('index', 'trigger', 'view') ORDER BY type, name"
+    ):
+        yield f"{create_sql};"
+
+    for table, create_sql in virtual:
+        yield f"{create_sql};"
+        yield f"INSERT INTO \"{table}\"(\"{table}\") VALUES('rebuild');"
+
+    yield "COMMIT;"
+
+
+def dump_sql(
+    db_path: Path, out_sql: Path, header: str, rows_per_insert: int = DUMP_ROWS_PER_INSERT
+) -> WrittenFile:
+    con = sqlite3.connect(str(db_path))
+    try:
+        with HashingWriter(out_sql) as out:
+            out.write(("-- " + header.replace("\n", "\n-- ") + "\n").encode("utf-8"))
+            for stmt in iter_dump_statements(con, rows_per_insert):
+                out.write((stmt + "\n").encode("utf-8"))
     finally:
         con.close()
-
-    return state
+    return out.close()
 
 
-def dump_sql(db_path: Path, out_sql: Path, header: str) -> None:
-    out_sql.parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(str(db_path)) as con, out_sql.open("w", encoding="utf-8", newline="\n") as f:
-        f.write("-- " + header.replace("\n", "\n-- ") + "\n")
-        for stmt in con.iterdump():
-            f.write(stmt)
-            f.write("\n")
+def _gzip_header(compresslevel: int) -> bytes:
+    # GZIP header (RFC 1952)
+    xfl = 2 if compresslevel >= 9 else 0  # "maximum compression" hint
+    return (
+        b"\x1f\x8b"            # ID1, ID2
+        b"\x08"                # CM = DEFLATE
+        b"\x00"                # FLG = 0 (no extra fields)
+        b"\x00\x00\x00\x00"    # MTIME = 0 (deterministic)
+        + bytes([xfl])         # XFL
+        + b"\xff"              # OS = 255 (unknown)
+    )
 
 
-def gzip_file(src: Path, dst_gz: Path, compresslevel: int = 9) -> None:
+def gzip_file(src: Path, dst_gz: Path, compresslevel: int = 9) -> WrittenFile:
     """
     Write a gzip file with a deterministic header (mtime=0) without relying on
     gzip.open(mtime=...), which is not available on older Python versions.
     """
-    dst_gz.parent.mkdir(parents=True, exist_ok=True)
-
-    # GZIP header (RFC 1952)
-    xfl = 2 if compresslevel >= 9 else 0  # "maximum compression" hint
-
     crc = 0
     size = 0
     compressor = zlib.compressobj(
         compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS
     )  # raw DEFLATE stream
 
-    with src.open("rb") as fin, dst_gz.open("wb") as fout:
-        fout.write(b"\x1f\x8b")            # ID1, ID2
-        fout.write(b"\x08")                # CM = DEFLATE
-        fout.write(b"\x00")                # FLG = 0 (no extra fields)
-        fout.write(b"\x00\x00\x00\x00")    # MTIME = 0 (deterministic)
-        fout.write(bytes([xfl]))           # XFL
-        fout.write(b"\xff")                # OS = 255 (unknown)
+    with src.open("rb") as fin, HashingWriter(dst_gz) as fout:
+        fout.write(_gzip_header(compresslevel))
 
         while True:
             chunk = fin.read(1024 * 1024)
@@ -504,6 +1500,313 @@ def gzip_file(src: Path, dst_gz: Path, compresslevel: int = 9) -> None:
         # GZIP trailer: CRC32 + ISIZE (both little-endian uint32)
         fout.write(struct.pack("<I", crc))
         fout.write(struct.pack("<I", size))
+    return fout.close()
+
+
+GZIP_BLOCK_SIZE = 128 * 1024
+_DEFLATE_WINDOW = 32 * 1024
+
+
+def _deflate_block(block: bytes, dictionary: bytes, compresslevel: int, last: bool) -> bytes:
+    if dictionary:
+        compressor = zlib.compressobj(
+            compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, dictionary
+        )
+    else:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # A sync flush ends the block on a byte boundary without marking the
+    # stream final, so the next block's raw DEFLATE data can follow directly.
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def gzip_file_parallel(
+    src: Path,
+    dst_gz: Path,
+    compresslevel: int = 9,
+    workers: Optional[int] = None,
+    block_size: int = GZIP_BLOCK_SIZE,
+) -> WrittenFile:
+    """
+    pigz-style gzip: compresses fixed-size blocks on a thread pool (zlib
+    releases the GIL) and joins their raw DEFLATE streams into one member.
+
+    Each block is primed with the previous 32 KiB as a preset dictionary, so
+    the ratio stays close to a single stream. The output depends only on
+    `compresslevel` and `block_size`, never on `workers` or scheduling.
+    """
+    if block_size < _DEFLATE_WINDOW:
+        raise ValueError(f"block_size must be at least {_DEFLATE_WINDOW} bytes")
+    workers = workers or os.cpu_count() or 1
+
+    crc = 0
+    size = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool, src.open("rb") as fin, HashingWriter(dst_gz) as fout:
+        fout.write(_gzip_header(compresslevel))
+
+        pending: deque = deque()
+        dictionary = b""
+        block = fin.read(block_size)
+        while True:
+            following = fin.read(block_size) if block else b""
+            last = not following
+            size = (size + len(block)) & 0xFFFFFFFF
+            crc = zlib.crc32(block, crc) & 0xFFFFFFFF
+            pending.append(pool.submit(_deflate_block, block, dictionary, compresslevel, last))
+            dictionary = block[-_DEFLATE_WINDOW:]
+            # Bound the blocks held in memory while keeping every worker busy.
+            while len(pending) > workers * 2:
+                fout.write(pending.popleft().result())
+            if last:
+                break
+            block = following
+
+        while pending:
+            fout.write(pending.popleft().result())
+
+        # GZIP trailer: CRC32 + ISIZE (both little-endian uint32)
+        fout.write(struct.pack("<II", crc, size))
+    return fout.close()
+
+
+# Optional extra artifacts: codec -> (file suffix, compressor factory).
+# Both formats are deterministic for a given input and preset.
+EXTRA_CODECS: Dict[str, Tuple[str, Callable[[], object]]] = {
+    "xz": (".xz", lambda: lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=9)),
+    "bz2": (".bz2", lambda: bz2.BZ2Compressor(9)),
+}
+
+
+def copy_file(src: Path, dst: Path) -> WrittenFile:
+    with src.open("rb") as fin, HashingWriter(dst) as fout:
+        for chunk in iter(lambda: fin.read(1024 * 1024), b""):
+            fout.write(chunk)
+    return fout.close()
+
+
+def compress_file(src: Path, dst: Path, codec: str) -> WrittenFile:
+    compressor = EXTRA_CODECS[codec][1]()
+    with src.open("rb") as fin, HashingWriter(dst) as fout:
+        for chunk in iter(lambda: fin.read(1024 * 1024), b""):
+            data = compressor.compress(chunk)
+            if data:
+                fout.write(data)
+        fout.write(compressor.flush())
+    return fout.close()
+
+
+class TaskGraph:
+    """
+    Runs named callables on a thread pool once the tasks they depend on are
+    done; each receives its dependencies' results as arguments, in order.
+
+    run() returns every result keyed by name. If tasks fail, nothing new is
+    started, running tasks are allowed to finish, and the exception of the
+    first failed task in the order tasks were added is raised, so the error
+    does not depend on thread timing.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, Tuple[Callable[..., object], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, fn: Callable[..., object], *deps: str) -> None:
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        missing = [d for d in deps if d not in self._tasks]
+        if missing:
+            raise ValueError(f"Task {name} depends on unknown tasks: {missing}")
+        self._tasks[name] = (fn, deps)
+
+    def run(self, workers: Optional[int] = None) -> Dict[str, object]:
+        results: Dict[str, object] = {}
+        errors: Dict[str, BaseException] = {}
+        pending = dict(self._tasks)
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            while pending or running:
+                if not errors:
+                    for name, (fn, deps) in list(pending.items()):
+                        if all(d in results for d in deps):
+                            del pending[name]
+                            running[pool.submit(fn, *(results[d] for d in deps))] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        results[name] = future.result()
+                    else:
+                        errors[name] = error
+        if errors:
+            raise next(errors[name] for name in self._tasks if name in errors)
+        return results
+
+
+# Stage names recorded by main() and build_sqlite_from_usb_ids(); any of
+# them can be passed to --profile.
+PROFILE_STAGES = (
+    "download",
+    "cache_restore",
+    "parse",
+    "load",
+    "parse_load",
+    "index",
+    "pack_names",
+    "search_index",
+    "vacuum",
+    "write",
+    "verify_layout",
+    "dump_sql",
+    "lookup_index",
+    "copy_db",
+    "block_manifest",
+    "gzip",
+    *EXTRA_CODECS,
+    "cache_store",
+    "delta",
+    "history",
+)
+
+
+def _build_db(
+    args: argparse.Namespace,
+    source: Union[Path, Iterable[str]],
+    ids_txt: Path,
+    db_path: Path,
+    td_path: Path,
+    recorder: StageRecorder,
+) -> ParseState:
+    """
+    Builds db_path from `source` (the usb.ids file, or its lines as they
+    stream in) and optionally checks its page layout against ids_txt.
+    """
+    state = build_sqlite_from_usb_ids(
+        source,
+        db_path,
+        vacuum=(not args.no_vacuum),
+        parser=args.parser,
+        loader=args.loader,
+        engine=args.engine,
+        page_size=args.page_size,
+        schema=args.schema,
+        search_index=args.search_index,
+        recorder=recorder,
+        parse_workers=args.parse_workers,
+    )
+
+    if args.verify_layout:
+        from build_usbids_db import page_layout_diff
+
+        with recorder.stage("verify_layout"):
+            reference = td_path / "reference.sqlite"
+            build_sqlite_from_usb_ids(
+                ids_txt,
+                reference,
+                vacuum=True,
+                parser=args.parser,
+                loader=args.loader,
+                engine="disk",
+                page_size=args.page_size,
+                schema=args.schema,
+                search_index=args.search_index,
+                parse_workers=args.parse_workers,
+            )
+            mismatched = page_layout_diff(db_path, reference)
+        if mismatched:
+            raise SystemExit(f"[FAIL] DB layout differs from a VACUUMed disk build on pages {mismatched[:10]}")
+        print("[OK] DB page layout matches a VACUUMed disk build")
+    return state
+
+
+# Optional outputs written by sibling modules: role -> (module, function).
+# They are imported only when the role is requested; the build cache
+# fingerprints these modules' source (see usbids_cache._TOOL_SOURCES).
+OUTPUT_WRITERS: Dict[str, Tuple[str, str]] = {
+    "index": ("usbids_index", "write_lookup_index"),
+    "blocks": ("usbids_sync", "write_block_manifest"),
+}
+
+
+def _output_writer(role: str) -> Callable:
+    module, name = OUTPUT_WRITERS[role]
+    return getattr(importlib.import_module(module), name)
+
+
+def _write_outputs(
+    args: argparse.Namespace,
+    state: ParseState,
+    db_path: Path,
+    targets: Dict[str, Path],
+    extra_codecs: List[str],
+    codec_report: list,
+    recorder: StageRecorder,
+) -> List[WrittenFile]:
+    """
+    Writes every output in `targets` from the finished db_path.
+    Appends (codec, WrittenFile, seconds) per compressed DB to codec_report.
+    """
+    header = (
+        f"Generated by tools/update_usbids_artifacts.py\n"
+        f"Source: {args.url}\n"
+        f"usb.ids Version: {state.meta_version or 'unknown'}\n"
+        f"usb.ids Date: {state.meta_date or 'unknown'}"
+    )
+
+    db_size = db_path.stat().st_size
+
+    # Every output only reads the finished DB, so they are written in
+    # parallel; a sidecar waits for its artifact's digest. Digests are
+    # computed as each file is written, so hashing has no stage of its own.
+    def output(stage: str, write: Callable[[], WrittenFile]) -> Callable[[], Tuple[WrittenFile, float]]:
+        def run() -> Tuple[WrittenFile, float]:
+            with recorder.stage(stage) as info:
+                written_file = write()
+                info.update(bytes_read=db_size, bytes_written=written_file.size)
+            return written_file, info["seconds"]
+
+        return run
+
+    def sidecar(role: str) -> Callable[[Tuple[WrittenFile, float]], Tuple[WrittenFile, float]]:
+        def run(artifact: Tuple[WrittenFile, float]) -> Tuple[WrittenFile, float]:
+            return _write_sha256_sidecar(targets[role], targets[f"{role}.sha256"], artifact[0].sha256), 0.0
+
+        return run
+
+    graph = TaskGraph()
+    graph.add("sql", output("dump_sql", lambda: dump_sql(db_path, targets["sql"], header)))
+    if "index" in targets:
+        write_lookup_index = _output_writer("index")
+        graph.add("index", output("lookup_index", lambda: write_lookup_index(db_path, targets["index"])[1]))
+    if "blocks" in targets:
+        write_block_manifest = _output_writer("blocks")
+        graph.add("db", output("copy_db", lambda: copy_file(db_path, targets["db"])))
+        graph.add(
+            "blocks",
+            output(
+                "block_manifest",
+                lambda: write_block_manifest(db_path, targets["blocks"], file_name=targets["db"].name)[1],
+            ),
+        )
+    graph.add(
+        "gz",
+        output(
+            "gzip",
+            lambda: gzip_file_parallel(db_path, targets["gz"], compresslevel=9, workers=args.gzip_workers or None),
+        ),
+    )
+    for codec in extra_codecs:
+        graph.add(codec, output(codec, lambda codec=codec: compress_file(db_path, targets[codec], codec)))
+    for role in [r for r in targets if f"{r}.sha256" in targets]:
+        graph.add(f"{role}.sha256", sidecar(role), role)
+
+    results = graph.run(workers=args.output_workers or None)
+    codec_report.append(("gzip", *results["gz"]))
+    for codec in extra_codecs:
+        codec_report.append((codec, *results[codec]))
+    # Report in target order, whatever order the tasks finished in.
+    written = [results[role][0] for role in targets]
+    return written
 
 
 def main() -> None:
@@ -523,42 +1826,295 @@ def main() -> None:
         help="Output sha256 sidecar for gzip (default: assets/db_src/usbids.sqlite.gz.sha256)",
     )
     ap.add_argument("--timeout", type=int, default=60, help="Download timeout seconds (default: 60)")
+    ap.add_argument(
+        "--gzip-workers",
+        type=int,
+        default=0,
+        help="Threads for block-parallel gzip (default: CPU count; output does not depend on it)",
+    )
+    ap.add_argument(
+        "--extra-codecs",
+        default="",
+        help=f"Comma-separated extra DB artifacts next to --out-gz, each with a .sha256 ({', '.join(EXTRA_CODECS)})",
+    )
+    ap.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Keep usb.ids and its HTTP validators here between runs (enables conditional/resumed downloads)",
+    )
+    ap.add_argument("--force", action="store_true", help="Rebuild even when upstream reports usb.ids unchanged")
     ap.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM (faster, slightly bigger DB)")
+    ap.add_argument(
+        "--parser",
+        choices=sorted(PARSERS),
+        default="dispatch",
+        help=(
+            "usb.ids parser: single-pass 'dispatch', the reference regex 'cascade', or 'parallel' "
+            "(dispatch over a process pool, for large or merged inputs) (default: dispatch)"
+        ),
+    )
+    ap.add_argument(
+        "--parse-workers",
+        type=int,
+        default=None,
+        help="Processes used by --parser parallel (default: CPU count)",
+    )
+    ap.add_argument(
+        "--out-index",
+        default=None,
+        help="Also write the mmap-friendly binary lookup index (see tools/usbids_index.py) and its .sha256",
+    )
+    ap.add_argument(
+        "--out-blocks",
+        default=None,
+        help=(
+            "Also write a block-checksum manifest (see tools/usbids_sync.py) and the uncompressed DB next to "
+            "--out-gz, so clients can fetch only changed pages with Range requests"
+        ),
+    )
+    ap.add_argument(
+        "--delta-base",
+        default=None,
+        help="Previous usbids.sql or usbids.sqlite; also write a delta from it to the new build",
+    )
+    ap.add_argument(
+        "--out-delta",
+        default=None,
+        help="Output delta path, used with --delta-base (default: assets/db_src/usbids.delta.json.gz)",
+    )
+    ap.add_argument(
+        "--history-store",
+        default=None,
+        help="Also add this build to a multi-version catalog store (see tools/usbids_history.py)",
+    )
+    ap.add_argument(
+        "--loader",
+        choices=LOADERS,
+        default="bulk",
+        help="DB writer: batched 'bulk' executemany or per-row 'upsert' (default: bulk)",
+    )
+    ap.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="memory",
+        help="Build in ':memory:' and write the file once with backup(), or build on 'disk' (default: memory)",
+    )
+    ap.add_argument("--page-size", type=int, default=None, help="SQLite page size in bytes (default: SQLite's)")
+    ap.add_argument(
+        "--schema",
+        choices=SCHEMA_PROFILES,
+        default="compat",
+        help=(
+            "Table layout: current 'compat' schema, WITHOUT ROWID 'lookup' tables, or 'compact' "
+            "(lookup with common name words coded behind views) (default: compat)"
+        ),
+    )
+    ap.add_argument(
+        "--search-index",
+        action="store_true",
+        help=f"Add the FTS5 vendor/product name index ({SEARCH_TABLE}) used by UsbIdsLookup.search()",
+    )
+    ap.add_argument(
+        "--build-cache",
+        default=None,
+        help="Reuse finished artifacts from this directory when usb.ids, options and tools are unchanged",
+    )
+    ap.add_argument(
+        "--build-cache-max-mb",
+        type=int,
+        default=256,
+        help="Evict least recently used build cache entries beyond this size (default: 256)",
+    )
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse usb.ids while it downloads instead of after (still saved, hashed and cached as usual)",
+    )
+    ap.add_argument(
+        "--output-workers",
+        type=int,
+        default=0,
+        help="Threads writing the SQL dump, index and compressed DBs in parallel (default: CPU count)",
+    )
+    ap.add_argument(
+        "--metrics",
+        default=None,
+        help="Append per-stage timings, rows, bytes and peak RSS to this file as JSON lines",
+    )
+    ap.add_argument(
+        "--profile",
+        choices=PROFILE_STAGES,
+        default=None,
+        help="Run one stage under cProfile and save its stats (see --profile-out)",
+    )
+    ap.add_argument(
+        "--profile-out",
+        default=None,
+        help="pstats output for --profile (default: usbids-<stage>.pstats)",
+    )
+    ap.add_argument(
+        "--verify-layout",
+        action="store_true",
+        help="Also build on disk with VACUUM and fail unless the DB pages match",
+    )
     args = ap.parse_args()
 
+    extra_codecs = [c for c in args.extra_codecs.split(",") if c]
+    unknown = [c for c in extra_codecs if c not in EXTRA_CODECS]
+    if unknown:
+        ap.error(f"unknown --extra-codecs: {', '.join(unknown)}")
+    recorder = StageRecorder(
+        Path(args.metrics) if args.metrics else None,
+        profile_stage=args.profile,
+        profile_out=Path(args.profile_out) if args.profile_out else None,
+    )
+    if args.verify_layout and args.no_vacuum:
+        ap.error("--verify-layout compares against a VACUUMed build and cannot be used with --no-vacuum")
+
     ROOT = Path(__file__).resolve().parents[1]
     out_sql = Path(args.out_sql) if args.out_sql else (ROOT / "assets" / "db_src" / "usbids.sql")
     out_gz = Path(args.out_gz) if args.out_gz else (ROOT / "assets" / "db_src" / "usbids.sqlite.gz")
     out_gz_sha = Path(args.out_gz_sha256) if args.out_gz_sha256 else (ROOT / "assets" / "db_src" / "usbids.sqlite.gz.sha256")
+    out_delta = Path(args.out_delta) if args.out_delta else (ROOT / "assets" / "db_src" / "usbids.delta.json.gz")
 
     with tempfile.TemporaryDirectory(prefix="usbids_update_") as td:
         td_path = Path(td)
-        ids_txt = td_path / "usb.ids"
+        ids_txt = (Path(args.cache_dir) if args.cache_dir else td_path) / "usb.ids"
         db_path = td_path / "usbids.sqlite"
 
-        download_usb_ids(args.url, ids_txt, timeout=args.timeout)
-
-        state = build_sqlite_from_usb_ids(ids_txt, db_path, vacuum=(not args.no_vacuum))
-
-        header = (
-            f"Generated by tools/update_usbids_artifacts.py\n"
-            f"Source: {args.url}\n"
-            f"usb.ids Version: {state.meta_version or 'unknown'}\n"
-            f"usb.ids Date: {state.meta_date or 'unknown'}"
-        )
-        dump_sql(db_path, out_sql, header)
-
-        gzip_file(db_path, out_gz, compresslevel=9)
-        gz_digest = _write_sha256_sidecar(out_gz, out_gz_sha)
+        outputs_exist = out_sql.exists() and out_gz.exists() and out_gz_sha.exists()
+        state: Optional[ParseState] = None
+        if args.stream:
+            # Parse and load while the body downloads. The digest, and with it
+            # the build cache key, is only known once the DB is built.
+            stream = StreamedDownload(args.url, ids_txt, timeout=args.timeout)
+            with recorder.stage("download") as info:
+                not_modified = stream.wait_ready()
+                info["streamed"] = True
+            # A 304 has no body: wait_ready() only returns once it is complete.
+            if not (not_modified and outputs_exist and not args.force):
+                state = _build_db(args, stream, ids_txt, db_path, td_path, recorder)
+            download = stream.result
+            if download is None:
+                raise SystemExit("Download did not complete")
+        else:
+            with recorder.stage("download") as info:
+                download = download_usb_ids(args.url, ids_txt, timeout=args.timeout)
+                info.update(status=download.status, bytes_written=download.size)
+        if download.not_modified and outputs_exist and not args.force:
+            recorder.finish(result="not_modified")
+            print(f"[OK] usb.ids not modified (sha256={download.sha256}); artifacts are up to date")
+            return
+
+        # Output role -> path, in write order; a build cache entry stores the
+        # same files under these role names.
+        targets: Dict[str, Path] = {"sql": out_sql}
+        if args.out_index:
+            targets["index"] = Path(args.out_index)
+            targets["index.sha256"] = Path(args.out_index + ".sha256")
+        if args.out_blocks:
+            # The manifest describes the uncompressed DB, published beside the gzip.
+            targets["db"] = out_gz.with_name(db_path.name)
+            targets["blocks"] = Path(args.out_blocks)
+        targets["gz"] = out_gz
+        targets["gz.sha256"] = out_gz_sha
+        for codec in extra_codecs:
+            out_extra = out_gz.with_name(db_path.name + EXTRA_CODECS[codec][0])
+            targets[codec] = out_extra
+            targets[f"{codec}.sha256"] = Path(str(out_extra) + ".sha256")
+
+        # Snapshot the delta base before any output is written: it is often
+        # the usbids.sql or published usbids.sqlite about to be overwritten.
+        base_con = None
+        if args.delta_base:
+            from usbids_delta import open_catalog
+
+            base_con = open_catalog(Path(args.delta_base))
+
+        cache = None
+        cache_key = ""
+        written: Optional[List[WrittenFile]] = None
+        if args.build_cache:
+            from usbids_cache import BuildCache, build_key
+
+            cache = BuildCache(Path(args.build_cache), max_bytes=args.build_cache_max_mb * 1024 * 1024)
+            cache_key = build_key(
+                download.sha256,
+                {
+                    "url": args.url,
+                    "parser": args.parser,
+                    "loader": args.loader,
+                    "engine": args.engine,
+                    "page_size": args.page_size,
+                    "schema": args.schema,
+                    "search_index": args.search_index,
+                    "vacuum": not args.no_vacuum,
+                    "outputs": list(targets),
+                },
+            )
+            if not args.force:
+                with recorder.stage("cache_restore") as info:
+                    restored = cache.restore(cache_key, {"sqlite": db_path, **targets})
+                    info["hit"] = restored is not None
+                if restored is not None:
+                    written = restored[1:]
+                    print(f"[OK] Build cache hit {cache_key[:16]} ({info['seconds'] * 1000:.1f} ms)")
+
+        codec_report = []
+        result = "cache_hit" if written is not None else "built"
+        if written is None:
+            if state is None:
+                state = _build_db(args, ids_txt, ids_txt, db_path, td_path, recorder)
+            written = _write_outputs(args, state, db_path, targets, extra_codecs, codec_report, recorder)
+            if cache is not None:
+                with recorder.stage("cache_store"):
+                    cache.store(cache_key, {"sqlite": db_path, **targets})
+
+        delta_tables = None
+        if base_con is not None:
+            from usbids_delta import diff_catalogs, open_catalog, write_delta
+
+            with recorder.stage("delta") as info:
+                target_con = open_catalog(db_path)
+                try:
+                    delta = diff_catalogs(base_con, target_con)
+                finally:
+                    base_con.close()
+                    target_con.close()
+                write_delta(delta, out_delta)
+                info["bytes_written"] = out_delta.stat().st_size
+            delta_tables = delta["tables"]
+
+        history = None
+        if args.history_store:
+            from usbids_history import ingest_catalog
+
+            with recorder.stage("history") as info:
+                try:
+                    history = ingest_catalog(Path(args.history_store), db_path)
+                except ValueError as e:
+                    print(f"[WARN] Not added to {args.history_store}: {e}")
+                info["added"] = history is not None
+
+        recorder.finish(result=result, bytes_written=sum(item.size for item in written))
 
         print("[OK] Wrote:")
-        print(f"  - {out_sql} ({out_sql.stat().st_size} bytes)")
-        print(f"  - {out_gz} ({out_gz.stat().st_size} bytes)")
-        print(f"  - {out_gz_sha} ({out_gz_sha.stat().st_size} bytes)")
+        for item in written:
+            print(f"  - {item.path} ({item.size} bytes)")
+        if delta_tables is not None:
+            changed = sum(len(rows) for ops in delta_tables.values() for rows in ops.values())
+            print(f"  - {out_delta} ({out_delta.stat().st_size} bytes, {changed} changed rows)")
+        if history is not None:
+            changed = sum(opened + closed for opened, closed in history[1].values())
+            print(f"  - {args.history_store} (version {history[0]}, {changed} rows opened or closed)")
+        if codec_report:
+            db_size = db_path.stat().st_size
+            print(f"[OK] Compression (usbids.sqlite {db_size} bytes):")
+            for codec, item, seconds in sorted(codec_report, key=lambda r: r[1].size):
+                print(f"  - {codec:<5} {item.size:>10} bytes  ratio={item.size / db_size:6.3f}  time={seconds:7.3f}s")
         print("[OK] Checksums:")
-        print(f"  - usbids.sql                 sha256={_sha256_file(out_sql)}")
-        print(f"  - usbids.sqlite.gz           sha256={gz_digest}")
-        print(f"  - usbids.sqlite.gz.sha256    sha256={_sha256_file(out_gz_sha)}")
+        for item in written:
+            print(f"  - {item.path.name:<26} sha256={item.sha256}")
 
 
 if __name__ == "__main__":
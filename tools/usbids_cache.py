@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from update_usbids_artifacts import OUTPUT_WRITERS, HashingWriter, WrittenFile
+
+CACHE_FORMAT = "usbids-cache/1"
+MANIFEST = "manifest.json"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _tool_sources() -> Tuple[str, ...]:
+    """
+    update_usbids_artifacts.py, the output writers it loads on demand, and
+    every tools/ module any of them imports at load time.
+    """
+    tools = Path(__file__).resolve().parent
+    pending = ["update_usbids_artifacts", *(module for module, _ in OUTPUT_WRITERS.values())]
+    seen = set()
+    while pending:
+        name = pending.pop()
+        source = tools / f"{name}.py"
+        if name in seen or not source.exists():
+            continue
+        seen.add(name)
+        for node in ast.parse(source.read_bytes()).body:
+            if isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module)
+            elif isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+    return tuple(sorted(f"{name}.py" for name in seen))
+
+
+# Sources whose code decides the bytes of a build; editing any of them
+# invalidates every cached entry. Derived from the imports so a new writer
+# module cannot be left out.
+_TOOL_SOURCES = _tool_sources()
+
+_COPY_CHUNK = 1024 * 1024
+
+
+def tool_fingerprint() -> str:
+    """
+    sha256 over the build tools' source and the library versions that shape
+    their output (SQLite file format, zlib/lzma streams).
+    """
+    h = hashlib.sha256()
+    tools = Path(__file__).resolve().parent
+    for name in _TOOL_SOURCES:
+        h.update(name.encode("utf-8") + b"\0")
+        h.update((tools / name).read_bytes())
+    versions = [CACHE_FORMAT, sqlite3.sqlite_version, zlib.ZLIB_RUNTIME_VERSION, platform.python_version()]
+    h.update("\0".join(versions).encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_key(input_sha256: str, options: Dict[str, Any]) -> str:
+    """
+    Cache key for one build: the usb.ids digest, the tool fingerprint and
+    every option that changes the artifacts (including which are written).
+    """
+    doc = {"input": input_sha256, "tool": tool_fingerprint(), "options": options}
+    return hashlib.sha256(json.dumps(doc, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _copy_hashed(src: Path, dst: Path) -> WrittenFile:
+    with src.open("rb") as fin, HashingWriter(dst) as out:
+        while True:
+            chunk = fin.read(_COPY_CHUNK)
+            if not chunk:
+                break
+            out.write(chunk)
+    return out.close()
+
+
+class BuildCache:
+    """
+    Directory of finished builds, one subdirectory per build_key().
+
+    Each entry holds its files under role names ("sqlite", "sql", "gz",
+    "gz.sha256", ...) plus a manifest with their sizes and digests. Entries
+    are written to a temp directory and renamed into place, so a crashed run
+    never leaves a half entry behind. store() evicts least recently used
+    entries until the cache fits in `max_bytes`.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the entry's manifest, marking it as used, or None on a miss."""
+        manifest_path = self._entry(key) / MANIFEST
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if manifest.get("format") != CACHE_FORMAT or manifest.get("key") != key:
+            return None
+        os.utime(manifest_path)
+        return manifest
+
+    def restore(self, key: str, targets: Dict[str, Path]) -> Optional[List[WrittenFile]]:
+        """
+        Copies the given roles out of an entry, checking each digest on the
+        way. Targets are only replaced once every copy has verified; on any
+        mismatch the entry is dropped and None is returned.
+        """
+        manifest = self.lookup(key)
+        if manifest is None or not set(targets) <= set(manifest["files"]):
+            return None
+        staged = []
+        try:
+            for role, target in targets.items():
+                tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+                staged.append((tmp, target))
+                copied = _copy_hashed(self._entry(key) / role, tmp)
+                if copied.sha256 != manifest["files"][role]["sha256"]:
+                    raise ValueError(f"cache entry {key} is corrupt: {role}")
+        except (OSError, ValueError):
+            for tmp, _ in staged:
+                if tmp.exists():
+                    tmp.unlink()
+            self.discard(key)
+            return None
+
+        restored = []
+        for (tmp, target), role in zip(staged, targets):
+            os.replace(tmp, target)
+            info = manifest["files"][role]
+            restored.append(WrittenFile(target, info["size"], info["sha256"]))
+        return restored
+
+    def store(self, key: str, files: Dict[str, Path]) -> Dict[str, Any]:
+        """Copies a finished build into the cache under `key` and evicts old entries."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_dir = self.root / f".tmp-{uuid.uuid4().hex}"
+        try:
+            entries = {role: _copy_hashed(src, tmp_dir / role) for role, src in files.items()}
+            manifest = {
+                "format": CACHE_FORMAT,
+                "key": key,
+                "created": int(time.time()),
+                "files": {role: {"size": f.size, "sha256": f.sha256} for role, f in entries.items()},
+            }
+            (tmp_dir / MANIFEST).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+            self.discard(key)
+            os.replace(tmp_dir, self._entry(key))
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+        self.evict(keep=key)
+        return manifest
+
+    def discard(self, key: str) -> None:
+        entry = self._entry(key)
+        if entry.exists():
+            shutil.rmtree(entry)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Manifests of all entries, least recently used first, with `size` and `last_used` added."""
+        result = []
+        if not self.root.exists():
+            return result
+        for entry in self.root.iterdir():
+            manifest_path = entry / MANIFEST
+            if entry.name.startswith(".") or not manifest_path.exists():
+                continue
+            try:
+                manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            except ValueError:
+                continue
+            manifest["size"] = sum(f["size"] for f in manifest["files"].values())
+            manifest["last_used"] = manifest_path.stat().st_mtime
+            result.append(manifest)
+        result.sort(key=lambda m: (m["last_used"], m["key"]))
+        return result
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Removes least recently used entries until the total fits in max_bytes."""
+        entries = self.entries()
+        total = sum(m["size"] for m in entries)
+        removed = []
+        for manifest in entries:
+            if total <= self.max_bytes:
+                break
+            if manifest["key"] == keep:
+                continue
+            self.discard(manifest["key"])
+            total -= manifest["size"]
+            removed.append(manifest["key"])
+        return removed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inspect or prune the usbids build cache (--build-cache)")
+    ap.add_argument("cache_dir", help="Build cache directory")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="List entries, least recently used first")
+    p_prune = sub.add_parser("prune", help="Evict entries until the cache fits")
+    p_prune.add_argument("--max-mb", type=int, required=True, help="Size limit in MiB")
+    args = ap.parse_args()
+
+    if args.cmd == "list":
+        cache = BuildCache(Path(args.cache_dir))
+        for manifest in cache.entries():
+            used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(manifest["last_used"]))
+            roles = ", ".join(sorted(manifest["files"]))
+            print(f"{manifest['key'][:16]}  {manifest['size']:>10} bytes  last used {used}  [{roles}]")
+        return
+
+    cache = BuildCache(Path(args.cache_dir), max_bytes=args.max_mb * 1024 * 1024)
+    removed = cache.evict()
+    print(f"[OK] Evicted {len(removed)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from build_usbids_db import load_sql_dump
+from update_usbids_artifacts import SEARCH_TABLE, TABLE_COLUMNS, gzip_file, require_writable_catalog
+
+DELTA_FORMAT = "usbids-delta/1"
+
+# Deletes run children-first, inserts parents-first (see TABLE_COLUMNS order).
+_TABLES = tuple(TABLE_COLUMNS)
+
+
+def open_catalog(path: Path) -> sqlite3.Connection:
+    """
+    Load a usbids.sqlite or usbids.sql dump into memory.
+
+    The returned connection is a snapshot: later writes to `path`, such as
+    a build publishing over the previous catalog, do not show through.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Catalog not found: {path}")
+    con = sqlite3.connect(":memory:")
+    if path.suffix == ".sql":
+        load_sql_dump(con, path)
+        return con
+    src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        src.backup(con)
+    finally:
+        src.close()
+    return con
+
+
+def _table_rows(con: sqlite3.Connection, table: str) -> Dict[tuple, Any]:
+    cols = TABLE_COLUMNS[table]
+    keys = ", ".join(cols[:-1])
+    sql = f"SELECT {', '.join(cols)} FROM {table} ORDER BY {keys}"
+    return {tuple(row[:-1]): row[-1] for row in con.execute(sql)}
+
+
+def content_digest(con: sqlite3.Connection) -> str:
+    """
+    sha256 over every row of every catalog table in primary key order.
+
+    Unlike a file hash this does not depend on page layout or rowids, so a DB
+    patched with apply_delta() hashes the same as a fresh build of the target.
+    """
+    h = hashlib.sha256()
+    for table in _TABLES:
+        cols = TABLE_COLUMNS[table]
+        sql = f"SELECT {', '.join(cols)} FROM {table} ORDER BY {', '.join(cols[:-1])}"
+        for row in con.execute(sql):
+            h.update(json.dumps([table, *row], ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            h.update(b"\n")
+    return h.hexdigest()
+
+
+def diff_catalogs(base: sqlite3.Connection, target: sqlite3.Connection) -> Dict[str, Any]:
+    """
+    Returns a delta document: per-table inserts, updates and deletes that turn
+    `base` into `target`, plus the content digests of both sides.
+    """
+    tables: Dict[str, Dict[str, List[list]]] = {}
+    for table in _TABLES:
+        old = _table_rows(base, table)
+        new = _table_rows(target, table)
+
+        inserts = [[*k, v] for k, v in sorted(new.items()) if k not in old]
+        updates = [[*k, v] for k, v in sorted(new.items()) if k in old and old[k] != v]
+        deletes = [list(k) for k in sorted(old) if k not in new]
+
+        changes = {}
+        if inserts:
+            changes["insert"] = inserts
+        if updates:
+            changes["update"] = updates
+        if deletes:
+            changes["delete"] = deletes
+        if changes:
+            tables[table] = changes
+
+    return {
+        "format": DELTA_FORMAT,
+        "base_sha256": content_digest(base),
+        "target_sha256": content_digest(target),
+        "tables": tables,
+    }
+
+
+def write_delta(delta: Dict[str, Any], out_path: Path) -> None:
+    """
+    Writes the delta as compact, key-sorted JSON. A `.gz` suffix produces a
+    deterministic gzip of the same JSON.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    payload = json.dumps(delta, ensure_ascii=False, sort_keys=True, separators=(",", ":")) + "\n"
+    if out_path.suffix != ".gz":
+        out_path.write_text(payload, encoding="utf-8", newline="\n")
+        return
+    with tempfile.TemporaryDirectory(prefix="usbids_delta_") as td:
+        raw = Path(td) / "delta.json"
+        raw.write_text(payload, encoding="utf-8", newline="\n")
+        gzip_file(raw, out_path, compresslevel=9)
+
+
+def read_delta(path: Path) -> Dict[str, Any]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        delta = json.load(f)
+    if delta.get("format") != DELTA_FORMAT:
+        raise ValueError(f"Unsupported delta format: {delta.get('format')!r}")
+    return delta
+
+
+def apply_delta(db_path: Path, delta: Dict[str, Any]) -> Tuple[int, int, int]:
+    """
+    Applies a delta to an existing usbids.sqlite in one transaction.
+
+    The DB must match the delta's base digest, and the patched DB must match
+    its target digest; otherwise nothing is changed and ValueError is raised.
+    "compact" catalogs are refused up front. Returns (inserted, updated,
+    deleted) row counts.
+    """
+    con = sqlite3.connect(str(db_path))
+    try:
+        require_writable_catalog(con, "apply a delta")
+        con.execute("PRAGMA foreign_keys=ON;")
+        actual = content_digest(con)
+        if actual != delta["base_sha256"]:
+            raise ValueError(f"Delta base mismatch: DB is {actual}, delta expects {delta['base_sha256']}")
+
+        changes = delta["tables"]
+        inserted = updated = deleted = 0
+        with con:
+            for table in reversed(_TABLES):
+                rows = changes.get(table, {}).get("delete", ())
+                if rows:
+                    where = " AND ".join(f"{c}=?" for c in TABLE_COLUMNS[table][:-1])
+                    con.executemany(f"DELETE FROM {table} WHERE {where};", rows)
+                    deleted += len(rows)
+
+            for table in _TABLES:
+                cols = TABLE_COLUMNS[table]
+                rows = changes.get(table, {}).get("update", ())
+                if rows:
+                    where = " AND ".join(f"{c}=?" for c in cols[:-1])
+                    con.executemany(
+                        f"UPDATE {table} SET {cols[-1]}=? WHERE {where};",
+                        [(row[-1], *row[:-1]) for row in rows],
+                    )
+                    updated += len(rows)
+                rows = changes.get(table, {}).get("insert", ())
+                if rows:
+                    placeholders = ", ".join("?" * len(cols))
+                    con.executemany(f"INSERT INTO {table}({', '.join(cols)}) VALUES({placeholders});", rows)
+                    inserted += len(rows)
+
+            # The search index is external content over vendors/products; it
+            # does not follow their changes by itself.
+            if con.execute("SELECT 1 FROM sqlite_master WHERE name=?", (SEARCH_TABLE,)).fetchone():
+                con.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('rebuild');")
+
+            actual = content_digest(con)
+            if actual != delta["target_sha256"]:
+                raise ValueError(f"Delta target mismatch: got {actual}, expected {delta['target_sha256']}")
+    finally:
+        con.close()
+
+    return inserted, updated, deleted
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Create or apply usbids catalog deltas")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_diff = sub.add_parser("diff", help="Write a delta from a base catalog to a target catalog")
+    p_diff.add_argument("base", help="Previous usbids.sql or usbids.sqlite")
+    p_diff.add_argument("target", help="New usbids.sql or usbids.sqlite")
+    p_diff.add_argument("out", help="Output delta (.json or .json.gz)")
+
+    p_apply = sub.add_parser("apply", help="Patch a usbids.sqlite in place")
+    p_apply.add_argument("db", help="usbids.sqlite to patch")
+    p_apply.add_argument("delta", help="Delta file (.json or .json.gz)")
+    args = ap.parse_args()
+
+    if args.cmd == "diff":
+        base = open_catalog(Path(args.base))
+        target = open_catalog(Path(args.target))
+        try:
+            delta = diff_catalogs(base, target)
+        finally:
+            base.close()
+            target.close()
+        out = Path(args.out)
+        write_delta(delta, out)
+        print(f"[OK] Wrote {out} ({out.stat().st_size} bytes)")
+    else:
+        try:
+            inserted, updated, deleted = apply_delta(Path(args.db), read_delta(Path(args.delta)))
+        except ValueError as e:
+            raise SystemExit(f"[FAIL] {e}")
+        print(f"[OK] Applied delta: {inserted} inserted, {updated} updated, {deleted} deleted")
+
+
+if __name__ == "__main__":
+    main()
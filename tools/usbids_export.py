@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Bulk export of the catalog tables to flat files for warehouse loaders.
+
+One file per table, rows in primary key order, plus export.json listing
+every file with its row count and sha256:
+
+  ndjson  one JSON object per line, keys in column order
+  csv     header line, then RFC 4180 rows ("\\n" line ends); loads with COPY
+  packed  fixed-width little-endian records, no header: integer columns in
+          the smallest of 1/2/4/8 bytes that holds them, text columns as
+          NUL-padded UTF-8 of the table's longest value. export.json gives
+          each table's struct format, widths and record size.
+
+Tables are exported in parallel, each from its own read-only connection,
+fetching a bounded batch of rows at a time. Output depends only on the
+catalog's rows, so unchanged tables export byte-identical and diffs stay
+small.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from update_usbids_artifacts import TABLE_COLUMNS, HashingWriter, TaskGraph, WrittenFile
+
+EXPORT_FORMATS = ("ndjson", "csv", "packed")
+FORMAT_SUFFIX = {"ndjson": ".ndjson", "csv": ".csv", "packed": ".bin"}
+MANIFEST_NAME = "export.json"
+
+EXPORT_BATCH_ROWS = 2000
+
+_INT_CODES = ((1, "B", "b"), (2, "H", "h"), (4, "I", "i"), (8, "Q", "q"))
+
+
+def _iter_batches(con: sqlite3.Connection, table: str, batch_rows: int) -> Iterator[List[tuple]]:
+    cols = TABLE_COLUMNS[table]
+    cur = con.execute(f"SELECT {', '.join(cols)} FROM {table} ORDER BY {', '.join(cols[:-1])};")
+    while True:
+        rows = cur.fetchmany(batch_rows)
+        if not rows:
+            return
+        yield rows
+
+
+def packed_layout(con: sqlite3.Connection, table: str) -> List[Dict[str, object]]:
+    """
+    Column layout of a table's packed records, from one aggregate query:
+    [{"name", "type": "int"|"text", "format": struct code, "width"}].
+    """
+    cols = TABLE_COLUMNS[table]
+    aggregates = ", ".join(
+        f"max(typeof({c}) <> 'integer'), min({c}), max({c}), max(length(CAST({c} AS BLOB)))" for c in cols
+    )
+    stats = con.execute(f"SELECT {aggregates} FROM {table};").fetchone()
+    layout: List[Dict[str, object]] = []
+    for i, col in enumerate(cols):
+        is_text, lo, hi, longest = stats[i * 4 : i * 4 + 4]
+        if is_text:
+            width = longest or 0
+            layout.append({"name": col, "type": "text", "format": f"{width}s", "width": width})
+            continue
+        lo, hi = lo or 0, hi or 0
+        for width, unsigned, signed in _INT_CODES:
+            bits = width * 8
+            if lo >= 0 and hi < 1 << bits:
+                layout.append({"name": col, "type": "int", "format": unsigned, "width": width})
+                break
+            if lo >= -(1 << (bits - 1)) and hi < 1 << (bits - 1):
+                layout.append({"name": col, "type": "int", "format": signed, "width": width})
+                break
+    return layout
+
+
+def _ndjson_chunk(cols: Sequence[str], rows: List[tuple]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(cols, row)), ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows
+    ).encode("utf-8")
+
+
+def export_table(
+    db_path: Path, table: str, out_path: Path, fmt: str, batch_rows: int = EXPORT_BATCH_ROWS
+) -> Tuple[WrittenFile, Dict[str, object]]:
+    """
+    Streams one table to out_path. Returns the written file and its
+    manifest entry (rows, plus the record layout for "packed").
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    cols = TABLE_COLUMNS[table]
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    entry: Dict[str, object] = {"columns": list(cols)}
+    rows_written = 0
+    try:
+        with HashingWriter(out_path) as out:
+            if fmt == "packed":
+                layout = packed_layout(con, table)
+                record = struct.Struct("<" + "".join(str(c["format"]) for c in layout))
+                text_cols = [i for i, c in enumerate(layout) if c["type"] == "text"]
+                entry.update(layout=layout, struct="<" + "".join(str(c["format"]) for c in layout))
+                entry["record_size"] = record.size
+                for rows in _iter_batches(con, table, batch_rows):
+                    buf = bytearray()
+                    for row in rows:
+                        values = list(row)
+                        for i in text_cols:
+                            values[i] = values[i].encode("utf-8")
+                        buf += record.pack(*values)
+                    out.write(bytes(buf))
+                    rows_written += len(rows)
+            elif fmt == "csv":
+                text = io.StringIO()
+                writer = csv.writer(text, lineterminator="\n")
+                writer.writerow(cols)
+                for rows in _iter_batches(con, table, batch_rows):
+                    writer.writerows(rows)
+                    out.write(text.getvalue().encode("utf-8"))
+                    text.seek(0)
+                    text.truncate()
+                    rows_written += len(rows)
+                out.write(text.getvalue().encode("utf-8"))
+            else:
+                for rows in _iter_batches(con, table, batch_rows):
+                    out.write(_ndjson_chunk(cols, rows))
+                    rows_written += len(rows)
+    finally:
+        con.close()
+    entry["rows"] = rows_written
+    return out.close(), entry
+
+
+def export_catalog(
+    db_path: Path,
+    out_dir: Path,
+    fmt: str = "ndjson",
+    tables: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> Dict[str, object]:
+    """
+    Exports `tables` (default: all catalog tables) from a usbids.sqlite of
+    any schema profile into out_dir, one file per table, in parallel, then
+    writes export.json. Returns the manifest.
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(f"DB not found: {db_path}")
+    tables = list(tables or TABLE_COLUMNS)
+    unknown = [t for t in tables if t not in TABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+
+    graph = TaskGraph()
+    for table in tables:
+        out_path = out_dir / f"{table}{FORMAT_SUFFIX[fmt]}"
+        graph.add(table, lambda table=table, out_path=out_path: export_table(db_path, table, out_path, fmt, batch_rows))
+    results = graph.run(workers=workers)
+
+    files = {}
+    for table in tables:
+        written, entry = results[table]  # type: ignore[misc]
+        files[table] = {"file": written.path.name, "size": written.size, "sha256": written.sha256, **entry}
+    manifest = {"format": fmt, "tables": files}
+    with HashingWriter(out_dir / MANIFEST_NAME) as out:
+        out.write((json.dumps(manifest, ensure_ascii=False, indent=1) + "\n").encode("utf-8"))
+    return manifest
+
+
+def read_packed(path: Path, entry: Dict[str, object]) -> Iterator[tuple]:
+    """Decodes a packed table file using its export.json entry."""
+    record = struct.Struct(str(entry["struct"]))
+    text_cols = [i for i, c in enumerate(entry["layout"]) if c["type"] == "text"]  # type: ignore[union-attr]
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(record.size * 4096), b""):
+            for values in record.iter_unpack(chunk):
+                row = list(values)
+                for i in text_cols:
+                    row[i] = row[i].rstrip(b"\0").decode("utf-8")
+                yield tuple(row)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Export usbids.sqlite tables to NDJSON, CSV or packed binary files")
+    ap.add_argument("db", help="usbids.sqlite (any schema profile) or a usbids.sql dump")
+    ap.add_argument("out_dir", help="Directory for one file per table and export.json")
+    ap.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson", help="Output format (default: ndjson)")
+    ap.add_argument("--tables", default="", help="Comma-separated tables (default: all)")
+    ap.add_argument("--workers", type=int, default=0, help="Tables exported in parallel (default: CPU count)")
+    ap.add_argument(
+        "--batch-rows", type=int, default=EXPORT_BATCH_ROWS, help=f"Rows fetched at a time (default: {EXPORT_BATCH_ROWS})"
+    )
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    db = Path(args.db)
+    tables = [t for t in args.tables.split(",") if t] or None
+    with tempfile.TemporaryDirectory(prefix="usbids_export_") as td:
+        if db.suffix == ".sql":
+            from build_usbids_db import load_sql_dump
+
+            loaded = Path(td) / "usbids.sqlite"
+            con = sqlite3.connect(str(loaded))
+            try:
+                load_sql_dump(con, db)
+            finally:
+                con.close()
+            db = loaded
+        try:
+            manifest = export_catalog(db, Path(args.out_dir), args.format, tables, args.workers or None, args.batch_rows)
+        except (FileNotFoundError, ValueError) as e:
+            raise SystemExit(f"[FAIL] {e}")
+
+    files = manifest["tables"]
+    print(f"[OK] Exported {len(files)} tables to {args.out_dir} ({args.format}) in {time.perf_counter() - t0:.2f}s")
+    for table, info in files.items():  # type: ignore[union-attr]
+        print(f"  - {info['file']:<40} {info['rows']:>7} rows {info['size']:>10} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Multi-version catalog store: many usb.ids snapshots in one SQLite file.
+
+Every catalog table gets a `<table>_history` twin with the same key and
+value columns plus `valid_from` / `valid_to` version ids. A row is valid
+for versions valid_from <= v < valid_to (valid_to NULL: still current), so
+a name that never changes is stored once however many snapshots are
+ingested. Versions are numbered in ingest order and listed in `versions`.
+
+  as_of(v)         connection with TEMP views named like the catalog tables,
+                   showing version v (existing queries run unchanged)
+  history(t, key)  every name a key has had, with the version range of each
+  materialize(v)   a regular usbids.sqlite for version v
+
+Both lookups search the (key..., valid_from) primary key.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from update_usbids_artifacts import (
+    SCHEMA_PROFILES,
+    TABLE_COLUMNS,
+    _sha256_file,
+    build_sqlite_from_usb_ids,
+    pack_names,
+    schema_sql,
+)
+
+VERSIONS_SQL = """
+CREATE TABLE IF NOT EXISTS versions (
+  version_id     INTEGER PRIMARY KEY,
+  label          TEXT NOT NULL UNIQUE,
+  usbids_version TEXT,
+  usbids_date    TEXT,
+  sha256         TEXT NOT NULL,
+  ingested_at    TEXT NOT NULL
+);
+"""
+
+VersionRef = Union[int, str]
+
+
+def _history_table_sql(table: str) -> str:
+    cols = TABLE_COLUMNS[table]
+    keys, value = cols[:-1], cols[-1]
+    key_defs = "".join(f"  {c} {'TEXT' if table == 'meta' else 'INTEGER'} NOT NULL,\n" for c in keys)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table}_history (\n"
+        f"{key_defs}"
+        f"  {value} TEXT NOT NULL,\n"
+        f"  valid_from INTEGER NOT NULL REFERENCES versions(version_id),\n"
+        f"  valid_to   INTEGER REFERENCES versions(version_id),\n"
+        f"  PRIMARY KEY ({', '.join(keys)}, valid_from)\n"
+        f") WITHOUT ROWID;\n"
+    )
+
+
+def _valid_at(alias: str = "") -> str:
+    return f"{alias}valid_from <= ?1 AND ({alias}valid_to IS NULL OR {alias}valid_to > ?1)"
+
+
+def open_store(store_path: Path) -> sqlite3.Connection:
+    """Opens (creating if needed) a history store."""
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(str(store_path))
+    con.executescript(VERSIONS_SQL + "".join(_history_table_sql(t) for t in TABLE_COLUMNS))
+    return con
+
+
+def ingest_catalog(
+    store_path: Path, catalog_db: Path, label: Optional[str] = None
+) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    """
+    Adds a built usbids.sqlite (any schema profile) to the store as the
+    newest version, labelled with its usb.ids "Version" meta unless `label`
+    is given. Rows whose value changed or that disappeared are closed at
+    the new version; new and changed rows open at it. Returns the version
+    id and (opened, closed) rows per table that changed.
+    """
+    if not catalog_db.exists():
+        raise FileNotFoundError(f"DB not found: {catalog_db}")
+    con = open_store(store_path)
+    try:
+        con.execute("ATTACH DATABASE ? AS snap;", (f"{catalog_db.resolve().as_uri()}?mode=ro",))
+        meta = dict(con.execute("SELECT key, value FROM snap.meta;"))
+        label = label or meta.get("version")
+        if not label:
+            raise ValueError(f"{catalog_db} has no usb.ids version; pass a label")
+        if con.execute("SELECT 1 FROM versions WHERE label=?;", (label,)).fetchone():
+            raise ValueError(f"version {label!r} is already in {store_path}")
+
+        counts: Dict[str, Tuple[int, int]] = {}
+        with con:
+            cur = con.execute(
+                "INSERT INTO versions(label, usbids_version, usbids_date, sha256, ingested_at) "
+                "VALUES(?, ?, ?, ?, ?);",
+                (
+                    label,
+                    meta.get("version"),
+                    meta.get("date"),
+                    _sha256_file(catalog_db),
+                    time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                ),
+            )
+            version = cur.lastrowid
+            for table, cols in TABLE_COLUMNS.items():
+                keys, value = cols[:-1], cols[-1]
+                same_key = " AND ".join(f"s.{c} = h.{c}" for c in keys)
+                before = con.total_changes
+                con.execute(
+                    f"UPDATE {table}_history AS h SET valid_to = ?1 WHERE valid_to IS NULL AND NOT EXISTS "
+                    f"(SELECT 1 FROM snap.{table} AS s WHERE {same_key} AND s.{value} IS h.{value});",
+                    (version,),
+                )
+                closed = con.total_changes - before
+                con.execute(
+                    f"INSERT INTO {table}_history({', '.join(cols)}, valid_from) "
+                    f"SELECT {', '.join(cols)}, ?1 FROM snap.{table} AS s WHERE NOT EXISTS "
+                    f"(SELECT 1 FROM {table}_history AS h WHERE {same_key} AND h.valid_to IS NULL);",
+                    (version,),
+                )
+                opened = con.total_changes - before - closed
+                if opened or closed:
+                    counts[table] = (opened, closed)
+        con.execute("DETACH DATABASE snap;")
+        return version, counts
+    finally:
+        con.close()
+
+
+def ingest_usb_ids(
+    store_path: Path, usb_ids: Path, label: Optional[str] = None
+) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    """Builds a usb.ids snapshot in a temp dir and ingests it (see ingest_catalog())."""
+    with tempfile.TemporaryDirectory(prefix="usbids_history_") as td:
+        db = Path(td) / "usbids.sqlite"
+        build_sqlite_from_usb_ids(usb_ids, db, vacuum=False, schema="lookup")
+        return ingest_catalog(store_path, db, label)
+
+
+class CatalogHistory:
+    """Read-only queries over a store written by ingest_catalog()."""
+
+    def __init__(self, store_path: Path) -> None:
+        if not store_path.exists():
+            raise FileNotFoundError(f"Store not found: {store_path}")
+        self.store_path = store_path
+        self.con = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True)
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self) -> "CatalogHistory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def versions(self) -> List[Tuple[int, str, Optional[str]]]:
+        """(version_id, label, usb.ids date) in ingest order."""
+        return self.con.execute("SELECT version_id, label, usbids_date FROM versions ORDER BY version_id;").fetchall()
+
+    def version_id(self, version: VersionRef) -> int:
+        """Resolves a label or id; the latest version for "latest"."""
+        if version == "latest":
+            row = self.con.execute("SELECT max(version_id) FROM versions;").fetchone()
+        elif isinstance(version, int):
+            row = self.con.execute("SELECT version_id FROM versions WHERE version_id=?;", (version,)).fetchone()
+        else:
+            row = self.con.execute("SELECT version_id FROM versions WHERE label=?;", (version,)).fetchone()
+        if not row or row[0] is None:
+            raise KeyError(f"unknown version: {version!r}")
+        return row[0]
+
+    def lookup(self, table: str, key: Sequence[Union[int, str]], version: VersionRef = "latest") -> Optional[str]:
+        """The value of one row as of a version, e.g. lookup("products", (vid, pid), "2023.01.01")."""
+        cols = TABLE_COLUMNS[table]
+        where = " AND ".join(f"{c} = ?{i + 2}" for i, c in enumerate(cols[:-1]))
+        row = self.con.execute(
+            f"SELECT {cols[-1]} FROM {table}_history WHERE {where} AND {_valid_at()};",
+            (self.version_id(version), *key),
+        ).fetchone()
+        return row[0] if row else None
+
+    def history(self, table: str, key: Sequence[Union[int, str]]) -> List[Tuple[str, Optional[str], str]]:
+        """
+        Every value a row has had, oldest first, as (from_label, to_label,
+        value); to_label is the first version without it, None if current.
+        """
+        cols = TABLE_COLUMNS[table]
+        where = " AND ".join(f"h.{c} = ?" for c in cols[:-1])
+        return self.con.execute(
+            f"SELECT f.label, t.label, h.{cols[-1]} FROM {table}_history AS h "
+            f"JOIN versions AS f ON f.version_id = h.valid_from "
+            f"LEFT JOIN versions AS t ON t.version_id = h.valid_to "
+            f"WHERE {where} ORDER BY h.valid_from;",
+            tuple(key),
+        ).fetchall()
+
+    def as_of(self, version: VersionRef = "latest") -> sqlite3.Connection:
+        """
+        A new read-only connection whose TEMP views (vendors, products, ...)
+        show the catalog as of `version`. Close it when done.
+        """
+        version_id = self.version_id(version)
+        con = sqlite3.connect(f"file:{self.store_path}?mode=ro", uri=True)
+        for table, cols in TABLE_COLUMNS.items():
+            valid = _valid_at().replace("?1", str(int(version_id)))
+            con.execute(f"CREATE TEMP VIEW {table} AS SELECT {', '.join(cols)} FROM main.{table}_history WHERE {valid};")
+        return con
+
+    def materialize(self, version: VersionRef, out_db: Path, schema: str = "compat") -> Dict[str, int]:
+        """Writes version `version` as a regular usbids.sqlite. Returns rows per table."""
+        tables_sql, indexes_sql = schema_sql(schema)
+        out_db.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out_db.with_name(f".{out_db.name}.{uuid.uuid4().hex}.tmp")
+        src = self.as_of(version)
+        counts: Dict[str, int] = {}
+        try:
+            try:
+                src.execute("ATTACH DATABASE ? AS out;", (str(tmp),))
+                src.executescript(tables_sql.replace("CREATE TABLE IF NOT EXISTS ", "CREATE TABLE IF NOT EXISTS out."))
+                with src:
+                    for table, cols in TABLE_COLUMNS.items():
+                        names = ", ".join(cols)
+                        cur = src.execute(
+                            f"INSERT INTO out.{table}({names}) "
+                            f"SELECT {names} FROM temp.{table} ORDER BY {', '.join(cols[:-1])};"
+                        )
+                        counts[table] = cur.rowcount
+                src.execute("DETACH DATABASE out;")
+            finally:
+                src.close()
+
+            con = sqlite3.connect(str(tmp))
+            try:
+                con.executescript(indexes_sql)
+                if schema == "compact":
+                    pack_names(con)
+                con.execute("VACUUM;")
+            finally:
+                con.close()
+            os.replace(tmp, out_db)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        return counts
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Keep many usb.ids snapshots in one version-ranged SQLite store")
+    ap.add_argument("store", help="History store (created on first ingest)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="Add usb.ids files or built usbids.sqlite DBs, oldest first")
+    p_ingest.add_argument("sources", nargs="+", help="usb.ids files or usbids.sqlite DBs")
+    p_ingest.add_argument("--label", default=None, help="Version label (one source only; default: usb.ids Version)")
+
+    sub.add_parser("versions", help="List ingested versions")
+
+    p_history = sub.add_parser("history", help="Show every name of one row across versions")
+    p_history.add_argument("table", choices=[t for t in TABLE_COLUMNS], help="Catalog table")
+    p_history.add_argument("key", nargs="+", help="Key columns, hex (e.g. products 046d c52b)")
+
+    p_export = sub.add_parser("materialize", help="Write one version as a regular usbids.sqlite")
+    p_export.add_argument("version", help="Version label, id, or 'latest'")
+    p_export.add_argument("out", help="usbids.sqlite to write")
+    p_export.add_argument("--schema", choices=SCHEMA_PROFILES, default="compat", help="Schema profile (default: compat)")
+    args = ap.parse_args()
+
+    store = Path(args.store)
+    t0 = time.perf_counter()
+    if args.cmd == "ingest":
+        if args.label and len(args.sources) > 1:
+            ap.error("--label applies to a single source")
+        for source in map(Path, args.sources):
+            try:
+                if source.suffix in (".sqlite", ".db"):
+                    version, counts = ingest_catalog(store, source, args.label)
+                else:
+                    version, counts = ingest_usb_ids(store, source, args.label)
+            except (FileNotFoundError, ValueError) as e:
+                raise SystemExit(f"[FAIL] {e}")
+            changes = ", ".join(f"{t}=+{o}/-{c}" for t, (o, c) in counts.items()) or "no changes"
+            print(f"[OK] {source} -> version {version} ({changes})")
+        print(f"[OK] {store} ({store.stat().st_size} bytes) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        return
+
+    with CatalogHistory(store) as hist:
+        if args.cmd == "versions":
+            for version_id, label, date in hist.versions():
+                print(f"  {version_id:>4}  {label:<20} {date or ''}")
+        elif args.cmd == "history":
+            key = [k if args.table == "meta" else int(k, 16) for k in args.key]
+            rows = hist.history(args.table, key)
+            if not rows:
+                raise SystemExit(f"[FAIL] no {args.table} row {' '.join(args.key)}")
+            for valid_from, valid_to, value in rows:
+                print(f"  {valid_from} .. {valid_to or 'current'}: {value}")
+        else:
+            version: VersionRef = int(args.version) if args.version.isdigit() else args.version
+            try:
+                counts = hist.materialize(version, Path(args.out), args.schema)
+            except KeyError as e:
+                raise SystemExit(f"[FAIL] {e.args[0]}")
+            print(f"[OK] Wrote {args.out} ({sum(counts.values())} rows) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Compact read-only lookup index for the usb.ids catalog.
+
+Layout (all integers little-endian uint32, sections 4-byte aligned):
+
+  header     magic "USBIDX01", section_count, string_count,
+             string_offsets_pos, pool_pos, pool_size
+  directory  section_count x (name[16], count, keys_pos, ids_pos)
+  per section
+    keys     sorted packed keys, e.g. vid << 16 | pid for products
+    ids      string id for each key
+  strings    string_count + 1 offsets into the pool
+  pool       deduplicated UTF-8 names, back to back
+
+A lookup is one binary search over a key array followed by two offset reads,
+all straight from the mmap; nothing is parsed or copied at open time.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import mmap
+import random
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from update_usbids_artifacts import HashingWriter, WrittenFile
+
+MAGIC = b"USBIDX01"
+_HEADER = struct.Struct("<8s5I")
+_DIR_ENTRY = struct.Struct("<16s3I")
+
+# Section name -> SQL producing (packed_key, name), one row per key.
+SECTIONS: Dict[str, str] = {
+    "vendors": "SELECT vid, name FROM vendors",
+    "products": "SELECT (vid << 16) | pid, name FROM products",
+    "classes": "SELECT class_id, name FROM usb_classes",
+    "subclasses": "SELECT (class_id << 8) | subclass_id, name FROM usb_subclasses",
+    "protocols": "SELECT (class_id << 16) | (subclass_id << 8) | protocol_id, name FROM usb_protocols",
+    "hid_usages": "SELECT (page_id << 16) | usage_id, name FROM hid_usages",
+}
+
+
+def _u32_bytes(values: Sequence[int]) -> bytes:
+    arr = array("I", values)
+    if arr.itemsize != 4:
+        arr = array("L", values)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _pad4(buf: bytearray) -> None:
+    buf.extend(b"\0" * (-len(buf) % 4))
+
+
+def write_lookup_index(db_path: Path, out_path: Path) -> Tuple[Dict[str, int], WrittenFile]:
+    """
+    Builds the index from a usbids.sqlite. Output is deterministic for a
+    given catalog. Returns the entry count per section and the written file.
+    """
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        sections: List[Tuple[str, List[Tuple[int, str]]]] = [
+            (name, sorted(con.execute(sql).fetchall())) for name, sql in SECTIONS.items()
+        ]
+    finally:
+        con.close()
+
+    string_ids: Dict[str, int] = {}
+    for _, rows in sections:
+        for _, text in rows:
+            string_ids.setdefault(text, len(string_ids))
+
+    pool = bytearray()
+    string_offsets = [0]
+    for text in string_ids:
+        pool += text.encode("utf-8")
+        string_offsets.append(len(pool))
+
+    body = bytearray(_HEADER.size + _DIR_ENTRY.size * len(sections))
+    directory = []
+    for name, rows in sections:
+        keys_pos = len(body)
+        body += _u32_bytes([key for key, _ in rows])
+        ids_pos = len(body)
+        body += _u32_bytes([string_ids[text] for _, text in rows])
+        directory.append((name, len(rows), keys_pos, ids_pos))
+
+    string_offsets_pos = len(body)
+    body += _u32_bytes(string_offsets)
+    pool_pos = len(body)
+    body += pool
+    _pad4(body)
+
+    _HEADER.pack_into(body, 0, MAGIC, len(sections), len(string_ids), string_offsets_pos, pool_pos, len(pool))
+    for i, (name, count, keys_pos, ids_pos) in enumerate(directory):
+        _DIR_ENTRY.pack_into(body, _HEADER.size + i * _DIR_ENTRY.size, name.encode("ascii"), count, keys_pos, ids_pos)
+
+    with HashingWriter(out_path) as out:
+        out.write(bytes(body))
+    return {name: count for name, count, _, _ in directory}, out.close()
+
+
+class _U32Array:
+    """uint32 view for big-endian hosts, where memoryview.cast would misread."""
+
+    def __init__(self, buf: memoryview) -> None:
+        self._buf = buf
+        self._len = len(buf) // 4
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i: int) -> int:
+        return struct.unpack_from("<I", self._buf, i * 4)[0]
+
+
+def _u32_view(buf: memoryview):
+    return buf.cast("I") if sys.byteorder == "little" else _U32Array(buf)
+
+
+class LookupIndex:
+    """
+    mmap-backed reader for files written by write_lookup_index().
+
+    Opening maps the file and reads the directory only; lookups bisect the
+    key arrays in place. Use as a context manager or call close().
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._file = path.open("rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file cannot be mapped at all.
+            self._file.close()
+            raise ValueError(f"Not a usbids lookup index: {path}") from None
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mmap)
+        if len(self._view) < _HEADER.size:
+            self.close()
+            raise ValueError(f"Not a usbids lookup index: {path}")
+
+        magic, section_count, string_count, offsets_pos, pool_pos, pool_size = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a usbids lookup index: {path}")
+
+        self._sections: Dict[str, Tuple[object, object]] = {}
+        for i in range(section_count):
+            raw_name, count, keys_pos, ids_pos = _DIR_ENTRY.unpack_from(self._view, _HEADER.size + i * _DIR_ENTRY.size)
+            name = raw_name.rstrip(b"\0").decode("ascii")
+            keys = _u32_view(self._view[keys_pos : keys_pos + 4 * count])
+            ids = _u32_view(self._view[ids_pos : ids_pos + 4 * count])
+            self._sections[name] = (keys, ids)
+        self._string_offsets = _u32_view(self._view[offsets_pos : offsets_pos + 4 * (string_count + 1)])
+        self._pool = self._view[pool_pos : pool_pos + pool_size]
+
+    def close(self) -> None:
+        # Views into the map must be released before it can be closed.
+        self._sections = {}
+        for attr in ("_string_offsets", "_pool", "_view"):
+            view = getattr(self, attr, None)
+            if isinstance(view, memoryview):
+                view.release()
+            setattr(self, attr, None)
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "LookupIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def raw(self, section: str, key: int) -> Optional[memoryview]:
+        """UTF-8 bytes of the name for `key`, as a view into the map (no copy)."""
+        keys, ids = self._sections[section]
+        i = bisect.bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return None
+        sid = ids[i]
+        return self._pool[self._string_offsets[sid] : self._string_offsets[sid + 1]]
+
+    def lookup(self, section: str, key: int) -> Optional[str]:
+        raw = self.raw(section, key)
+        return None if raw is None else str(raw, "utf-8")
+
+    def vendor_name(self, vid: int) -> Optional[str]:
+        return self.lookup("vendors", vid)
+
+    def product_name(self, vid: int, pid: int) -> Optional[str]:
+        return self.lookup("products", (vid << 16) | pid)
+
+    def class_name(self, class_id: int) -> Optional[str]:
+        return self.lookup("classes", class_id)
+
+    def subclass_name(self, class_id: int, subclass_id: int) -> Optional[str]:
+        return self.lookup("subclasses", (class_id << 8) | subclass_id)
+
+    def protocol_name(self, class_id: int, subclass_id: int, protocol_id: int) -> Optional[str]:
+        return self.lookup("protocols", (class_id << 16) | (subclass_id << 8) | protocol_id)
+
+    def hid_usage_name(self, page_id: int, usage_id: int) -> Optional[str]:
+        return self.lookup("hid_usages", (page_id << 16) | usage_id)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build or benchmark the usbids binary lookup index")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Write an index from a usbids.sqlite")
+    p_build.add_argument("db", help="Input usbids.sqlite")
+    p_build.add_argument("out", help="Output index path")
+
+    p_bench = sub.add_parser("bench", help="Time product lookups against the index and the SQLite DB")
+    p_bench.add_argument("db", help="usbids.sqlite the index was built from")
+    p_bench.add_argument("index", help="Index path")
+    p_bench.add_argument("--lookups", type=int, default=200_000, help="Number of lookups (default: 200000)")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        counts, written = write_lookup_index(Path(args.db), Path(args.out))
+        print(f"[OK] Wrote {args.out} ({written.size} bytes): " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+        return
+
+    con = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    pairs = con.execute("SELECT vid, pid FROM products").fetchall()
+    rng = random.Random(0)
+    # Mix hits with misses (pid + 1 is usually not listed).
+    sample = [(v, p if rng.random() < 0.8 else (p + 1) & 0xFFFF) for v, p in rng.choices(pairs, k=args.lookups)]
+
+    t0 = time.perf_counter()
+    with LookupIndex(Path(args.index)) as index:
+        opened = time.perf_counter()
+        from_index = [index.product_name(v, p) for v, p in sample]
+    t1 = time.perf_counter()
+    sql = "SELECT name FROM products WHERE vid=? AND pid=?"
+    from_db = []
+    for v, p in sample:
+        row = con.execute(sql, (v, p)).fetchone()
+        from_db.append(row[0] if row else None)
+    t2 = time.perf_counter()
+    con.close()
+
+    if from_index != from_db:
+        raise SystemExit("[FAIL] index and DB disagree")
+    print(f"[OK] {args.lookups} lookups, results identical")
+    print(f"  - index  open={(opened - t0) * 1e6:8.1f} us  {args.lookups / (t1 - opened):12,.0f} lookups/s")
+    print(f"  - sqlite                 {args.lookups / (t2 - t1):12,.0f} lookups/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from update_usbids_artifacts import SEARCH_TABLE, SEARCH_VENDOR_BIT
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_DB = ROOT / "assets" / "db" / "usbids.sqlite"
+
+_MISSING = object()
+
+# Fixed SQL text, so sqlite3's statement cache keeps each one prepared.
+_SQL_VENDOR = "SELECT name FROM vendors WHERE vid = ? LIMIT 1"
+_SQL_PRODUCT = "SELECT name FROM products WHERE vid = ? AND pid = ? LIMIT 1"
+_SQL_CLASS = "SELECT name FROM usb_classes WHERE class_id = ? LIMIT 1"
+_SQL_SUBCLASS = "SELECT name FROM usb_subclasses WHERE class_id = ? AND subclass_id = ? LIMIT 1"
+_SQL_PROTOCOL = (
+    "SELECT name FROM usb_protocols WHERE class_id = ? AND subclass_id = ? AND protocol_id = ? LIMIT 1"
+)
+_SQL_HID_USAGE = "SELECT name FROM hid_usages WHERE page_id = ? AND usage_id = ? LIMIT 1"
+
+# kind -> (table, key columns), for the layered (overlay) and batched statements.
+_LOOKUP_TABLES = {
+    "vendor": ("vendors", ("vid",)),
+    "product": ("products", ("vid", "pid")),
+    "class": ("usb_classes", ("class_id",)),
+    "subclass": ("usb_subclasses", ("class_id", "subclass_id")),
+    "protocol": ("usb_protocols", ("class_id", "subclass_id", "protocol_id")),
+    "hid_usage": ("hid_usages", ("page_id", "usage_id")),
+}
+
+_SQL_RESOLVE = """
+SELECT q.vid, q.pid, v.name, p.name
+FROM temp.resolve_keys AS q
+LEFT JOIN vendors AS v ON v.vid = q.vid
+LEFT JOIN products AS p ON p.vid = q.vid AND p.pid = q.pid
+"""
+
+# FTS5 rank is bm25 (lower is better); rowid breaks ties deterministically.
+_SQL_SEARCH = f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ?{{}} ORDER BY rank, rowid LIMIT ?"
+
+# Trigram tokens need three characters. Shorter terms match the start of a
+# word in the name instead: ANDed onto the MATCH of the longer terms, or,
+# when every term is short, as a scan, vendors first, that stops after
+# `limit` rows.
+_SQL_SEARCH_SHORT = """
+SELECT ? | vid FROM vendors WHERE {0}
+UNION ALL
+SELECT (vid << 16) | pid FROM products WHERE {0}
+LIMIT ?
+"""
+
+_SQL_WORD_PREFIX = "(name LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\')"
+
+
+def _word_prefix_params(terms: Sequence[str]) -> List[str]:
+    params = []
+    for term in terms:
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params += [escaped + "%", "% " + escaped + "%"]
+    return params
+
+
+def _layered_lookup_sql(table: str, keys: Tuple[str, ...], schemas: Sequence[str]) -> str:
+    """One name lookup over several attached layers; the first layer with the key wins."""
+    where = " AND ".join(f"{col} = ?{i}" for i, col in enumerate(keys, 1))
+    layers = ", ".join(f"(SELECT name FROM {schema}.{table} WHERE {where})" for schema in schemas)
+    return f"SELECT COALESCE({layers})"
+
+
+def _layered_resolve_sql(schemas: Sequence[str]) -> str:
+    joins = []
+    for i, schema in enumerate(schemas):
+        joins.append(f"LEFT JOIN {schema}.vendors AS v{i} ON v{i}.vid = q.vid")
+        joins.append(f"LEFT JOIN {schema}.products AS p{i} ON p{i}.vid = q.vid AND p{i}.pid = q.pid")
+    vendors = ", ".join(f"v{i}.name" for i in range(len(schemas)))
+    products = ", ".join(f"p{i}.name" for i in range(len(schemas)))
+    return "\n".join(
+        [f"SELECT q.vid, q.pid, COALESCE({vendors}), COALESCE({products})", "FROM temp.resolve_keys AS q", *joins]
+    )
+
+
+def _lookup_many_sql(table: str, keys: Tuple[str, ...], schemas: Sequence[str]) -> str:
+    """Names for a JSON array of key arrays, one row per element (j.key is its index)."""
+    joins = []
+    for i, schema in enumerate(schemas):
+        on = " AND ".join(f"l{i}.{col} = json_extract(j.value, '$[{n}]')" for n, col in enumerate(keys))
+        joins.append(f"LEFT JOIN {schema}.{table} AS l{i} ON {on}")
+    names = [f"l{i}.name" for i in range(len(schemas))]
+    name = names[0] if len(names) == 1 else f"COALESCE({', '.join(names)})"
+    return "\n".join([f"SELECT j.key, {name}", "FROM json_each(?) AS j", *joins])
+
+
+class SearchHit(NamedTuple):
+    kind: str  # "vendor" or "product"
+    vid: int
+    pid: Optional[int]
+    name: str
+
+
+class _LruCache:
+    """Bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Optional[str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> object:
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Optional[str]) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def keys(self) -> List[Hashable]:
+        """Cached keys, least recently used first."""
+        return list(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class UsbIdsLookup:
+    """
+    Read-only name lookups over a usbids.sqlite built by the tools.
+
+    Mirrors UsbIdsDb in the app (vendor, product, class, subclass, protocol)
+    and adds HID usages. The DB is opened with `mode=ro&immutable=1`, so
+    SQLite skips locking and change detection; do not point it at a file
+    that is being rewritten. Results, misses included, are kept in one
+    bounded LRU cache shared by all lookup kinds.
+
+    `overlays` are compiled override DBs (see tools/usbids_overlay.py)
+    ATTACHed above the base, highest priority first: a name comes from the
+    first layer that has the key. Search still runs on the base index, but
+    hits report layered names.
+
+    With `check_same_thread=False` the instance may be built on one thread
+    and then used on another, one thread at a time.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DEFAULT_DB,
+        cache_size: int = 65536,
+        overlays: Sequence[Path] = (),
+        check_same_thread: bool = True,
+    ) -> None:
+        if not db_path.exists():
+            raise FileNotFoundError(f"DB not found: {db_path}")
+        self._con = sqlite3.connect(
+            f"{db_path.resolve().as_uri()}?mode=ro&immutable=1",
+            uri=True,
+            cached_statements=32,
+            check_same_thread=check_same_thread,
+        )
+        self._con.execute("PRAGMA temp_store=MEMORY;")
+        self.cache = _LruCache(cache_size)
+        self._search_sql: Optional[str] = None
+
+        self._sql = {
+            "vendor": _SQL_VENDOR,
+            "product": _SQL_PRODUCT,
+            "class": _SQL_CLASS,
+            "subclass": _SQL_SUBCLASS,
+            "protocol": _SQL_PROTOCOL,
+            "hid_usage": _SQL_HID_USAGE,
+        }
+        self._resolve_sql = _SQL_RESOLVE
+        schemas = ["main"]
+        if overlays:
+            schemas = []
+            for i, overlay in enumerate(overlays):
+                if not overlay.exists():
+                    raise FileNotFoundError(f"Overlay not found: {overlay}")
+                schema = f"overlay{i}"
+                self._con.execute(
+                    f"ATTACH DATABASE ? AS {schema}", (f"{overlay.resolve().as_uri()}?mode=ro&immutable=1",)
+                )
+                schemas.append(schema)
+            schemas.append("main")
+            self._sql = {kind: _layered_lookup_sql(t, keys, schemas) for kind, (t, keys) in _LOOKUP_TABLES.items()}
+            self._resolve_sql = _layered_resolve_sql(schemas)
+        self._many_sql = {kind: _lookup_many_sql(t, keys, schemas) for kind, (t, keys) in _LOOKUP_TABLES.items()}
+
+    def close(self) -> None:
+        self._con.close()
+
+    def __enter__(self) -> "UsbIdsLookup":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _lookup(self, kind: str, sql: str, params: Tuple[int, ...]) -> Optional[str]:
+        key = (kind, *params)
+        name = self.cache.get(key)
+        if name is _MISSING:
+            row = self._con.execute(sql, params).fetchone()
+            name = row[0] if row else None
+            self.cache.put(key, name)
+        return name  # type: ignore[return-value]
+
+    def read_meta(self) -> Dict[str, str]:
+        return dict(self._con.execute("SELECT key, value FROM meta"))
+
+    def vendor_name(self, vid: int) -> Optional[str]:
+        return self._lookup("vendor", self._sql["vendor"], (vid,))
+
+    def product_name(self, vid: int, pid: int) -> Optional[str]:
+        return self._lookup("product", self._sql["product"], (vid, pid))
+
+    def usb_class_name(self, class_id: int) -> Optional[str]:
+        return self._lookup("class", self._sql["class"], (class_id,))
+
+    def usb_subclass_name(self, class_id: int, subclass_id: int) -> Optional[str]:
+        return self._lookup("subclass", self._sql["subclass"], (class_id, subclass_id))
+
+    def usb_protocol_name(self, class_id: int, subclass_id: int, protocol_id: int) -> Optional[str]:
+        return self._lookup("protocol", self._sql["protocol"], (class_id, subclass_id, protocol_id))
+
+    def hid_usage_name(self, page_id: int, usage_id: int) -> Optional[str]:
+        return self._lookup("hid_usage", self._sql["hid_usage"], (page_id, usage_id))
+
+    def resolve_many(self, pairs: Iterable[Tuple[int, int]]) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Resolves (vid, pid) pairs to (vendor_name, product_name), in input order.
+
+        Pairs not already cached are loaded into a temp table and answered
+        by a single JOIN, instead of two queries per pair.
+        """
+        pairs = list(pairs)
+        cache = self.cache
+        resolved: Dict[Tuple[int, int], Tuple[Optional[str], Optional[str]]] = {}
+        wanted = []
+        for vid, pid in dict.fromkeys(pairs):
+            vendor = cache.get(("vendor", vid))
+            product = cache.get(("product", vid, pid))
+            if vendor is _MISSING or product is _MISSING:
+                wanted.append((vid, pid))
+            else:
+                resolved[(vid, pid)] = (vendor, product)  # type: ignore[assignment]
+
+        if wanted:
+            con = self._con
+            con.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS resolve_keys "
+                "(vid INTEGER NOT NULL, pid INTEGER NOT NULL, PRIMARY KEY (vid, pid)) WITHOUT ROWID"
+            )
+            with con:
+                con.execute("DELETE FROM temp.resolve_keys")
+                con.executemany("INSERT INTO temp.resolve_keys(vid, pid) VALUES(?, ?)", wanted)
+            for vid, pid, vendor, product in con.execute(self._resolve_sql):
+                cache.put(("vendor", vid), vendor)
+                cache.put(("product", vid, pid), product)
+                resolved[(vid, pid)] = (vendor, product)
+
+        return [resolved[pair] for pair in pairs]
+
+    def lookup_many(self, kind: str, keys: Iterable[Sequence[int]]) -> List[Optional[str]]:
+        """
+        Batched form of the single-key lookups, in input order. `kind` is one
+        of "vendor", "product", "class", "subclass", "protocol", "hid_usage";
+        each key has that lookup's arguments. Keys not already cached are
+        answered by one JOIN against a JSON array of the keys.
+        """
+        if kind not in _LOOKUP_TABLES:
+            raise ValueError(f"Unknown lookup kind: {kind!r}")
+        arity = len(_LOOKUP_TABLES[kind][1])
+        keys = [tuple(key) for key in keys]
+        cache = self.cache
+        resolved: Dict[Tuple[int, ...], Optional[str]] = {}
+        wanted = []
+        for key in dict.fromkeys(keys):
+            if len(key) != arity or not all(isinstance(part, int) for part in key):
+                raise ValueError(f"{kind} lookups take {arity} integer(s), got {list(key)!r}")
+            name = cache.get((kind, *key))
+            if name is _MISSING:
+                wanted.append(key)
+            else:
+                resolved[key] = name  # type: ignore[assignment]
+
+        if wanted:
+            for index, name in self._con.execute(self._many_sql[kind], (json.dumps(wanted),)):
+                key = wanted[index]
+                cache.put((kind, *key), name)
+                resolved[key] = name
+
+        return [resolved[key] for key in keys]
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        """
+        Ranked vendor/product name search; needs a DB built with --search-index.
+
+        With the trigram tokenizer every whitespace-separated term of three
+        or more characters matches as a case-insensitive substring, and a
+        shorter one as the start of a word; with the word tokenizer each term
+        is a word prefix. All terms must match.
+        """
+        terms = query.split()
+        if not terms or limit <= 0:
+            return []
+        if self._search_sql is None:
+            row = self._con.execute(
+                "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (SEARCH_TABLE,)
+            ).fetchone()
+            if row is None:
+                raise LookupError(f"DB has no {SEARCH_TABLE} index; rebuild it with --search-index")
+            self._search_sql = row[0]
+
+        short: List[str] = []
+        if "trigram" in self._search_sql:
+            short = [t for t in terms if len(t) < 3]
+            terms = [t for t in terms if len(t) >= 3]
+            if not terms:
+                where = " AND ".join([_SQL_WORD_PREFIX] * len(short))
+                params = _word_prefix_params(short)
+                rows = self._con.execute(_SQL_SEARCH_SHORT.format(where), (SEARCH_VENDOR_BIT, *params, *params, limit))
+                return [self._search_hit(r[0]) for r in rows]
+            match = " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        else:
+            match = " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+        sql = _SQL_SEARCH.format("".join(" AND " + _SQL_WORD_PREFIX for _ in short))
+        rows = self._con.execute(sql, (match, *_word_prefix_params(short), limit))
+        return [self._search_hit(r[0]) for r in rows]
+
+    def _search_hit(self, rowid: int) -> SearchHit:
+        if rowid & SEARCH_VENDOR_BIT:
+            vid = rowid & 0xFFFF
+            return SearchHit("vendor", vid, None, self.vendor_name(vid) or "")
+        vid, pid = rowid >> 16, rowid & 0xFFFF
+        return SearchHit("product", vid, pid, self.product_name(vid, pid) or "")
+
+
+def _parse_pair(text: str) -> Tuple[int, int]:
+    vid, _, pid = text.partition(":")
+    return int(vid, 16), int(pid, 16)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Resolve vid:pid pairs (hex) against usbids.sqlite")
+    ap.add_argument("pairs", nargs="*", help="vid:pid pairs, e.g. 1d6b:0002 (default: read from stdin)")
+    ap.add_argument("--db", default=str(DEFAULT_DB), help="Path to usbids.sqlite")
+    ap.add_argument("--search", default=None, help="Search vendor/product names instead (needs --search-index)")
+    ap.add_argument("--limit", type=int, default=20, help="Maximum --search results (default: 20)")
+    ap.add_argument(
+        "--overlay",
+        action="append",
+        default=[],
+        help="Compiled overrides DB layered above --db (repeatable; earlier wins)",
+    )
+    args = ap.parse_args()
+    overlays = [Path(p) for p in args.overlay]
+
+    if args.search is not None:
+        with UsbIdsLookup(Path(args.db), overlays=overlays) as lookup:
+            for hit in lookup.search(args.search, args.limit):
+                key = f"{hit.vid:04x}" if hit.pid is None else f"{hit.vid:04x}:{hit.pid:04x}"
+                print(f"{key:<9}\t{hit.kind}\t{hit.name}")
+        return
+
+    texts = args.pairs or [line.strip() for line in sys.stdin if line.strip()]
+    pairs = [_parse_pair(t) for t in texts]
+    with UsbIdsLookup(Path(args.db), overlays=overlays) as lookup:
+        for (vid, pid), (vendor, product) in zip(pairs, lookup.resolve_many(pairs)):
+            print(f"{vid:04x}:{pid:04x}\t{vendor or '-'}\t{product or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None  # type: ignore[assignment]
+
+METRICS_FORMAT = "usbids-metrics/1"
+
+
+def peak_rss_kib() -> Optional[int]:
+    """High-water mark of this process's resident set, in KiB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class StageRecorder:
+    """
+    Times named pipeline stages and records one metrics dict per stage.
+
+    Each record has the stage name, wall time, the process's peak RSS when
+    the stage ended and how much the stage raised it, plus whatever the
+    stage adds to the dict it is given (rows per table, bytes_read,
+    bytes_written, ...). Records are appended to `path` as JSON lines when
+    a path is set, and always kept in `records`.
+
+    After a stage's block ends, its dict also holds the recorded `seconds`.
+    Stages may run concurrently on different threads; `profile_stage` names
+    one stage to run under cProfile (on the thread running it), and its
+    stats are saved to `profile_out` for `python -m pstats`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        profile_stage: Optional[str] = None,
+        profile_out: Optional[Path] = None,
+    ) -> None:
+        self.path = path
+        self.profile_stage = profile_stage
+        self.profile_out = profile_out or Path(f"usbids-{profile_stage}.pstats")
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        info: Dict[str, Any] = {}
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        rss_before = peak_rss_kib()
+        t0 = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield info
+        except BaseException as e:
+            info["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.profile_out.parent.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(self.profile_out))
+                info["profile"] = str(self.profile_out)
+            record = self._emit(name, time.perf_counter() - t0, rss_before, info)
+            info["seconds"] = record["seconds"]
+
+    def finish(self, **info: Any) -> Dict[str, Any]:
+        """Records the run total as a final "total" stage."""
+        return self._emit("total", time.perf_counter() - self._started, None, info)
+
+    def _emit(self, name: str, seconds: float, rss_before: Optional[int], info: Dict[str, Any]) -> Dict[str, Any]:
+        rss = peak_rss_kib()
+        record: Dict[str, Any] = {
+            "format": METRICS_FORMAT,
+            "run": self.run_id,
+            "pid": os.getpid(),
+            "stage": name,
+            "seconds": round(seconds, 6),
+            "peak_rss_kib": rss,
+        }
+        if rss is not None and rss_before is not None:
+            record["rss_growth_kib"] = rss - rss_before
+        record.update(info)
+        with self._lock:
+            self.records.append(record)
+            if self.path is not None:
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, sort_keys=True) + "\n")
+        return record
+
+
+def read_metrics(path: Path) -> List[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Summarize a --metrics JSON-lines file")
+    ap.add_argument("metrics", help="File written with update_usbids_artifacts.py --metrics")
+    ap.add_argument("--run", default=None, help="Run id to show (default: the last run)")
+    args = ap.parse_args()
+
+    records = read_metrics(Path(args.metrics))
+    if not records:
+        raise SystemExit(f"No records in {args.metrics}")
+    run = args.run or records[-1]["run"]
+    records = [r for r in records if r["run"] == run]
+    total = next((r["seconds"] for r in records if r["stage"] == "total"), sum(r["seconds"] for r in records))
+    print(f"[OK] run {run}: {total:.3f}s")
+    for r in records:
+        if r["stage"] == "total":
+            continue
+        extra = "  ".join(f"{k}={r[k]}" for k in ("bytes_read", "bytes_written") if k in r)
+        if "rows" in r:
+            extra += f"  rows={sum(r['rows'].values())}"
+        print(
+            f"  - {r['stage']:<13} {r['seconds']:8.3f}s {r['seconds'] / total * 100 if total else 0:5.1f}%"
+            f"  peak_rss={r['peak_rss_kib']} KiB  {extra}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from update_usbids_artifacts import (
+    SEARCH_TABLE,
+    TABLE_COLUMNS,
+    _sha256_file,
+    _table_counts,
+    build_sqlite_from_usb_ids,
+    require_writable_catalog,
+)
+
+# Overlays carry catalog rows only; the base DB keeps its own meta.
+OVERLAY_TABLES = tuple(t for t in TABLE_COLUMNS if t != "meta")
+
+
+def compile_overlay(overlay_ids: Path, out_db: Path) -> Dict[str, int]:
+    """
+    Builds a local overrides file (usb.ids format) into its own small SQLite
+    DB with the catalog schema. Returns rows per table.
+
+    Products and interfaces need their vendor / product line above them, as
+    in usb.ids; every row of the overlay takes priority over the base.
+    """
+    build_sqlite_from_usb_ids(overlay_ids, out_db, vacuum=True)
+    con = sqlite3.connect(f"file:{out_db}?mode=ro", uri=True)
+    try:
+        return {t: n for t, n in _table_counts(con).items() if t in OVERLAY_TABLES and n}
+    finally:
+        con.close()
+
+
+def _upsert_from_sql(table: str, schema: str) -> str:
+    cols = TABLE_COLUMNS[table]
+    names = ", ".join(cols)
+    # "WHERE true" keeps SQLite from reading ON CONFLICT as a join constraint.
+    return (
+        f"INSERT INTO main.{table}({names}) SELECT {names} FROM {schema}.{table} WHERE true "
+        f"ON CONFLICT({', '.join(cols[:-1])}) DO UPDATE SET {cols[-1]}=excluded.{cols[-1]} "
+        f"WHERE {cols[-1]} IS NOT excluded.{cols[-1]};"
+    )
+
+
+def merge_overlay(base_db: Path, overlay_db: Path, out_db: Optional[Path] = None) -> Dict[str, int]:
+    """
+    Merges a compiled overlay into a usbids.sqlite with one set-based upsert
+    per table (INSERT ... SELECT from the ATTACHed overlay), in one
+    transaction. Returns rows inserted or renamed per table.
+
+    With `out_db` the base is copied first and left untouched, so re-merging
+    an edited overlay always starts from upstream and removed overrides go
+    away; without it the base is patched in place (additive only). New rows
+    keep overlay order after the base rows, exactly as if the overrides had
+    been appended to usb.ids before the build. The merged DB records the
+    overlay's digest as meta "overlay_sha256". A "compact" base is refused
+    with ValueError before anything is copied.
+    """
+    for path in (base_db, overlay_db):
+        if not path.exists():
+            raise FileNotFoundError(f"DB not found: {path}")
+    con = sqlite3.connect(f"file:{base_db}?mode=ro", uri=True)
+    try:
+        require_writable_catalog(con, "merge an overlay")
+    finally:
+        con.close()
+    target = base_db
+    if out_db is not None and out_db.resolve() != base_db.resolve():
+        out_db.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out_db.with_name(f".{out_db.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(base_db, tmp)
+        target = tmp
+
+    counts: Dict[str, int] = {}
+    try:
+        con = sqlite3.connect(target.resolve().as_uri(), uri=True)
+        try:
+            con.execute("PRAGMA foreign_keys=ON;")
+            con.execute("ATTACH DATABASE ? AS overlay;", (f"{overlay_db.resolve().as_uri()}?mode=ro",))
+            with con:
+                # Parents first (TABLE_COLUMNS order), so foreign keys hold row by row.
+                for table in OVERLAY_TABLES:
+                    before = con.total_changes
+                    con.execute(_upsert_from_sql(table, "overlay"))
+                    if con.total_changes != before:
+                        counts[table] = con.total_changes - before
+                con.execute(
+                    "INSERT INTO meta(key, value) VALUES('overlay_sha256', ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value=excluded.value;",
+                    (_sha256_file(overlay_db),),
+                )
+                # Same as apply_delta(): external content does not follow its tables.
+                if counts and con.execute("SELECT 1 FROM sqlite_master WHERE name=?", (SEARCH_TABLE,)).fetchone():
+                    con.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('rebuild');")
+            con.execute("DETACH DATABASE overlay;")
+        finally:
+            con.close()
+        if target != base_db:
+            os.replace(target, out_db)
+    finally:
+        if target != base_db and target.exists():
+            target.unlink()
+    return counts
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compile and merge local usb.ids overrides (overlay DBs)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_compile = sub.add_parser("compile", help="Build an overlay DB from a usb.ids-format overrides file")
+    p_compile.add_argument("overlay", help="Overrides file in usb.ids format")
+    p_compile.add_argument("out", help="Overlay DB to write")
+
+    p_merge = sub.add_parser("merge", help="Merge an overlay into a usbids.sqlite")
+    p_merge.add_argument("db", help="Base usbids.sqlite")
+    p_merge.add_argument("overlay", help="Overlay DB, or an overrides file in usb.ids format (.ids/.txt)")
+    p_merge.add_argument("--out", default=None, help="Write the merged DB here instead of patching db in place")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "compile":
+        out = Path(args.out)
+        counts = compile_overlay(Path(args.overlay), out)
+        rows = ", ".join(f"{t}={n}" for t, n in counts.items()) or "no rows"
+        print(f"[OK] Wrote {out} ({rows}) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        return
+
+    overlay = Path(args.overlay)
+    out = Path(args.out) if args.out else None
+    with tempfile.TemporaryDirectory(prefix="usbids_overlay_") as td:
+        if overlay.suffix in (".ids", ".txt"):
+            compiled = Path(td) / "overlay.sqlite"
+            compile_overlay(overlay, compiled)
+            overlay = compiled
+        try:
+            counts = merge_overlay(Path(args.db), overlay, out)
+        except ValueError as e:
+            raise SystemExit(f"[FAIL] {e}")
+    rows = ", ".join(f"{t}={n}" for t, n in counts.items()) or "no changes"
+    print(f"[OK] Merged overlay into {out or args.db} ({rows}) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from usbids_lookup import _LOOKUP_TABLES, UsbIdsLookup
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_ARTIFACT = ROOT / "assets" / "db_src" / "usbids.sqlite.gz"
+
+PROTOCOL = "usbids-resolver/1"
+
+# Longest accepted request line; batches of a few hundred thousand keys fit.
+MAX_LINE = 16 * 1024 * 1024
+
+# Most recently used cache keys re-resolved on the new DB after a swap.
+WARM_KEYS = 65536
+
+_COPY_CHUNK = 1024 * 1024
+
+
+class _HashingReader:
+    """File wrapper that hashes every byte read through it."""
+
+    def __init__(self, f) -> None:
+        self._f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.sha256.update(data)
+        return data
+
+
+def read_digest(sha256_path: Path) -> Optional[str]:
+    """The hex digest from a .sha256 sidecar, or None if it is missing or empty."""
+    try:
+        fields = sha256_path.read_text(encoding="utf-8").split()
+    except OSError:
+        return None
+    return fields[0].lower() if fields else None
+
+
+def stage_artifact(artifact: Path, dest: Path) -> str:
+    """
+    Copies the artifact to dest, gunzipping a .gz, in one pass. Returns the
+    sha256 of the artifact's own bytes, to check against its sidecar.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with artifact.open("rb") as raw, dest.open("wb") as out:
+        reader = _HashingReader(raw)
+        if artifact.suffix == ".gz":
+            with gzip.GzipFile(fileobj=reader, mode="rb") as gz:  # type: ignore[arg-type]
+                shutil.copyfileobj(gz, out, _COPY_CHUNK)
+            while reader.read(_COPY_CHUNK):
+                pass
+        else:
+            shutil.copyfileobj(reader, out, _COPY_CHUNK)  # type: ignore[arg-type]
+    return reader.sha256.hexdigest()
+
+
+class ResolverServer:
+    """
+    Shared name resolver for local services, speaking JSON lines.
+
+    Loads the artifact written by update_usbids_artifacts.py (usbids.sqlite
+    or usbids.sqlite.gz) once, into a private copy under `work_dir`, and
+    answers every client from one UsbIdsLookup: one connection, one LRU
+    cache. A request batches any number of lookups:
+
+        {"id": 1, "queries": [["product", 1133, 50475], ["class", 3]]}
+        -> {"id": 1, "results": ["Unifying Receiver", "Human Interface Device"], "sha256": "..."}
+
+    Kinds are those of UsbIdsLookup.lookup_many(); misses of one kind are
+    answered by a single JOIN. {"op": "stats"} returns counters. A bad
+    request gets {"id": ..., "error": "..."} and the connection stays open.
+
+    Every `poll_interval` seconds the .sha256 sidecar is re-read. When its
+    digest changes, the new artifact is staged, verified and opened on a
+    worker thread, and the hottest cached keys are re-resolved against it
+    there; the event loop only swaps it in between two requests. Clients
+    never see a gap, and every response names the sha256 it was answered
+    from. A staged artifact that does not match its sidecar (e.g. still
+    being written) is retried on the next poll.
+    """
+
+    def __init__(
+        self,
+        artifact: Path,
+        sha256_path: Optional[Path] = None,
+        work_dir: Optional[Path] = None,
+        cache_size: int = 65536,
+        overlays: Sequence[Path] = (),
+        poll_interval: float = 2.0,
+    ) -> None:
+        self.artifact = artifact
+        self.sha256_path = sha256_path or artifact.with_name(artifact.name + ".sha256")
+        self.cache_size = cache_size
+        self.overlays = list(overlays)
+        self.poll_interval = poll_interval
+        self._tmp = None if work_dir else tempfile.TemporaryDirectory(prefix="usbids_server_")
+        self.work_dir = work_dir or Path(self._tmp.name)  # type: ignore[union-attr]
+        self.digest = ""
+        self.db_path: Optional[Path] = None
+        self.lookup: Optional[UsbIdsLookup] = None
+        self.stats = {"requests": 0, "queries": 0, "errors": 0, "swaps": 0, "clients": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    def _stage(self, expected: Optional[str]) -> Tuple[str, Path]:
+        """Copies and verifies the current artifact; runs off the event loop."""
+        dest = self.work_dir / f"usbids-{time.time_ns()}.sqlite"
+        digest = stage_artifact(self.artifact, dest)
+        if expected is not None and digest != expected:
+            dest.unlink()
+            raise ValueError(f"{self.artifact} has sha256 {digest}, sidecar says {expected}")
+        return digest, dest
+
+    def _prepare(self, expected: Optional[str], warm: Sequence[Hashable] = ()) -> Tuple[str, Path, UsbIdsLookup]:
+        """
+        Stages the current artifact, opens it and re-resolves the `warm`
+        cache keys against it. Runs off the event loop.
+        """
+        digest, db_path = self._stage(expected)
+        try:
+            lookup = UsbIdsLookup(
+                db_path, cache_size=self.cache_size, overlays=self.overlays, check_same_thread=False
+            )
+        except BaseException:
+            db_path.unlink()
+            raise
+        try:
+            by_kind: Dict[str, List[Tuple[int, ...]]] = {}
+            for kind, *key in warm:  # type: ignore[misc]
+                by_kind.setdefault(kind, []).append(tuple(key))
+            for kind, keys in by_kind.items():
+                lookup.lookup_many(kind, keys)
+        except BaseException:
+            lookup.close()
+            db_path.unlink()
+            raise
+        lookup.cache.hits = lookup.cache.misses = 0
+        return digest, db_path, lookup
+
+    def _install(self, digest: str, db_path: Path, lookup: UsbIdsLookup) -> None:
+        """Swaps in a prepared DB. Runs on the event loop, between requests."""
+        old_lookup, old_path = self.lookup, self.db_path
+        self.lookup, self.db_path, self.digest = lookup, db_path, digest
+        if old_lookup is not None:
+            old_lookup.close()
+            self.stats["swaps"] += 1
+        if old_path is not None and old_path.exists():
+            old_path.unlink()
+
+    def load(self) -> None:
+        """Loads the artifact synchronously; the sidecar, if present, must match."""
+        self._install(*self._prepare(read_digest(self.sha256_path)))
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            expected = read_digest(self.sha256_path)
+            if expected is None or expected == self.digest:
+                continue
+            # Only the key snapshot is taken on the loop; staging, opening and
+            # warming the new DB all happen on a worker thread.
+            warm = self.lookup.cache.keys()[-WARM_KEYS:] if self.lookup is not None else []
+            try:
+                digest, db_path, lookup = await asyncio.to_thread(self._prepare, expected, warm)
+                self._install(digest, db_path, lookup)
+            except (OSError, ValueError, EOFError, sqlite3.Error) as e:
+                print(f"[WARN] Keeping {self.digest[:12]}: {e}", file=sys.stderr, flush=True)
+                continue
+            print(f"[OK] Swapped to {digest[:12]} ({self.artifact})", flush=True)
+
+    def _resolve(self, queries: Any) -> List[Optional[str]]:
+        if not isinstance(queries, list):
+            raise ValueError("'queries' must be a list")
+        by_kind: Dict[str, List[Tuple[int, list]]] = {}
+        for pos, query in enumerate(queries):
+            if not isinstance(query, list) or not query or not isinstance(query[0], str) or query[0] not in _LOOKUP_TABLES:
+                raise ValueError(f"query {pos}: expected [kind, key...] with kind in {sorted(_LOOKUP_TABLES)}")
+            by_kind.setdefault(query[0], []).append((pos, query[1:]))
+
+        results: List[Optional[str]] = [None] * len(queries)
+        assert self.lookup is not None
+        for kind, items in by_kind.items():
+            names = self.lookup.lookup_many(kind, (key for _, key in items))
+            for (pos, _), name in zip(items, names):
+                results[pos] = name
+        self.stats["queries"] += len(queries)
+        return results
+
+    def answer(self, request: Any) -> Dict[str, Any]:
+        """Response object for one decoded request line."""
+        self.stats["requests"] += 1
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            op = request.get("op", "resolve")
+            if op == "resolve":
+                return {"id": request_id, "results": self._resolve(request.get("queries")), "sha256": self.digest}
+            if op == "stats":
+                assert self.lookup is not None
+                cache = self.lookup.cache
+                return {
+                    "id": request_id,
+                    "protocol": PROTOCOL,
+                    "sha256": self.digest,
+                    "cache": {"size": len(cache), "hits": cache.hits, "misses": cache.misses},
+                    **self.stats,
+                }
+            raise ValueError(f"unknown op: {op!r}")
+        except ValueError as e:
+            self.stats["errors"] += 1
+            return {"id": request_id, "error": str(e)}
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["clients"] += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # line longer than MAX_LINE
+                    writer.write(b'{"id": null, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    self.stats["requests"] += 1
+                    self.stats["errors"] += 1
+                    response = {"id": None, "error": f"invalid JSON: {e}"}
+                else:
+                    response = self.answer(request)
+                writer.write(json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, unix_path: Optional[Path] = None
+    ) -> asyncio.AbstractServer:
+        """Loads the artifact if needed, starts listening and watching the sidecar."""
+        if self.lookup is None:
+            self.load()
+        if unix_path is not None:
+            if unix_path.exists():
+                unix_path.unlink()
+            self._server = await asyncio.start_unix_server(self._client, path=str(unix_path), limit=MAX_LINE)
+        else:
+            self._server = await asyncio.start_server(self._client, host, port, limit=MAX_LINE)
+        self._watcher = asyncio.create_task(self._watch())
+        return self._server
+
+    async def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.lookup is not None:
+            self.lookup.close()
+            self.lookup = None
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+
+async def _serve(server: ResolverServer, host: str, port: int, unix_path: Optional[Path]) -> None:
+    srv = await server.start(host, port, unix_path)
+    where = unix_path or "{}:{}".format(*srv.sockets[0].getsockname()[:2])
+    print(f"[OK] Serving {server.artifact} ({server.digest[:12]}) on {where}", flush=True)
+    try:
+        await srv.serve_forever()
+    finally:
+        await server.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve batched usbids name lookups over JSON lines")
+    ap.add_argument("--artifact", default=str(DEFAULT_ARTIFACT), help="usbids.sqlite or usbids.sqlite.gz to serve")
+    ap.add_argument("--sha256", default=None, help="Sidecar to watch (default: <artifact>.sha256)")
+    ap.add_argument("--unix", default=None, help="Listen on this Unix socket instead of TCP")
+    ap.add_argument("--host", default="127.0.0.1", help="TCP host (default: 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=7787, help="TCP port (default: 7787)")
+    ap.add_argument("--cache-size", type=int, default=65536, help="Shared LRU entries (default: 65536)")
+    ap.add_argument("--poll", type=float, default=2.0, help="Seconds between sidecar checks (default: 2)")
+    ap.add_argument("--overlay", action="append", default=[], help="Compiled overrides DB (repeatable; earlier wins)")
+    args = ap.parse_args()
+
+    artifact = Path(args.artifact)
+    if not artifact.exists():
+        raise SystemExit(f"Artifact not found: {artifact}")
+    server = ResolverServer(
+        artifact,
+        sha256_path=Path(args.sha256) if args.sha256 else None,
+        cache_size=args.cache_size,
+        overlays=[Path(p) for p in args.overlay],
+        poll_interval=args.poll,
+    )
+    try:
+        server.load()
+    except ValueError as e:
+        raise SystemExit(f"[FAIL] {e}")
+    try:
+        asyncio.run(_serve(server, args.host, args.port, Path(args.unix) if args.unix else None))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Block-checksum manifest and partial sync for usbids.sqlite, zsync style.
+
+The manifest (JSON) describes the uncompressed DB published next to it:
+
+  {"format": "usbids-blocks/1", "file": "usbids.sqlite", "size": ...,
+   "sha256": ..., "block_size": 4096, "blocks": [[weak, strong], ...]}
+
+Blocks default to the DB page size. `weak` is the rsync rolling checksum of
+a block (two 16-bit sums), `strong` the first 16 bytes of its sha256 in hex.
+A client looks up every block of its local file by weak checksum, confirms
+candidates by strong hash, and fetches the remaining blocks from `file`
+(relative to the manifest URL) with HTTP Range requests, one per run of
+adjacent blocks. The result is checked against `sha256` before it replaces
+anything.
+
+SQLite writes whole pages at page-aligned offsets, so local blocks are only
+tried at block boundaries unless `rolling` is set, which slides the weak
+checksum one byte at a time like zsync (slow in Python; for other files).
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from dataclasses import dataclass
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from update_usbids_artifacts import HashingWriter, WrittenFile
+
+FORMAT = "usbids-blocks/1"
+STRONG_BYTES = 16
+
+_USER_AGENT = "usbdevinfo-usbids-sync/1.0 (+https://github.com/)"
+
+
+def weak_checksum(block: bytes) -> int:
+    """rsync's weak checksum: a = sum of bytes, b = sum of prefix sums, mod 2^16."""
+    a = sum(block) & 0xFFFF
+    b = sum(accumulate(block)) & 0xFFFF
+    return a | (b << 16)
+
+
+def strong_hash(block: bytes) -> str:
+    return hashlib.sha256(block).hexdigest()[: STRONG_BYTES * 2]
+
+
+def _page_size(db_path: Path) -> int:
+    with db_path.open("rb") as f:
+        header = f.read(18)
+    if len(header) < 18 or not header.startswith(b"SQLite format 3\0"):
+        raise ValueError(f"not a SQLite database: {db_path}")
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size
+
+
+def block_manifest(path: Path, block_size: Optional[int] = None, file_name: Optional[str] = None) -> dict:
+    """Manifest for `path`; block_size defaults to its SQLite page size."""
+    block_size = block_size or _page_size(path)
+    blocks: List[List[object]] = []
+    whole = hashlib.sha256()
+    size = 0
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            whole.update(block)
+            size += len(block)
+            blocks.append([weak_checksum(block), strong_hash(block)])
+    return {
+        "format": FORMAT,
+        "file": file_name or path.name,
+        "size": size,
+        "sha256": whole.hexdigest(),
+        "block_size": block_size,
+        "blocks": blocks,
+    }
+
+
+def write_block_manifest(
+    db_path: Path, out_path: Path, block_size: Optional[int] = None, file_name: Optional[str] = None
+) -> Tuple[dict, WrittenFile]:
+    """
+    Writes the manifest for db_path as published under `file_name` (default:
+    its own name). Output is deterministic for given DB bytes.
+    """
+    manifest = block_manifest(db_path, block_size, file_name)
+    with HashingWriter(out_path) as out:
+        out.write(json.dumps(manifest, separators=(",", ":")).encode("utf-8") + b"\n")
+    return manifest, out.close()
+
+
+def match_blocks(manifest: dict, local: bytes, rolling: bool = False) -> Dict[int, int]:
+    """
+    Maps manifest block index -> offset of identical bytes in `local`.
+    Checks block-aligned offsets only, or every offset with `rolling`.
+    """
+    block_size = manifest["block_size"]
+    by_weak: Dict[int, List[Tuple[str, int]]] = {}
+    for index, (weak, strong) in enumerate(manifest["blocks"]):
+        by_weak.setdefault(weak, []).append((strong, index))
+
+    found: Dict[int, int] = {}
+
+    def try_block(offset: int, weak: int) -> bool:
+        candidates = by_weak.get(weak)
+        if not candidates:
+            return False
+        strong = strong_hash(local[offset : offset + block_size])
+        hit = False
+        for want, index in candidates:
+            if want == strong:
+                found.setdefault(index, offset)
+                hit = True
+        return hit
+
+    if not rolling:
+        for offset in range(0, len(local), block_size):
+            try_block(offset, weak_checksum(local[offset : offset + block_size]))
+        return found
+
+    # A short last block (file size not a multiple of block_size) only
+    # matches at the end of the local file.
+    tail = manifest["size"] % block_size
+    if tail and len(local) >= tail:
+        try_block(len(local) - tail, weak_checksum(local[-tail:]))
+
+    n = len(local) - block_size
+    if n < 0:
+        return found
+    a = sum(local[:block_size]) & 0xFFFF
+    b = sum(accumulate(local[:block_size])) & 0xFFFF
+    offset = 0
+    while True:
+        if try_block(offset, a | (b << 16)):
+            offset += block_size
+            if offset > n:
+                break
+            block = local[offset : offset + block_size]
+            a = sum(block) & 0xFFFF
+            b = sum(accumulate(block)) & 0xFFFF
+            continue
+        if offset == n:
+            break
+        out_byte, in_byte = local[offset], local[offset + block_size]
+        a = (a - out_byte + in_byte) & 0xFFFF
+        b = (b - block_size * out_byte + a) & 0xFFFF
+        offset += 1
+    return found
+
+
+def _runs(indexes: List[int]) -> List[Tuple[int, int]]:
+    """Sorted block indexes -> (first, last) runs of adjacent blocks."""
+    runs: List[Tuple[int, int]] = []
+    for i in indexes:
+        if runs and runs[-1][1] == i - 1:
+            runs[-1] = (runs[-1][0], i)
+        else:
+            runs.append((i, i))
+    return runs
+
+
+@dataclass
+class SyncResult:
+    path: Path
+    sha256: str
+    size: int
+    blocks: int
+    blocks_reused: int
+    bytes_fetched: int
+    requests: int
+
+
+def _open(url: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+    req = urllib.request.Request(url, headers={"User-Agent": _USER_AGENT, **(headers or {})})
+    return urllib.request.urlopen(req, timeout=timeout)
+
+
+def fetch_manifest(url: str, timeout: float = 60.0) -> dict:
+    with _open(url, timeout) as resp:
+        manifest = json.loads(resp.read().decode("utf-8"))
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"unsupported manifest format: {manifest.get('format')!r}")
+    return manifest
+
+
+def sync_file(
+    manifest_url: str,
+    local_path: Path,
+    out_path: Optional[Path] = None,
+    rolling: bool = False,
+    timeout: float = 60.0,
+) -> SyncResult:
+    """
+    Brings out_path (default: local_path, replaced atomically) to the file
+    the manifest describes, reusing the blocks local_path already has and
+    fetching the rest with Range requests. A missing local file fetches
+    everything. If the server ignores Range, its full 200 body is used.
+    Raises ValueError if the result does not match the manifest's sha256.
+    """
+    manifest = fetch_manifest(manifest_url, timeout)
+    file_url = urllib.parse.urljoin(manifest_url, manifest["file"])
+    block_size, size = manifest["block_size"], manifest["size"]
+    count = len(manifest["blocks"])
+
+    local = local_path.read_bytes() if local_path.exists() else b""
+    found = match_blocks(manifest, local, rolling=rolling)
+
+    fetched: Dict[int, bytes] = {}
+    bytes_fetched = requests = 0
+    full_body: Optional[bytes] = None
+    for first, last in _runs([i for i in range(count) if i not in found]):
+        start, end = first * block_size, min((last + 1) * block_size, size) - 1
+        requests += 1
+        try:
+            with _open(file_url, timeout, {"Range": f"bytes={start}-{end}"}) as resp:
+                data = resp.read()
+                status = resp.status
+                content_range = resp.headers.get("Content-Range", "")
+        except urllib.error.HTTPError as e:
+            raise ValueError(f"range request for {file_url} failed: HTTP {e.code}") from e
+        bytes_fetched += len(data)
+        if status == 200:
+            full_body = data
+            break
+        if not content_range.startswith(f"bytes {start}-") or len(data) != end - start + 1:
+            raise ValueError(f"unexpected range response for bytes {start}-{end}: {content_range!r}")
+        for i in range(first, last + 1):
+            fetched[i] = data[(i - first) * block_size : (i - first + 1) * block_size]
+
+    target = out_path or local_path
+    tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with HashingWriter(tmp) as out:
+            if full_body is not None:
+                out.write(full_body)
+            else:
+                for i in range(count):
+                    if i in found:
+                        offset = found[i]
+                        out.write(local[offset : offset + min(block_size, size - i * block_size)])
+                    else:
+                        out.write(fetched[i])
+        written = out.close()
+        if written.sha256 != manifest["sha256"] or written.size != size:
+            raise ValueError(f"synced file has sha256 {written.sha256}, manifest says {manifest['sha256']}")
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+    return SyncResult(
+        path=target,
+        sha256=written.sha256,
+        size=size,
+        blocks=count,
+        blocks_reused=0 if full_body is not None else len(found),
+        bytes_fetched=bytes_fetched,
+        requests=requests,
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Write a block manifest for usbids.sqlite, or sync a local copy from one")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_manifest = sub.add_parser("manifest", help="Write the block manifest of a usbids.sqlite")
+    p_manifest.add_argument("db", help="usbids.sqlite as published")
+    p_manifest.add_argument("out", help="Manifest to write (e.g. usbids.sqlite.blocks.json)")
+    p_manifest.add_argument("--block-size", type=int, default=None, help="Block size (default: the DB page size)")
+
+    p_sync = sub.add_parser("sync", help="Update a local usbids.sqlite from a manifest URL")
+    p_sync.add_argument("url", help="Manifest URL; the DB is fetched from its 'file' next to it")
+    p_sync.add_argument("local", help="Local usbids.sqlite (may not exist yet)")
+    p_sync.add_argument("--out", default=None, help="Write the result here instead of replacing local")
+    p_sync.add_argument("--rolling", action="store_true", help="Also match blocks at unaligned offsets")
+    p_sync.add_argument("--timeout", type=float, default=60.0, help="HTTP timeout in seconds (default: 60)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "manifest":
+        manifest, written = write_block_manifest(Path(args.db), Path(args.out), args.block_size)
+        print(f"[OK] Wrote {written.path} ({len(manifest['blocks'])} blocks of {manifest['block_size']} bytes)")
+        return
+
+    try:
+        result = sync_file(
+            args.url,
+            Path(args.local),
+            Path(args.out) if args.out else None,
+            rolling=args.rolling,
+            timeout=args.timeout,
+        )
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"[FAIL] {e}")
+    print(
+        f"[OK] {result.path}: reused {result.blocks_reused}/{result.blocks} blocks, fetched {result.bytes_fetched} "
+        f"of {result.size} bytes in {result.requests} requests ({(time.perf_counter() - t0) * 1000:.1f} ms)"
+    )
+    print(f"  - sha256={result.sha256}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic usb.ids generator, for parser and loader tests at
+10x-100x the size of the upstream file.
+
+Every choice (names, which lines get odd whitespace, duplicates, bad lines)
+is a hash of the seed and the entry's key, not a sequential RNG, so lines
+are generated one at a time in constant memory and the expected catalog
+can be computed the same way, without parsing anything:
+
+  iter_synthetic_usb_ids(spec)   the usb.ids lines
+  expected_rows(spec)            every (table, key, name) the build must
+                                 contain, per table in primary key order
+
+Edge cases, each at its own rate:
+  duplicates       a product or interface first appears with a stale name
+                   and again later in its vendor block; the later one wins
+  odd whitespace   CRLF endings, tabs or runs of spaces after the ID,
+                   trailing blanks, upper-case hex
+  bad lines        comments, blank lines, non-hex or short IDs, IDs without
+                   a name and over-indented lines; all must be ignored
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import time
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from update_usbids_artifacts import TABLE_COLUMNS, HashingWriter, WrittenFile
+
+_MASK = (1 << 64) - 1
+
+_WORDS = (
+    "Wireless", "Receiver", "Keyboard", "Optical", "Mouse", "Hub", "Controller", "Adapter",
+    "Camera", "Audio", "Storage", "Bridge", "Serial", "Gaming", "Headset", "Dock",
+    "Gerät", "Leitung", "Caméra", "東芝", "Технологии", "Ltd.", "Inc.", "(rev 2)",
+)
+
+# Section ID widths and limits (IDs are hex except BIAS).
+_LIMITS = {
+    "vendors": 1 << 16,
+    "products_per_vendor": 1 << 16,
+    "interfaces_per_product": 1 << 8,
+    "classes": 1 << 8,
+    "subclasses_per_class": 1 << 8,
+    "protocols_per_subclass": 1 << 8,
+    "hut_pages": 1 << 8,
+    "usages_per_page": 1 << 16,
+    "tagged_per_kind": 1 << 8,
+}
+
+# Tagged single-level sections: usb.ids tag, table, whether the ID is hex.
+_TAGGED = (
+    ("AT", "audio_terminal_types", 4, True),
+    ("HID", "hid_descriptor_types", 2, True),
+    ("R", "hid_descriptor_item_types", 2, True),
+    ("BIAS", "physical_bias_types", 1, False),
+    ("PHY", "physical_descriptor_item_types", 2, True),
+)
+
+_BAD_LINES = (
+    "# synthetic comment {n}",
+    "",
+    "   ",
+    "zz{n:02x}  Not a hex vendor",
+    "\tgg{n:02x}  Not a hex product",
+    "\t{n:04x}",
+    "\t\t\t{n:02x}  Indented too deep",
+    "\t\t\t\t",
+)
+
+# A 3-digit ID is a bad product line but a valid HUT usage (1-4 digits).
+_BAD_VENDOR_LINES = _BAD_LINES + ("\t{n:03x}  Short product ID",)
+
+
+def _mix(seed: int, *parts: int) -> int:
+    h = (seed * 0x9E3779B97F4A7C15 + 0x632BE59BD9B4E019) & _MASK
+    for part in parts:
+        h ^= part & _MASK
+        h = (h * 0xBF58476D1CE4E5B9) & _MASK
+        h ^= h >> 31
+        h = (h * 0x94D049BB133111EB) & _MASK
+        h ^= h >> 29
+    return h
+
+
+@dataclass(frozen=True)
+class SynthSpec:
+    vendors: int = 3400
+    products_per_vendor: int = 6
+    interfaces_per_product: int = 0
+    classes: int = 26
+    subclasses_per_class: int = 2
+    protocols_per_subclass: int = 2
+    hut_pages: int = 29
+    usages_per_page: int = 40
+    tagged_per_kind: int = 8
+    duplicate_rate: float = 0.01
+    odd_whitespace_rate: float = 0.05
+    bad_line_rate: float = 0.01
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        for field, limit in _LIMITS.items():
+            value = getattr(self, field)
+            if not 0 <= value <= limit:
+                raise ValueError(f"{field} must be between 0 and {limit}, got {value}")
+        for field in ("duplicate_rate", "odd_whitespace_rate", "bad_line_rate"):
+            if not 0.0 <= getattr(self, field) <= 1.0:
+                raise ValueError(f"{field} must be between 0 and 1")
+
+    @classmethod
+    def scaled(cls, factor: float, **overrides) -> "SynthSpec":
+        """
+        About `factor` times the upstream file's vendor tree (~20k products
+        at 1x). Vendors grow up to the 16-bit ID space, then products per
+        vendor take over.
+        """
+        base = cls()
+        products = max(1, round(base.vendors * base.products_per_vendor * factor))
+        vendors = min(_LIMITS["vendors"], max(1, round(base.vendors * factor)))
+        params = dict(vendors=vendors, products_per_vendor=math.ceil(products / vendors))
+        params.update(overrides)
+        return cls(**params)
+
+    def _chance(self, rate: float, *key: int) -> bool:
+        return rate > 0 and _mix(self.seed, *key) < rate * _MASK
+
+
+def _name(spec: SynthSpec, kind: int, *key: int) -> str:
+    h = _mix(spec.seed, kind, *key)
+    words = [_WORDS[(h >> (8 * i)) % len(_WORDS)] for i in range(1 + h % 3)]
+    return f"{' '.join(words)} {key[-1]:x}"
+
+
+def _entry(spec: SynthSpec, depth: int, ident: str, name: str, *key: int) -> str:
+    """One entry line; odd whitespace is decided per key and never changes the parse."""
+    prefix = "\t" * depth
+    if not spec._chance(spec.odd_whitespace_rate, 1, depth, *key):
+        return f"{prefix}{ident}  {name}\n"
+    variant = _mix(spec.seed, 2, depth, *key) % 4
+    if variant == 0:
+        return f"{prefix}{ident}  {name}\r\n"
+    if variant == 1:
+        return f"{prefix}{ident}\t{name}\t \n"
+    if variant == 2:
+        return f"{prefix}{ident.upper()}     {name}   \n"
+    return f"{prefix}{ident} \t {name}\r\n"
+
+
+def _bad_lines(spec: SynthSpec, choices: Tuple[str, ...], *position: int) -> Iterator[str]:
+    if spec._chance(spec.bad_line_rate, 3, *position):
+        n = _mix(spec.seed, 4, *position)
+        yield choices[n % len(choices)].format(n=n & 0xFF) + "\n"
+
+
+def _product_ids(spec: SynthSpec) -> List[int]:
+    # Spread over the ID space, like real PIDs; multiplying by an odd
+    # number is a permutation of 16-bit values, so IDs stay distinct.
+    return [(j * 0x9E37 + spec.seed) & 0xFFFF for j in range(spec.products_per_vendor)]
+
+
+def _vendor_ids(spec: SynthSpec) -> range:
+    step = (1 << 16) // max(1, spec.vendors)
+    return range(0, spec.vendors * step, step)
+
+
+def iter_synthetic_usb_ids(spec: SynthSpec) -> Iterator[str]:
+    """usb.ids lines for `spec`, "\\n" or "\\r\\n" terminated, one at a time."""
+    yield "#\n"
+    yield f"# Version: synthetic-{spec.seed}\n"
+    yield "# Date:    2000-01-01 00:00:00\n"
+    yield "#\n"
+
+    pids = _product_ids(spec)
+    for vid in _vendor_ids(spec):
+        yield _entry(spec, 0, f"{vid:04x}", _name(spec, 10, vid), vid)
+        yield from _bad_lines(spec, _BAD_VENDOR_LINES, 10, vid)
+        late: List[str] = []
+        for pid in pids:
+            name = _name(spec, 11, vid, pid)
+            if spec._chance(spec.duplicate_rate, 5, vid, pid):
+                yield f"\t{pid:04x}  {name} (superseded)\n"
+                late.append(_entry(spec, 1, f"{pid:04x}", name, vid, pid))
+            else:
+                yield _entry(spec, 1, f"{pid:04x}", name, vid, pid)
+            yield from _bad_lines(spec, _BAD_VENDOR_LINES, 11, vid, pid)
+            for iid in range(spec.interfaces_per_product):
+                iname = _name(spec, 12, vid, pid, iid)
+                if spec._chance(spec.duplicate_rate, 6, vid, pid, iid):
+                    yield f"\t\t{iid:02x}  {iname} (superseded)\n"
+                yield _entry(spec, 2, f"{iid:02x}", iname, vid, pid, iid)
+        # Re-stating a product resets the interface context, so the later
+        # duplicates go after all of this vendor's interfaces.
+        yield from late
+
+    for cid in range(spec.classes):
+        yield _entry(spec, 0, f"C {cid:02x}", _name(spec, 20, cid), cid)
+        for sid in range(spec.subclasses_per_class):
+            yield _entry(spec, 1, f"{sid:02x}", _name(spec, 21, cid, sid), cid, sid)
+            for prot in range(spec.protocols_per_subclass):
+                yield _entry(spec, 2, f"{prot:02x}", _name(spec, 22, cid, sid, prot), cid, sid, prot)
+        yield from _bad_lines(spec, _BAD_LINES, 20, cid)
+
+    for kind, (tag, _, width, hexadecimal) in enumerate(_TAGGED):
+        for n in range(spec.tagged_per_kind):
+            ident = f"{n:0{width}x}" if hexadecimal else str(n)
+            yield _entry(spec, 0, f"{tag} {ident}", _name(spec, 30 + kind, n), 30 + kind, n)
+
+    for page in range(spec.hut_pages):
+        yield _entry(spec, 0, f"HUT {page:02x}", _name(spec, 40, page), page)
+        for usage in range(spec.usages_per_page):
+            yield _entry(spec, 1, f"{usage:03x}", _name(spec, 41, page, usage), page, usage)
+        yield from _bad_lines(spec, _BAD_LINES, 40, page)
+
+
+def expected_rows(spec: SynthSpec) -> Iterator[Tuple[str, tuple, str]]:
+    """
+    (table, key, name) for every row a build of the spec's usb.ids must
+    hold, tables in TABLE_COLUMNS order, keys ascending.
+    """
+    meta = {"version": f"synthetic-{spec.seed}", "date": "2000-01-01 00:00:00", "source_format": "usb.ids"}
+    for key in sorted(meta):
+        yield "meta", (key,), meta[key]
+    vids, pids = _vendor_ids(spec), sorted(_product_ids(spec))
+    for vid in vids:
+        yield "vendors", (vid,), _name(spec, 10, vid)
+    for vid in vids:
+        for pid in pids:
+            yield "products", (vid, pid), _name(spec, 11, vid, pid)
+    for vid in vids:
+        for pid in pids:
+            for iid in range(spec.interfaces_per_product):
+                yield "interfaces", (vid, pid, iid), _name(spec, 12, vid, pid, iid)
+    nested = (
+        ("usb_classes", (spec.classes,), 20),
+        ("usb_subclasses", (spec.classes, spec.subclasses_per_class), 21),
+        ("usb_protocols", (spec.classes, spec.subclasses_per_class, spec.protocols_per_subclass), 22),
+    )
+    for table, sizes, kind in nested:
+        for key in _key_space(sizes):
+            yield table, key, _name(spec, kind, *key)
+    for kind, (_, table, _, _) in enumerate(_TAGGED):
+        for n in range(spec.tagged_per_kind):
+            yield table, (n,), _name(spec, 30 + kind, n)
+    for page in range(spec.hut_pages):
+        yield "hid_usage_pages", (page,), _name(spec, 40, page)
+    for key in _key_space((spec.hut_pages, spec.usages_per_page)):
+        yield "hid_usages", key, _name(spec, 41, *key)
+
+
+def _key_space(sizes: Tuple[int, ...]) -> Iterator[tuple]:
+    if not sizes:
+        yield ()
+        return
+    for first in range(sizes[0]):
+        for rest in _key_space(sizes[1:]):
+            yield (first, *rest)
+
+
+def expected_counts(spec: SynthSpec) -> Dict[str, int]:
+    products = spec.vendors * spec.products_per_vendor
+    subclasses = spec.classes * spec.subclasses_per_class
+    counts = {
+        "meta": 3,
+        "vendors": spec.vendors,
+        "products": products,
+        "interfaces": products * spec.interfaces_per_product,
+        "usb_classes": spec.classes,
+        "usb_subclasses": subclasses,
+        "usb_protocols": subclasses * spec.protocols_per_subclass,
+        "hid_usage_pages": spec.hut_pages,
+        "hid_usages": spec.hut_pages * spec.usages_per_page,
+    }
+    counts.update((table, spec.tagged_per_kind) for _, table, _, _ in _TAGGED)
+    return {table: counts[table] for table in TABLE_COLUMNS}
+
+
+def write_synthetic_usb_ids(spec: SynthSpec, out_path: Path) -> WrittenFile:
+    """Writes the corpus byte for byte (line ends as generated)."""
+    with HashingWriter(out_path) as out:
+        batch: List[str] = []
+        for line in iter_synthetic_usb_ids(spec):
+            batch.append(line)
+            if len(batch) == 4096:
+                out.write("".join(batch).encode("utf-8"))
+                batch.clear()
+        out.write("".join(batch).encode("utf-8"))
+    return out.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Write a deterministic synthetic usb.ids corpus")
+    ap.add_argument("out", help="usb.ids file to write")
+    ap.add_argument("--scale", type=float, default=1.0, help="Vendor tree size relative to upstream (default: 1)")
+    names = [f.name for f in fields(SynthSpec)]
+    for f in fields(SynthSpec):
+        kind = float if f.name.endswith("_rate") else int
+        ap.add_argument(f"--{f.name.replace('_', '-')}", type=kind, default=None, help="Overrides the scaled spec")
+    args = ap.parse_args()
+
+    overrides = {name: getattr(args, name) for name in names if getattr(args, name) is not None}
+    t0 = time.perf_counter()
+    try:
+        spec = SynthSpec.scaled(args.scale, **overrides)
+    except ValueError as e:
+        raise SystemExit(f"[FAIL] {e}")
+    written = write_synthetic_usb_ids(spec, Path(args.out))
+    rows = sum(expected_counts(spec).values())
+    print(
+        f"[OK] Wrote {written.path} ({written.size} bytes, {rows} catalog rows) "
+        f"in {time.perf_counter() - t0:.2f}s sha256={written.sha256}"
+    )
+
+
+if __name__ == "__main__":
+    main()